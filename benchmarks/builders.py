@@ -0,0 +1,106 @@
+"""Benchmark the transaction builders against LocalIndexedChainContext
+
+Runs fully offline, with the preprod parameters of the test fixtures and a
+local store holding the wallet and the oracle script UTxOs.
+
+    python3 benchmarks/builders.py -n 500 -u 10000
+"""
+
+import pycardano as pyc
+import argparse
+import time
+import sys
+
+sys.path.append("src")
+sys.path.append("tests")
+
+from lib import cardano, chain_context, coin_selection, data_types  # noqa: E402
+from lib import ex_units, indexer, scripts  # noqa: E402
+from fixtures.chain_context import PROTOCOL_PARAM  # noqa: E402
+from fixtures.utxo import OPEN_ORACLE_DATUM, ORACLES  # noqa: E402
+
+
+parser = argparse.ArgumentParser(
+    description="Benchmark offline transaction builds",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+parser.add_argument("-n", "--builds", type=int, default=500)
+parser.add_argument("-u", "--utxos", type=int, default=10000)
+
+
+class OfflineEvaluation(chain_context.LocalIndexedChainContext):
+    """Answers the one evaluation needed to fill the execution unit cache"""
+
+    def evaluate_tx(self, cbor):
+        tx = pyc.Transaction.from_cbor(cbor)
+        return {
+            f"{redeemer.tag.name.lower()}:{redeemer.index}": pyc.ExecutionUnits(
+                1_000_000, 400_000_000
+            )
+            for redeemer in tx.transaction_witness_set.redeemer
+        }
+
+
+def main():
+    args = parser.parse_args()
+
+    address = pyc.Address.from_primitive(
+        "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+    )
+    oracle = scripts.oracle()
+
+    wallet = [
+        pyc.UTxO(
+            pyc.TransactionInput.from_primitive([f"{i:064x}", 0]),
+            pyc.TransactionOutput(address, 2_000_000 + i * 1_000),
+        )
+        for i in range(args.utxos)
+    ]
+    script_utxo = pyc.UTxO(
+        pyc.TransactionInput.from_primitive(["ff" * 32, 0]),
+        pyc.TransactionOutput(
+            oracle.address(), 10_000_000, datum=pyc.RawCBOR(OPEN_ORACLE_DATUM)
+        ),
+    )
+
+    store = indexer.UTxOStore()
+    store.roll_forward(
+        indexer.Point(1, "00" * 32),
+        [([], [indexer.IndexedUTxO(utxo, None, 1) for utxo in wallet + [script_utxo]])],
+    )
+
+    context = OfflineEvaluation(
+        store, network=pyc.Network.TESTNET, protocol_param=PROTOCOL_PARAM
+    )
+    index = coin_selection.UTxOIndex(context.utxos(str(address)))
+
+    datum = data_types.datum_from_cbor(OPEN_ORACLE_DATUM)
+    signatures = [bytes.fromhex(signature) for _, signature in ORACLES]
+
+    builders = {
+        "create_data_request": lambda: cardano.create_data_request(
+            context, index, address, oracle, 10_000_000, datum
+        ),
+        "submit_oracles_data": lambda: cardano.submit_oracles_data(
+            context, wallet[-1], script_utxo, oracle, datum, address, b"test", signatures
+        ),
+    }
+
+    print(f"{args.builds} builds each, wallet of {args.utxos} UTxOs")
+
+    for name, build in builders.items():
+        build()
+
+        start = time.perf_counter()
+        for _ in range(args.builds):
+            build()
+        elapsed = time.perf_counter() - start
+
+        print(f"{name:<20} {args.builds / elapsed:8.1f} builds/s")
+
+    print(f"execution units {ex_units.estimator.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Benchmark the coin selection strategies on large wallets
+
+    python3 benchmarks/coin_selection.py -u 20000 -s 200
+"""
+
+import pycardano as pyc
+import argparse
+import random
+import time
+import sys
+
+sys.path.append("src")
+
+from lib import coin_selection  # noqa: E402
+
+
+parser = argparse.ArgumentParser(
+    description="Benchmark coin selection over an indexed UTxO set",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+parser.add_argument("-u", "--utxos", type=int, default=20000)
+parser.add_argument("-s", "--selections", type=int, default=200)
+parser.add_argument("--seed", type=int, default=0)
+
+
+def first_fit(utxos, target):
+    """The loop create_data_request used before the coin selection module"""
+
+    selected = []
+
+    total_value = pyc.Value(0)
+    for utxo in utxos:
+        selected.append(utxo)
+
+        total_value += utxo.output.amount
+        if total_value >= target:
+            break
+
+    return selected
+
+
+def main():
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    address = pyc.Address.from_primitive(
+        "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+    )
+    utxos = [
+        pyc.UTxO(
+            pyc.TransactionInput.from_primitive([rng.randbytes(32).hex(), 0]),
+            pyc.TransactionOutput(address, rng.randrange(1_000_000, 20_000_000)),
+        )
+        for _ in range(args.utxos)
+    ]
+    targets = [
+        pyc.Value(rng.randrange(5_000_000, 200_000_000)) for _ in range(args.selections)
+    ]
+
+    start = time.perf_counter()
+    index = coin_selection.UTxOIndex(utxos)
+    print(f"{args.utxos} UTxOs indexed in {time.perf_counter() - start:.4f}s")
+    print(f"{args.selections} selections per strategy")
+
+    def report(name, select):
+        inputs = 0
+        start = time.perf_counter()
+        for target in targets:
+            inputs += len(select(target))
+        elapsed = time.perf_counter() - start
+
+        print(
+            f"{name:<18} {elapsed / len(targets) * 1000:8.3f}ms/selection"
+            f"  {inputs / len(targets):6.1f} inputs"
+        )
+
+    report("first_fit (list)", lambda target: first_fit(utxos, target))
+
+    for name in coin_selection.STRATEGIES:
+        strategy_rng = random.Random(args.seed)
+        report(
+            name,
+            lambda target: coin_selection.select(index, target, name, strategy_rng),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark the oracle datum codec and results updates against data_types
+
+    python3 benchmarks/datum.py -n 20000
+"""
+
+import argparse
+import copy
+import time
+import sys
+
+sys.path.append("src")
+sys.path.append("tests")
+
+from lib import data_types, oracle_datum  # noqa: E402
+from fixtures.utxo import ORACLE_DATUM, OPEN_ORACLE_DATUM  # noqa: E402
+
+
+parser = argparse.ArgumentParser(
+    description="Benchmark oracle datum decoding",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+parser.add_argument("-n", "--datums", type=int, default=20000)
+
+
+def timed(function, datums) -> float:
+    start = time.perf_counter()
+    for cbor in datums:
+        function(cbor)
+
+    return time.perf_counter() - start
+
+
+def main():
+    args = parser.parse_args()
+
+    datums = [ORACLE_DATUM, OPEN_ORACLE_DATUM] * (args.datums // 2)
+
+    def decode_fields(cbor):
+        # What the API reads from a resolved datum
+        datum = oracle_datum.decode(cbor)
+        return datum["oracles"], datum["min_signatures"], datum["results"]
+
+    baseline = timed(data_types.cbor_datum_to_dict, datums)
+    decoded = timed(oracle_datum.decode, datums)
+    fields = timed(decode_fields, datums)
+    materialized = timed(lambda cbor: oracle_datum.decode(cbor).to_dict(), datums)
+
+    print(f"{len(datums)} datums")
+    print(f"cbor_datum_to_dict        {baseline:.4f}s")
+    print(f"oracle_datum.decode       {decoded:.4f}s  x{baseline / decoded:.1f}")
+    print(f"decode + API fields       {fields:.4f}s  x{baseline / fields:.1f}")
+    print(f"decode + to_dict          {materialized:.4f}s  x{baseline / materialized:.1f}")
+
+    # Filling in the results, what the responder does for every answer
+    datum = data_types.datum_from_cbor(OPEN_ORACLE_DATUM)
+    decoded = oracle_datum.decode(OPEN_ORACLE_DATUM)
+
+    def deepcopy_update(_):
+        datum_copy = copy.deepcopy(datum)
+        datum_copy.items[-1] = data_types.ResultsSome(b"test")
+        return datum_copy
+
+    copied = timed(deepcopy_update, datums)
+    shared = timed(lambda _: data_types.update_datum_with_results(datum, b"test"), datums)
+    spliced = timed(lambda _: decoded.with_results(b"test").to_cbor(), datums)
+
+    print(f"deepcopy update           {copied:.4f}s")
+    print(f"update_datum_with_results {shared:.4f}s  x{copied / shared:.1f}")
+    print(f"OracleDatum.with_results  {spliced:.4f}s  x{copied / spliced:.1f}")
+
+
+if __name__ == "__main__":
+    main()
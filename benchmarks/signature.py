@@ -0,0 +1,74 @@
+"""Benchmark signature.verify_many against the per-call signature.verify
+
+    python3 benchmarks/signature.py -n 5000 -o 10
+"""
+
+from nacl.signing import SigningKey
+from nacl.exceptions import BadSignatureError
+
+import argparse
+import time
+import sys
+
+sys.path.append("src")
+
+from lib import signature  # noqa: E402
+
+
+parser = argparse.ArgumentParser(
+    description="Benchmark batched oracle signature verification",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+parser.add_argument("-n", "--signatures", type=int, default=5000)
+parser.add_argument("-o", "--oracles", type=int, default=10)
+parser.add_argument("-w", "--workers", type=int, default=None)
+
+
+def main():
+    args = parser.parse_args()
+
+    message_hex = b"578,214693|484,214787|578,214693".hex()
+    oracles = [SigningKey.generate() for _ in range(args.oracles)]
+
+    triples = []
+    for i in range(args.signatures):
+        skey = oracles[i % len(oracles)]
+        signed = skey.sign(bytes.fromhex(message_hex))
+
+        triples.append(
+            (skey.verify_key.encode().hex(), message_hex, signed.signature.hex())
+        )
+
+    # Warm up libsodium before timing anything
+    signature.verify_many(triples[:100], workers=1)
+
+    start = time.perf_counter()
+    for vkey_hex, msg_hex, signature_hex in triples:
+        try:
+            signature.verify_key.cache_clear()
+            signature.verify(vkey_hex, msg_hex, signature_hex)
+        except BadSignatureError:
+            pass
+    per_call = time.perf_counter() - start
+
+    signature.verify_key.cache_clear()
+
+    start = time.perf_counter()
+    valid = signature.verify_many(triples, workers=1)
+    batched = time.perf_counter() - start
+
+    start = time.perf_counter()
+    valid_parallel = signature.verify_many(triples, workers=args.workers)
+    parallel = time.perf_counter() - start
+
+    assert all(valid) and all(valid_parallel)
+
+    print(f"{args.signatures} signatures from {args.oracles} oracles")
+    print(f"verify (uncached key)  {per_call:.4f}s")
+    print(f"verify_many (1 thread) {batched:.4f}s  x{per_call / batched:.2f}")
+    print(f"verify_many (pool)     {parallel:.4f}s  x{per_call / parallel:.2f}")
+
+
+if __name__ == "__main__":
+    main()
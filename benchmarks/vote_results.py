@@ -0,0 +1,114 @@
+"""Benchmark VoteResults against the nested list helpers of data_types
+
+    python3 benchmarks/vote_results.py -q 50 -c 20 -n 2000
+"""
+
+from pycardano.serialization import default_encoder
+
+import argparse
+import random
+import cbor2
+import time
+import sys
+
+sys.path.append("src")
+
+from lib import data_types, signature  # noqa: E402
+from lib.vote_results import VoteResults  # noqa: E402
+
+
+parser = argparse.ArgumentParser(
+    description="Benchmark vote results parsing and redeemer encoding",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+)
+
+parser.add_argument("-q", "--questions", type=int, default=50)
+parser.add_argument("-c", "--choices", type=int, default=20)
+parser.add_argument("-n", "--iterations", type=int, default=2000)
+
+
+def enforce_standard(results: str) -> bool:
+    """signature.enforce_standard before VoteResults"""
+
+    for question in results.split("|"):
+        for choice in question.split(","):
+            try:
+                int(choice)
+            except ValueError:
+                return False
+
+    return True
+
+
+def timed(function, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+
+    return time.perf_counter() - start
+
+
+def main():
+    args = parser.parse_args()
+    rng = random.Random(0)
+
+    pairs = "|".join(
+        ",".join(
+            f"{rng.randrange(1000)}:{rng.randrange(10**12)}" for _ in range(args.choices)
+        )
+        for _ in range(args.questions)
+    )
+    standard = "|".join(
+        ",".join(str(rng.randrange(10**12)) for _ in range(args.choices))
+        for _ in range(args.questions)
+    )
+
+    def nested():
+        results = data_types.parse_vote_results(pairs)
+        redeemer = data_types.escrow_redeemer(
+            data_types.EscrowRedeemer.EscrowExecution, 0, results
+        )
+        return cbor2.dumps(redeemer, default=default_encoder)
+
+    def columnar():
+        return VoteResults.parse(pairs).redeemer_cbor(0)
+
+    assert nested() == columnar()
+
+    n = args.iterations
+    print(f"{args.questions} questions x {args.choices} choices, {n} iterations")
+
+    baseline = timed(lambda: data_types.parse_vote_results(pairs), n)
+    parsed = timed(lambda: VoteResults.parse(pairs), n)
+    print(f"parse_vote_results       {baseline:.4f}s")
+    print(f"VoteResults.parse        {parsed:.4f}s  x{baseline / parsed:.1f}")
+
+    baseline = timed(nested, n)
+    encoded = timed(columnar, n)
+    print(f"parse + escrow_redeemer  {baseline:.4f}s")
+    print(f"parse + redeemer_cbor    {encoded:.4f}s  x{baseline / encoded:.1f}")
+
+    baseline = timed(lambda: enforce_standard(standard), n)
+    validated = timed(lambda: signature.enforce_standard(standard), n)
+    print(f"enforce_standard (loops) {baseline:.4f}s")
+    print(f"enforce_standard (map)   {validated:.4f}s  x{baseline / validated:.1f}")
+
+    nested = data_types.parse_vote_results(pairs)
+    # Lists, tuples and the ints they hold, small ints are shared so skipped
+    nested_size = sys.getsizeof(nested) + sum(
+        sys.getsizeof(votes)
+        + sum(
+            sys.getsizeof(pair) + sum(sys.getsizeof(n) for n in pair if n > 256)
+            for pair in votes
+        )
+        for votes in nested
+    )
+    results = VoteResults.parse(pairs)
+    columnar_size = sum(
+        sys.getsizeof(column) for column in (results.counts, results.weights, results.offsets)
+    )
+    print(f"memory: nested lists {nested_size} bytes, arrays {columnar_size} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from typing import Optional
+
+import pycardano as pyc
+
+from lib import indexer
+
+
+def _escrow(entry: indexer.IndexedUTxO) -> dict:
+    return {
+        "transaction_hash": str(entry.utxo.input.transaction_id),
+        "index": entry.utxo.input.index,
+        "slot": entry.slot,
+        **entry.escrow.to_dict(),
+    }
+
+
+def search(
+    policy_id: Optional[str] = None,
+    creator: Optional[str] = None,
+    deadline_from: Optional[int] = None,
+    deadline_to: Optional[int] = None,
+    oracle_input: Optional[str] = None,
+):
+    """Escrow script UTxOs known to the local indexer"""
+
+    try:
+        creator = bytes.fromhex(creator) if creator is not None else None
+
+        if oracle_input is not None:
+            transaction_hash, index = oracle_input.split("#")
+            escrows = indexer.store.escrows_for_oracle(
+                pyc.TransactionInput.from_primitive([transaction_hash, int(index)]),
+                creator,
+                deadline_from,
+                deadline_to,
+            )
+        else:
+            escrows = indexer.store.escrows(
+                bytes.fromhex(policy_id) if policy_id is not None else None,
+                creator,
+                deadline_from,
+                deadline_to,
+            )
+    except ValueError:
+        return {"success": False, "message": "Invalid filter"}, 400
+
+    return {"escrows": [_escrow(entry) for entry in escrows]}, 200
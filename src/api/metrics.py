@@ -0,0 +1,40 @@
+from lib import ex_units, indexer, quorum, responder, settlement, utxos, write_behind
+from model import engines
+
+
+def get():
+    metrics = {
+        "utxo_cache": utxos.cache.stats(),
+        "utxo_lookups": utxos.lookups.stats(),
+        "quorum": quorum.tracker.stats(),
+        "ex_units": ex_units.estimator.stats(),
+    }
+
+    if engines.pools:
+        metrics["database"] = engines.stats()
+
+    if indexer.indexer is not None:
+        metrics["indexer"] = indexer.indexer.stats()
+
+    if write_behind.signatures is not None:
+        metrics["signature_writes"] = write_behind.signatures.stats()
+
+    if responder.worker is not None:
+        metrics["responder"] = responder.worker.stats()
+
+    if settlement.scheduler is not None:
+        metrics["settlement"] = settlement.scheduler.stats()
+
+    managers = []
+    if responder.worker is not None:
+        managers.append(responder.worker.collateral)
+    if settlement.scheduler is not None:
+        managers.extend(settlement.scheduler.collateral.values())
+
+    if managers:
+        metrics["collateral"] = {str(manager.address): manager.stats() for manager in managers}
+        metrics["wallets"] = {
+            str(manager.address): manager.wallet.stats() for manager in managers
+        }
+
+    return metrics, 200
@@ -1,53 +1,270 @@
+from typing import Dict, List, Optional, Tuple, Union
+from datetime import datetime, timedelta
+from blockfrost.utils import ApiError
 from flask import request
-from blockfrost import BlockFrostApi
 from nacl.exceptions import BadSignatureError
 
-from lib import cardano, signature, environment
-from model import Signature, db
+from lib import clients, indexer, quorum, signature, utxos, write_behind
+from model import Signature, db, engines
 
-import os
 
+def _message_hex(data: dict) -> str:
+    return bytes(data["results"], "utf-8").hex()
 
-def submit(proposal_id: str):
-    data = request.json
 
+def _check_results(data: dict) -> Optional[str]:
     if not signature.enforce_standard(data["results"]):
-        return {"success": False, "message": "Results don't follow the standard"}
+        return "Results don't follow the standard"
 
     try:
-        signature.verify(
-            data["pubkey"], bytes(data["results"], "utf-8").hex(), data["signature"]
-        )
-    except BadSignatureError:
-        return {"success": False, "message": "Invalid signature"}
+        signature.verify(data["pubkey"], _message_hex(data), data["signature"])
+    except (BadSignatureError, ValueError):
+        return "Invalid signature"
 
-    env = environment.get_environment(["BLOCKFROST_PROJECT_ID", "NETWORK_MODE"])
+    return None
 
-    print(env["BLOCKFROST_PROJECT_ID"])
 
-    api = BlockFrostApi(
-        project_id=env["BLOCKFROST_PROJECT_ID"],
-        base_url="https://cardano-preprod.blockfrost.io/api"
-        if env["NETWORK_MODE"] == "testnet"
-        else "https://cardano-mainnet.blockfrost.io/api",
-    )
+def _check_oracle(
+    proposal_id: str, data: dict, resolved: Union[utxos.ResolvedInput, str]
+) -> Optional[str]:
+    if isinstance(resolved, str):
+        return resolved
+
+    if resolved.datum is None:
+        return "Script input has no oracle datum"
+
+    if resolved.datum.proposal_id != proposal_id:
+        return "Script input belongs to another proposal"
 
     # Verify whether this is one of the oracles in the UTxO
-    script_input = cardano.utxo_from_input(api, data["transaction_hash"], data["index"])
-    datum = cardano.cbor_datum_to_dict(script_input.output.datum.cbor)
-
-    if not bytes.fromhex(data["pubkey"]) in datum["oracles"]:
-        return {"success": False, "message": "PubKey not within valid oracles"}
-
-    sig = Signature(
-        proposal_id=proposal_id,
-        pubkey=data["pubkey"],
-        signature=data["signature"],
-        results=data["results"],
-        script_input=f"{data['transaction_hash']}#{data['index']}",
+    if not bytes.fromhex(data["pubkey"]) in resolved.datum["oracles"]:
+        return "PubKey not within valid oracles"
+
+    return None
+
+
+# Failures looking up one entry's script input, reported on that entry.
+# Network errors of both Blockfrost clients are OSErrors
+LOOKUP_ERRORS = (ApiError, IndexError, ValueError, OSError)
+
+
+def _lookup_failure(error: Exception) -> str:
+    if isinstance(error, OSError) or (isinstance(error, ApiError) and error.status_code != 404):
+        return "Couldn't look up the transaction input, retry later"
+
+    return "Invalid transaction input"
+
+
+def _resolve(api, transaction_hash: str, index: int) -> Union[utxos.ResolvedInput, str]:
+    """The resolved script input, or why it couldn't be resolved"""
+
+    try:
+        return utxos.resolve(api, transaction_hash, index)
+    except LOOKUP_ERRORS as e:
+        return _lookup_failure(e)
+
+
+def _canonical_hex(value: str) -> str:
+    # Hex is accepted in any case, rows are keyed on a single spelling
+    return bytes.fromhex(value).hex()
+
+
+def _signature_row(proposal_id: str, data: dict) -> dict:
+    return {
+        "proposal_id": proposal_id,
+        "pubkey": _canonical_hex(data["pubkey"]),
+        "signature": data["signature"],
+        "results": data["results"],
+        "script_input": f"{_canonical_hex(data['transaction_hash'])}#{data['index']}",
+    }
+
+
+def _count(row: dict, resolved: utxos.ResolvedInput):
+    quorum.tracker.add(
+        row["script_input"],
+        resolved.datum.proposal_id,
+        row["pubkey"],
+        row["results"],
+        resolved.datum["min_signatures"],
     )
 
-    db.session.add(sig)
+
+def store_signatures(entries: List[Tuple[dict, utxos.ResolvedInput]]):
+    """Upsert and commit signature rows, then count them towards quorum"""
+
+    Signature.upsert([row for row, _ in entries])
     db.session.commit()
 
+    for row, resolved in entries:
+        _count(row, resolved)
+
+
+BUSY = {"success": False, "message": "Too many pending submissions, retry later"}, 503
+
+
+def _store(entries: List[Tuple[dict, utxos.ResolvedInput]]) -> Optional[tuple]:
+    """Store right away or through the write-behind queue, returns the
+    response to give instead if the queue is full"""
+
+    if write_behind.signatures is None:
+        store_signatures(entries)
+        return None
+
+    try:
+        write_behind.signatures.put(entries)
+    except write_behind.QueueFull:
+        return BUSY
+
+    return None
+
+
+def submit(proposal_id: str):
+    data = request.json
+
+    message = _check_results(data)
+    if message is not None:
+        return {"success": False, "message": message}
+
+    api = clients.get_blockfrost()
+
+    resolved = _resolve(api, data["transaction_hash"], data["index"])
+
+    message = _check_oracle(proposal_id, data, resolved)
+    if message is not None:
+        return {"success": False, "message": message}
+
+    busy = _store([(_signature_row(proposal_id, data), resolved)])
+    if busy is not None:
+        return busy
+
     return {"success": True}, 200
+
+
+def submit_batch():
+    entries = request.json["signatures"]
+
+    api = clients.get_blockfrost()
+
+    # Every entry pointing at the same script input shares a single lookup
+    resolved: Dict[Tuple[str, int], Union[utxos.ResolvedInput, str]] = {}
+
+    standard = [signature.enforce_standard(data["results"]) for data in entries]
+    verified = iter(
+        signature.verify_many(
+            (data["pubkey"], _message_hex(data), data["signature"])
+            for data, ok in zip(entries, standard)
+            if ok
+        )
+    )
+
+    results = []
+    rows = []
+    for data, ok in zip(entries, standard):
+        if not ok:
+            message = "Results don't follow the standard"
+        elif not next(verified):
+            message = "Invalid signature"
+        else:
+            key = (data["transaction_hash"], data["index"])
+            if key not in resolved:
+                resolved[key] = _resolve(api, *key)
+
+            message = _check_oracle(data["proposal_id"], data, resolved[key])
+
+        if message is not None:
+            results.append({"success": False, "message": message})
+            continue
+
+        rows.append((_signature_row(data["proposal_id"], data), resolved[key]))
+        results.append({"success": True})
+
+    if rows:
+        busy = _store(rows)
+        if busy is not None:
+            return busy
+
+    return {"success": True, "results": results}, 200
+
+
+def get_quorum(proposal_id: str):
+    tallies = quorum.tracker.reached(proposal_id)
+
+    return {
+        "reached": len(tallies) > 0,
+        "quorums": [tally.to_dict() for tally in tallies],
+    }, 200
+
+
+def list_quorums():
+    return {"quorums": [tally.to_dict() for tally in quorum.tracker.reached()]}, 200
+
+
+def list_requests(proposal_id: str):
+    """Oracle script UTxOs of a proposal known to the local indexer"""
+
+    requests = sorted(
+        indexer.store.by_proposal(proposal_id), key=lambda entry: entry.slot
+    )
+
+    return {
+        "requests": [
+            {
+                "transaction_hash": str(entry.utxo.input.transaction_id),
+                "index": entry.utxo.input.index,
+                "slot": entry.slot,
+                "min_signatures": entry.datum["min_signatures"],
+                "answered": entry.datum["results"] is not None,
+            }
+            for entry in requests
+        ]
+    }, 200
+
+
+def stored_signatures(script_input: str, results: str) -> Dict[str, str]:
+    """Signatures agreeing on `results` for a script input, keyed by pubkey"""
+
+    def query(session) -> Dict[str, str]:
+        return dict(
+            session.query(Signature.pubkey, Signature.signature).filter_by(
+                script_input=script_input, results=results
+            )
+        )
+
+    with engines.read_session() as session:
+        signatures = query(session)
+
+    # A lagging replica can miss signatures that were already counted
+    tally = quorum.tracker.get(script_input)
+    if tally is not None and tally.results == results and not tally.pubkeys <= signatures.keys():
+        signatures = query(db.session)
+
+    return signatures
+
+
+def warm_up_quorum(window: float = None):
+    """Rebuild the quorum tracker from the signatures stored in the last
+    `window` seconds, all of them when None
+
+    Requests are answered soon after their oracles sign, older signatures
+    are left out so a worker doesn't resolve every input it ever saw.
+    """
+
+    api = clients.get_blockfrost()
+
+    def min_signatures(script_input: str):
+        transaction_hash, index = script_input.split("#")
+        return utxos.resolve(api, transaction_hash, int(index)).datum["min_signatures"]
+
+    with engines.read_session() as session:
+        query = session.query(
+            Signature.script_input,
+            Signature.proposal_id,
+            Signature.pubkey,
+            Signature.results,
+        )
+
+        if window is not None:
+            since = datetime.utcnow() - timedelta(seconds=window)
+            query = query.filter(Signature.creation_date >= since)
+
+        quorum.warm_up(query.yield_per(1000), min_signatures)
@@ -0,0 +1,125 @@
+"""Async handlers of the oracle submissions, used by the async serving mode
+
+Same checks and responses as `api.oracles`, but the script input lookup
+awaits the async Blockfrost client and signatures are stored through an
+async session, so a submission waiting on the network doesn't hold a worker.
+`async_app.py` routes the `api.oracles.submit*` operations here.
+"""
+
+from typing import Dict, List, Optional, Tuple, Union
+
+import asyncio
+
+from api.oracles import (
+    BUSY,
+    LOOKUP_ERRORS,
+    _check_oracle,
+    _check_results,
+    _count,
+    _lookup_failure,
+    _message_hex,
+    _signature_row,
+)
+from lib import clients, signature, utxos, write_behind
+from model import aio
+
+
+async def _resolve(api, transaction_hash: str, index: int) -> Union[utxos.ResolvedInput, str]:
+    try:
+        return await utxos.resolve_async(api, transaction_hash, index)
+    except LOOKUP_ERRORS as e:
+        return _lookup_failure(e)
+
+
+async def _store(entries: List[Tuple[dict, utxos.ResolvedInput]]) -> Optional[tuple]:
+    if write_behind.signatures is None:
+        await aio.upsert_signatures([row for row, _ in entries])
+
+        for row, resolved in entries:
+            _count(row, resolved)
+
+        return None
+
+    # Blocks while the queue is full, or until written in group durability
+    try:
+        await asyncio.to_thread(write_behind.signatures.put, entries)
+    except write_behind.QueueFull:
+        return BUSY
+
+    return None
+
+
+async def submit(proposal_id: str, body: dict):
+    data = body
+
+    message = _check_results(data)
+    if message is not None:
+        return {"success": False, "message": message}
+
+    api = clients.get_async_blockfrost()
+
+    resolved = await _resolve(api, data["transaction_hash"], data["index"])
+
+    message = _check_oracle(proposal_id, data, resolved)
+    if message is not None:
+        return {"success": False, "message": message}
+
+    busy = await _store([(_signature_row(proposal_id, data), resolved)])
+    if busy is not None:
+        return busy
+
+    return {"success": True}, 200
+
+
+async def submit_batch(body: dict):
+    entries = body["signatures"]
+
+    api = clients.get_async_blockfrost()
+
+    standard = [signature.enforce_standard(data["results"]) for data in entries]
+    verified = iter(
+        signature.verify_many(
+            (data["pubkey"], _message_hex(data), data["signature"])
+            for data, ok in zip(entries, standard)
+            if ok
+        )
+    )
+
+    valid = [ok and next(verified) for data, ok in zip(entries, standard)]
+
+    # Every distinct script input is looked up once, all of them concurrently
+    keys = list(
+        {
+            (data["transaction_hash"], data["index"]): None
+            for data, ok in zip(entries, valid)
+            if ok
+        }
+    )
+    resolved: Dict[Tuple[str, int], Union[utxos.ResolvedInput, str]] = dict(
+        zip(keys, await asyncio.gather(*(_resolve(api, *key) for key in keys)))
+    )
+
+    results = []
+    rows = []
+    for data, ok, is_standard in zip(entries, valid, standard):
+        if not is_standard:
+            message = "Results don't follow the standard"
+        elif not ok:
+            message = "Invalid signature"
+        else:
+            key = (data["transaction_hash"], data["index"])
+            message = _check_oracle(data["proposal_id"], data, resolved[key])
+
+        if message is not None:
+            results.append({"success": False, "message": message})
+            continue
+
+        rows.append((_signature_row(data["proposal_id"], data), resolved[key]))
+        results.append({"success": True})
+
+    if rows:
+        busy = await _store(rows)
+        if busy is not None:
+            return busy
+
+    return {"success": True, "results": results}, 200
@@ -1,17 +1,36 @@
 import os
+import atexit
+import threading
 import connexion
 import logging
+import pycardano as pyc
 
 from flask_sqlalchemy import SQLAlchemy
 from dotenv import load_dotenv
 from flask_cors import CORS
 from flask_migrate import Migrate
-from model import Dummy, db
+from model import db, engines, signature
+from lib import (chain_context, clients, collateral, indexer, quorum,
+                 responder, scripts, settlement, utxos, write_behind)
+from api import oracles
 
 load_dotenv()
 
 LOGLEVEL = os.environ.get('LOGLEVEL', 'WARNING').upper()
 DB_CONN = os.environ.get('DB_CONN')
+DB_REPLICA_CONN = os.environ.get('DB_REPLICA_CONN')
+RESPONDER_SKEY = os.environ.get('RESPONDER_SKEY')
+ORACLE_SCRIPT = os.environ.get(
+    'ORACLE_SCRIPT',
+    os.path.join(os.path.dirname(__file__), '..', 'scripts', 'oracle.plutus'))
+INDEXER_SOURCE = os.environ.get('INDEXER_SOURCE')
+INDEXER_START = os.environ.get('INDEXER_START')
+SERVER_MODE = os.environ.get('SERVER_MODE', 'sync')
+SIGNATURE_DURABILITY = os.environ.get('SIGNATURE_DURABILITY', 'commit')
+SETTLEMENT_SKEYS = os.environ.get('SETTLEMENT_SKEYS')
+COLLATERAL_POOL_SIZE = int(os.environ.get('COLLATERAL_POOL_SIZE', 4))
+QUORUM_WARM_UP_WINDOW = float(
+    os.environ.get('QUORUM_WARM_UP_WINDOW', 7 * 24 * 3600))
 
 
 logging.basicConfig(level=LOGLEVEL,
@@ -24,20 +43,176 @@ conn = connexion.App(__name__, specification_dir='./api', options=options)
 conn.add_api('openapi-spec.yml')
 app = conn.app
 
+signature.check_dialect(DB_CONN)
+
 app.config['SQLALCHEMY_DATABASE_URI'] = DB_CONN
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engines.engine_options(
+    DB_CONN, 'primary', os.environ)
+
+engines.init_replica(DB_REPLICA_CONN, os.environ)
 
 app = conn.app
 
+clients.init()
+
 db.init_app(app)
 migrate = Migrate(app, db, compare_type=True)
 
+if INDEXER_SOURCE:
+    start = None
+    if INDEXER_START:
+        slot, block_hash = INDEXER_START.split(':')
+        start = indexer.Point(int(slot), block_hash)
+
+    indexer.indexer = indexer.Indexer(
+        indexer.source(INDEXER_SOURCE),
+        indexer.store,
+        [
+            scripts.from_file(ORACLE_SCRIPT).address(clients.network()),
+            scripts.escrow().address(clients.network()),
+        ],
+        start,
+    )
+
+    indexer.store.on_spent(utxos.invalidate)
+    indexer.store.on_spent(quorum.tracker.on_spent)
+
+
+def key_address(signing_key):
+    return pyc.Address(
+        payment_part=pyc.VerificationKey.from_signing_key(signing_key).hash(),
+        network=clients.network())
+
+
+def local_chain_context(wallets):
+    # An indexer started past the origin misses the wallets' older UTxOs
+    return chain_context.LocalIndexedChainContext(
+        indexer.store, clients.get_chain_context(),
+        upstream_addresses=wallets if INDEXER_START else ())
+
+
+if RESPONDER_SKEY:
+    def load_signatures(script_input, results):
+        with app.app_context():
+            return oracles.stored_signatures(script_input, results)
+
+    responder_skey = pyc.PaymentSigningKey.from_cbor(RESPONDER_SKEY)
+
+    responder_context = clients.get_chain_context()
+    responder_ready = None
+    # Without an indexer reporting them spent, responses are looked up
+    responder_confirmed = clients.transaction_landed
+    if indexer.indexer is not None:
+        responder_context = local_chain_context([key_address(responder_skey)])
+        responder_confirmed = None
+
+        # Until then the store can't tell which script inputs are spent
+        def responder_ready():
+            return indexer.indexer.synced
+
+    responder.worker = responder.Responder(
+        responder_context,
+        clients.get_blockfrost(),
+        responder_skey,
+        scripts.from_file(ORACLE_SCRIPT),
+        load_signatures,
+        collateral.CollateralManager(
+            responder_context, responder_skey, pool_size=COLLATERAL_POOL_SIZE,
+            confirmed=responder_confirmed),
+        ready=responder_ready,
+    )
+
+    quorum.tracker.on_quorum(responder.worker.on_quorum)
+    responder.worker.on_done(quorum.tracker.discard)
+    responder.worker.start()
+
+    atexit.register(responder.worker.stop)
+
+    if indexer.indexer is not None:
+        # Collateral is released once the responses land
+        indexer.indexer.track(responder.worker.address)
+        indexer.store.on_spent(responder.worker.collateral.on_spent)
+
+if SETTLEMENT_SKEYS:
+    if indexer.indexer is None:
+        raise ValueError("SETTLEMENT_SKEYS requires INDEXER_SOURCE")
+
+    settlement_skeys = [pyc.PaymentSigningKey.from_cbor(key)
+                        for key in SETTLEMENT_SKEYS.split(',')]
+
+    settlement.scheduler = settlement.Scheduler(
+        local_chain_context([key_address(key) for key in settlement_skeys]),
+        indexer.store,
+        settlement_skeys,
+        scripts.escrow(),
+        oracle_script=scripts.from_file(ORACLE_SCRIPT),
+        wallet_concurrency=int(
+            os.environ.get('SETTLEMENT_WALLET_CONCURRENCY', 1)),
+        max_workers=int(os.environ.get('SETTLEMENT_WORKERS', 4)),
+        collateral_pool_size=COLLATERAL_POOL_SIZE,
+    )
+
+    # Their collateral is released as the indexer sees it spent
+    for wallet, manager in settlement.scheduler.collateral.items():
+        indexer.indexer.track(settlement.scheduler.address(wallet))
+        indexer.store.on_spent(manager.on_spent)
+
+    indexer.store.on_added(settlement.scheduler.on_added)
+    settlement.scheduler.load()
+    settlement.scheduler.start()
+
+    atexit.register(settlement.scheduler.stop)
+
+if SIGNATURE_DURABILITY != 'commit':
+    def write_signatures(entries):
+        with app.app_context():
+            oracles.store_signatures(entries)
+
+    write_behind.signatures = write_behind.WriteBehind(
+        write_signatures,
+        durability=SIGNATURE_DURABILITY,
+        max_pending=int(os.environ.get('SIGNATURE_QUEUE_SIZE', 10_000)),
+        batch_size=int(os.environ.get('SIGNATURE_BATCH_SIZE', 500)),
+        flush_interval=float(os.environ.get('SIGNATURE_FLUSH_INTERVAL', 0.05)),
+    )
+    write_behind.signatures.start()
+
+    # Registered after the responder, so it drains before the responder stops
+    atexit.register(write_behind.signatures.stop)
+
+if indexer.indexer is not None:
+    indexer.indexer.start_thread()
+
+    atexit.register(indexer.indexer.stop)
+
 with app.app_context():
     db.create_all()
 
+
+def warm_up_quorum():
+    with app.app_context():
+        oracles.warm_up_quorum(QUORUM_WARM_UP_WINDOW)
+
+
+# Resolving the thresholds takes a lookup per script input, workers start
+# serving meanwhile
+threading.Thread(target=warm_up_quorum, name='quorum-warm-up', daemon=True).start()
+
 cors.init_app(app)
 
 application = app
 
+if SERVER_MODE == 'async':
+    import async_app
+
+    async_conn = async_app.create(app)
+    application = async_conn.app
+elif SERVER_MODE != 'sync':
+    raise ValueError(f"Unknown SERVER_MODE {SERVER_MODE}")
+
 if __name__ == '__main__':
-    app.run(port=8080, debug=True)
\ No newline at end of file
+    if SERVER_MODE == 'async':
+        async_conn.run(port=8080)
+    else:
+        app.run(port=8080, debug=True)
\ No newline at end of file
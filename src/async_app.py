@@ -0,0 +1,48 @@
+"""Async serving mode, selected with SERVER_MODE=async (see `app.py`)
+
+Serves the same `openapi-spec.yml` with connexion's aiohttp app. Oracle
+submissions are routed to the coroutines of `api/oracles_async.py`, so one
+process keeps many of them in flight while they wait on Blockfrost and the
+database; every other operation runs its usual handler.
+
+Startup (database, indexer, responder, quorum warm up) is shared with the
+Flask app, which is still what the responder and migrations use.
+"""
+
+import connexion
+import os
+
+from connexion.resolver import Resolver
+from connexion.utils import get_function_from_name
+from flask import Flask
+
+from lib import clients
+from model import aio, engines
+
+
+ASYNC_HANDLERS = {
+    "api.oracles.submit": "api.oracles_async.submit",
+    "api.oracles.submit_batch": "api.oracles_async.submit_batch",
+}
+
+
+def resolve_handler(operation_id: str):
+    return get_function_from_name(ASYNC_HANDLERS.get(operation_id, operation_id))
+
+
+def create(flask_app: Flask, specification_dir: str = "./api") -> connexion.AioHttpApp:
+    conn = connexion.AioHttpApp(
+        __name__, specification_dir=specification_dir, options={"swagger_ui": True}
+    )
+    conn.add_api("openapi-spec.yml", resolver=Resolver(function_resolver=resolve_handler))
+
+    url = flask_app.config["SQLALCHEMY_DATABASE_URI"]
+    aio.init(url, **engines.pool_settings(url, os.environ))
+
+    async def cleanup(_):
+        await clients.close_async()
+        await aio.dispose()
+
+    conn.app.on_cleanup.append(cleanup)
+
+    return conn
@@ -1,42 +1,68 @@
 from __future__ import annotations
-from typing import Dict, Tuple, List, Union
+from typing import Callable, Dict, Tuple, List, Optional, Union
 from blockfrost import BlockFrostApi
 
 import pycardano as pyc
 import cbor2
 
-from lib import data_types
+from lib import (
+    coin_selection,
+    data_types,
+    escrow_datum,
+    ex_units,
+    indexer,
+    oracle_datum,
+    scripts,
+)
+from lib.vote_results import VoteResults
+
+
+# Only used so the builders account for a witness when estimating fees, the
+# real signature is added afterwards by `assemble_transaction`
+DUMMY_KEY: pyc.PaymentSigningKey = pyc.PaymentSigningKey.from_cbor(
+    "5820ac29084c8ceca56b02c4118e76c1845c40b5eb810444a069e8edf2f5280ee875"
+)
+
+# Lovelace kept on top of the requested outputs to pay for fees and change
+CHANGE_MARGIN = 2_000_000
+
+# Bytes reserved in a batched transaction for everything but its script
+# outputs (body fields, change output, witnesses), and per extra input
+BATCH_TX_OVERHEAD = 1_000
+BATCH_INPUT_SIZE = 50
+
+# Lovelace a UTxO needs to be used as collateral
+COLLATERAL_AMOUNT = 5_000_000
+
+# Lovelace reserved for the fee of every transaction in a batch
+BATCH_FEE_RESERVE = 1_000_000
+
+# Bytes of a spend redeemer besides its data (tag, index and units)
+BATCH_REDEEMER_SIZE = 20
+
+
+def _as_value(amount: Union[int, pyc.Value]) -> pyc.Value:
+    return amount if isinstance(amount, pyc.Value) else pyc.Value(amount)
 
 
 def create_data_request(
     chain_context: pyc.ChainContext,
-    input_utxos: List[pyc.UTxO],
+    input_utxos: Union[List[pyc.UTxO], coin_selection.UTxOIndex],
     change_address: pyc.Address,
-    script_hex: str,
+    script: Union[str, scripts.Script],
     script_amount: pyc.Value,
     script_datum: pyc.Datum,
+    strategy: str = None,
 ):
-    oracle_script = cbor2.loads(bytes.fromhex(script_hex))
-    script_hash = pyc.plutus_script_hash(pyc.PlutusV2Script(oracle_script))
-    script_address = pyc.Address(script_hash, network=pyc.Network.TESTNET)
+    script_address = scripts.resolve(script).address(chain_context.network)
 
     builder = pyc.TransactionBuilder(chain_context)
 
-    target_value = pyc.Value()
-    target_value += script_amount
-    if isinstance(target_value, int):
-        target_value = pyc.Value(target_value)
-    
-    target_value += pyc.Value(2_000_000)
+    target_value = _as_value(script_amount) + pyc.Value(CHANGE_MARGIN)
 
-    total_value = pyc.Value(0)
-    for utxo in input_utxos:
+    for utxo in coin_selection.select(input_utxos, target_value, strategy):
         builder.add_input(utxo)
 
-        total_value += utxo.output.amount
-        if total_value >= target_value:
-            break
-
     builder.add_output(
         pyc.TransactionOutput(
             address=script_address,
@@ -45,12 +71,8 @@ def create_data_request(
         ),
     )
 
-    dummy_key: pyc.PaymentSigningKey = pyc.PaymentSigningKey.from_cbor(
-        "5820ac29084c8ceca56b02c4118e76c1845c40b5eb810444a069e8edf2f5280ee875"
-    )
-
     transaction = builder.build_and_sign(
-        signing_keys=[dummy_key],
+        signing_keys=[DUMMY_KEY],
         change_address=change_address,
         merge_change=True,
     )
@@ -58,32 +80,181 @@ def create_data_request(
     return transaction
 
 
+def create_data_requests_batch(
+    chain_context: pyc.ChainContext,
+    input_utxos: Union[List[pyc.UTxO], coin_selection.UTxOIndex],
+    change_address: pyc.Address,
+    script: Union[str, scripts.Script],
+    requests: List[Tuple[pyc.Datum, Union[int, pyc.Value]]],
+    strategy: str = None,
+) -> List[pyc.Transaction]:
+    """Create many data requests, packing as many script outputs per
+    transaction as the protocol's max_tx_size allows
+
+    Inputs are selected once for the whole batch and spent by the first
+    transaction, every following transaction spends the change of the
+    previous one, so they must be submitted in order. The fee reserve is an
+    estimate, a change left short by more transactions than expected is
+    topped up with other `input_utxos`.
+    """
+
+    script_address = scripts.resolve(script).address(chain_context.network)
+
+    outputs = [
+        pyc.TransactionOutput(
+            address=script_address,
+            amount=amount,
+            datum=datum,
+        )
+        for datum, amount in requests
+    ]
+    sizes = [len(output.to_cbor("bytes")) for output in outputs]
+
+    max_size = chain_context.protocol_param.max_tx_size - BATCH_TX_OVERHEAD
+
+    # Estimate how many transactions we need, so a single selection covers
+    # the fees of all of them
+    transactions_needed = 1
+    used = 0
+    for size in sizes:
+        if used and used + size > max_size:
+            transactions_needed += 1
+            used = 0
+
+        used += size
+
+    target_value = pyc.Value(
+        CHANGE_MARGIN + BATCH_FEE_RESERVE * transactions_needed
+    )
+    for output in outputs:
+        target_value += _as_value(output.amount)
+
+    inputs = coin_selection.select(input_utxos, target_value, strategy)
+    selected = {utxo.input for utxo in inputs}
+
+    transactions = []
+    start = 0
+    while start < len(outputs):
+        budget = max_size - BATCH_INPUT_SIZE * (len(inputs) - 1)
+
+        end = start + 1
+        used = sizes[start]
+        while end < len(outputs) and used + sizes[end] <= budget:
+            used += sizes[end]
+            end += 1
+
+        short = (
+            sum(_as_value(output.amount).coin for output in outputs[start:end])
+            + CHANGE_MARGIN
+            - sum(_as_value(utxo.output.amount).coin for utxo in inputs)
+        )
+        if short > 0:
+            # Assets aren't spent on fees, only lovelace can run short
+            top_up = coin_selection.select(
+                [utxo for utxo in input_utxos if utxo.input not in selected], short, strategy
+            )
+            selected.update(utxo.input for utxo in top_up)
+            inputs = inputs + top_up
+
+        while True:
+            builder = pyc.TransactionBuilder(chain_context)
+
+            for utxo in inputs:
+                builder.add_input(utxo)
+
+            for output in outputs[start:end]:
+                builder.add_output(output)
+
+            try:
+                transaction = builder.build_and_sign(
+                    signing_keys=[DUMMY_KEY],
+                    change_address=change_address,
+                    merge_change=True,
+                )
+                break
+            except pyc.InvalidTransactionException:
+                # Our size estimate was too optimistic
+                if end - start == 1:
+                    raise
+
+                end -= 1
+
+        transactions.append(transaction)
+        start = end
+
+        if start < len(outputs):
+            inputs = [_change_utxo(transaction, change_address)]
+
+    return transactions
+
+
+def create_collateral(
+    chain_context: pyc.ChainContext,
+    input_utxos: Union[List[pyc.UTxO], coin_selection.UTxOIndex],
+    change_address: pyc.Address,
+    amount: int,
+    count: int,
+    strategy: str = None,
+) -> pyc.Transaction:
+    """Split funds into `count` ADA-only outputs of `amount` lovelace
+
+    The change gets an output of its own instead of being merged into them.
+    """
+
+    builder = pyc.TransactionBuilder(chain_context)
+
+    for utxo in coin_selection.select(
+        input_utxos, amount * count + CHANGE_MARGIN, strategy
+    ):
+        builder.add_input(utxo)
+
+    for _ in range(count):
+        builder.add_output(pyc.TransactionOutput(address=change_address, amount=amount))
+
+    return builder.build_and_sign(
+        signing_keys=[DUMMY_KEY],
+        change_address=change_address,
+    )
+
+
+def _change_utxo(transaction: pyc.Transaction, change_address: pyc.Address) -> pyc.UTxO:
+    for index, output in enumerate(transaction.transaction_body.outputs):
+        if output.address == change_address and output.datum is None:
+            return pyc.UTxO(
+                pyc.TransactionInput(transaction.transaction_body.id, index), output
+            )
+
+    raise ValueError("Transaction has no change output to chain from")
+
+
 def submit_oracles_data(
     chain_context: pyc.ChainContext,
     collateral_input: pyc.UTxO,
     script_utxo: pyc.UTxO,
-    script_hex: str,
-    script_datum: pyc.Datum,
+    script: Union[str, scripts.Script],
+    script_datum: Union[pyc.Datum, oracle_datum.OracleDatum],
     payment_address: pyc.Address,
     results: bytes,
     signatures: List[bytes],
 ):
-    oracle_script = cbor2.loads(bytes.fromhex(script_hex))
-    script_hash = pyc.plutus_script_hash(pyc.PlutusV2Script(oracle_script))
-    script_address = pyc.Address(script_hash, network=pyc.Network.TESTNET)
+    oracle_script = scripts.resolve(script)
+    script_address = oracle_script.address(chain_context.network)
+
+    shape = ex_units.oracle_shape(results, signatures)
+    redeemer = ex_units.estimator.redeemer(
+        oracle_script.hash, shape, data_types.oracle_redeemer(results, signatures)
+    )
+    evaluate = redeemer.ex_units is None
 
     builder = pyc.TransactionBuilder(chain_context)
+    ex_units.estimator.prepare(builder)
 
     builder.collaterals = [collateral_input]
 
     builder.add_script_input(
         script_utxo,
-        script=pyc.PlutusV2Script(oracle_script),
-        redeemer=pyc.Redeemer(
-            pyc.RedeemerTag.SPEND,
-            data_types.oracle_redeemer(results, signatures),
-            # ex_units=pyc.ExecutionUnits(789_350, 301_678_278)
-        ),
+        script=oracle_script.plutus_script,
+        redeemer=redeemer,
     )
 
     builder.add_output(
@@ -94,34 +265,34 @@ def submit_oracles_data(
         ),
     )
 
-    dummy_key: pyc.PaymentSigningKey = pyc.PaymentSigningKey.from_cbor(
-        "5820ac29084c8ceca56b02c4118e76c1845c40b5eb810444a069e8edf2f5280ee875"
-    )
-
     transaction = builder.build_and_sign(
-        signing_keys=[dummy_key],
+        signing_keys=[DUMMY_KEY],
         change_address=payment_address,
         merge_change=True,
     )
 
+    if evaluate:
+        ex_units.estimator.record(oracle_script.hash, shape, redeemer.ex_units)
+
     return transaction
 
 
 def create_escrow(
     chain_context: pyc.ChainContext,
-    input_utxos: List[pyc.UTxO],
+    input_utxos: Union[List[pyc.UTxO], coin_selection.UTxOIndex],
     change_address: pyc.Address,
-    script_hex: str,
+    script: Union[str, scripts.Script],
     script_amount: pyc.Value,
     script_datum: pyc.Datum,
+    strategy: str = None,
 ):
-    escrow_script = cbor2.loads(bytes.fromhex(script_hex))
-    script_hash = pyc.plutus_script_hash(pyc.PlutusV2Script(escrow_script))
-    script_address = pyc.Address(script_hash, network=pyc.Network.TESTNET)
+    script_address = scripts.resolve(script).address(chain_context.network)
 
     builder = pyc.TransactionBuilder(chain_context)
 
-    for utxo in input_utxos:
+    target_value = _as_value(script_amount) + pyc.Value(CHANGE_MARGIN)
+
+    for utxo in coin_selection.select(input_utxos, target_value, strategy):
         builder.add_input(utxo)
 
     builder.add_output(
@@ -132,12 +303,8 @@ def create_escrow(
         ),
     )
 
-    dummy_key: pyc.PaymentSigningKey = pyc.PaymentSigningKey.from_cbor(
-        "5820ac29084c8ceca56b02c4118e76c1845c40b5eb810444a069e8edf2f5280ee875"
-    )
-
     transaction = builder.build_and_sign(
-        signing_keys=[dummy_key],
+        signing_keys=[DUMMY_KEY],
         change_address=change_address,
         merge_change=True,
     )
@@ -145,20 +312,39 @@ def create_escrow(
     return transaction
 
 
+def _escrow_datum(script_utxo: pyc.UTxO) -> Optional[escrow_datum.EscrowDatum]:
+    datum = script_utxo.output.datum
+    if datum is None:
+        return None
+
+    try:
+        return escrow_datum.decode(
+            datum.cbor if isinstance(datum, pyc.RawCBOR) else datum.to_cbor("bytes")
+        )
+    except ValueError:
+        return None
+
+
 def execute_escrow(
     chain_context: pyc.ChainContext,
     collateral_input: pyc.UTxO,
     script_utxo: pyc.UTxO,
-    script_hex: str,
+    script: Union[str, scripts.Script],
     oracle_reference: pyc.TransactionInput,
     receiver_address: pyc.Address,
-    vote_results: List[List[Tuple[int, int]]],
+    vote_results: Union[List[List[Tuple[int, int]]], VoteResults],
 ):
-    escrow = cbor2.loads(bytes.fromhex(script_hex))
-    # script_hash = pyc.plutus_script_hash(pyc.PlutusV2Script(escrow))
-    # script_address = pyc.Address(script_hash, network=pyc.Network.TESTNET)
+    escrow = scripts.resolve(script)
+
+    if not isinstance(vote_results, VoteResults):
+        vote_results = VoteResults.from_lists(vote_results)
+
+    shape = ex_units.escrow_shape(vote_results, _escrow_datum(script_utxo))
+    redeemer = ex_units.estimator.redeemer(escrow.hash, shape, vote_results.redeemer())
+    evaluate = redeemer.ex_units is None
 
     builder = pyc.TransactionBuilder(chain_context)
+    ex_units.estimator.prepare(builder)
 
     builder.collaterals = [collateral_input]
 
@@ -170,29 +356,308 @@ def execute_escrow(
 
     builder.add_script_input(
         script_utxo,
-        script=pyc.PlutusV2Script(escrow),
-        redeemer=pyc.Redeemer(
-            pyc.RedeemerTag.SPEND,
-            data_types.escrow_redeemer(
-                data_types.EscrowRedeemer.EscrowExecution, 0, vote_results
-            ),
-            # ex_units=pyc.ExecutionUnits(789_350, 301_678_278)
-        ),
-    )
-
-    dummy_key: pyc.PaymentSigningKey = pyc.PaymentSigningKey.from_cbor(
-        "5820ac29084c8ceca56b02c4118e76c1845c40b5eb810444a069e8edf2f5280ee875"
+        script=escrow.plutus_script,
+        redeemer=redeemer,
     )
 
     transaction = builder.build_and_sign(
-        signing_keys=[dummy_key],
+        signing_keys=[DUMMY_KEY],
         change_address=receiver_address,
         merge_change=True,
     )
 
+    if evaluate:
+        ex_units.estimator.record(escrow.hash, shape, redeemer.ex_units)
+
     return transaction
 
 
+def _spend_escrows(
+    chain_context: pyc.ChainContext,
+    collateral_input: pyc.UTxO,
+    script_utxos: List[pyc.UTxO],
+    escrow: scripts.Script,
+    data: pyc.Datum,
+    units: Union[None, pyc.ExecutionUnits, List[pyc.ExecutionUnits]],
+    change_address: pyc.Address,
+    prepare: Callable[[pyc.TransactionBuilder], None],
+) -> Tuple[pyc.Transaction, List[pyc.Redeemer]]:
+    """Spend `script_utxos`, with the same `units` for every input or one per
+    input, returns the transaction and the redeemers of the inputs in order"""
+
+    builder = pyc.TransactionBuilder(chain_context)
+    ex_units.estimator.prepare(builder)
+
+    builder.collaterals = [collateral_input]
+    prepare(builder)
+
+    if not isinstance(units, list):
+        units = [units] * len(script_utxos)
+
+    redeemers = []
+    for script_utxo, input_units in zip(script_utxos, units):
+        redeemer = pyc.Redeemer(
+            pyc.RedeemerTag.SPEND,
+            data,
+            ex_units=(
+                pyc.ExecutionUnits(input_units.mem, input_units.steps)
+                if input_units
+                else None
+            ),
+        )
+        builder.add_script_input(
+            script_utxo, script=escrow.plutus_script, redeemer=redeemer
+        )
+        redeemers.append(redeemer)
+
+    transaction = builder.build_and_sign(
+        signing_keys=[DUMMY_KEY],
+        change_address=change_address,
+        merge_change=True,
+    )
+
+    # The builder set the index of every redeemer
+    return transaction, redeemers
+
+
+def _evaluate_escrows(
+    chain_context: pyc.ChainContext,
+    transaction: pyc.Transaction,
+    redeemers: List[pyc.Redeemer],
+) -> List[pyc.ExecutionUnits]:
+    """The units each input of `transaction` spends, padded by our margin"""
+
+    evaluated = chain_context.evaluate_tx(transaction.to_cbor())
+
+    return [
+        ex_units.estimator.pad(evaluated[f"spend:{redeemer.index}"])
+        for redeemer in redeemers
+    ]
+
+
+def _spend_escrows_packed(
+    chain_context: pyc.ChainContext,
+    collateral_input: pyc.UTxO,
+    script_utxos: List[pyc.UTxO],
+    escrow: scripts.Script,
+    data: pyc.Datum,
+    shape: ex_units.Shape,
+    change_address: pyc.Address,
+    prepare: Callable[[pyc.TransactionBuilder], None],
+) -> List[pyc.Transaction]:
+    # How many inputs fit in a transaction is guessed from the units of a
+    # single escrow. The builder can't evaluate several script inputs at
+    # once (it matches the evaluated units to redeemers before indexing
+    # them), so they are measured by building a single spend when unknown
+    units = ex_units.estimator.get(escrow.hash, shape)
+    if units is None:
+        transaction, redeemers = _spend_escrows(
+            chain_context,
+            collateral_input,
+            script_utxos[:1],
+            escrow,
+            data,
+            None,
+            change_address,
+            prepare,
+        )
+        units = redeemers[0].ex_units
+        ex_units.estimator.record(escrow.hash, shape, units)
+
+    params = chain_context.protocol_param
+    max_size = params.max_tx_size - BATCH_TX_OVERHEAD - len(escrow.plutus_script)
+    data_size = len(data.cbor if isinstance(data, pyc.RawCBOR) else data.to_cbor("bytes"))
+    input_size = BATCH_INPUT_SIZE + BATCH_REDEEMER_SIZE + data_size
+
+    per_transaction = max(
+        1,
+        min(
+            max_size // input_size,
+            params.max_tx_ex_mem // max(units.mem, 1),
+            params.max_tx_ex_steps // max(units.steps, 1),
+        ),
+    )
+
+    transactions = []
+    start = 0
+    while start < len(script_utxos):
+        end = min(len(script_utxos), start + per_transaction)
+
+        while True:
+            try:
+                transaction, redeemers = _spend_escrows(
+                    chain_context,
+                    collateral_input,
+                    script_utxos[start:end],
+                    escrow,
+                    data,
+                    units,
+                    change_address,
+                    prepare,
+                )
+            except pyc.InvalidTransactionException:
+                # Our size estimate was too optimistic
+                if end - start == 1:
+                    raise
+
+                end -= 1
+                continue
+
+            # Inputs of a same transaction don't cost what a lone one does,
+            # the packed transaction is evaluated and built again with the
+            # units of each of its inputs
+            evaluated = _evaluate_escrows(chain_context, transaction, redeemers)
+            mem = sum(input_units.mem for input_units in evaluated)
+            steps = sum(input_units.steps for input_units in evaluated)
+
+            count = end - start
+            if count > 1 and (mem > params.max_tx_ex_mem or steps > params.max_tx_ex_steps):
+                # The next transactions won't fit more inputs either
+                end -= 1
+                per_transaction = end - start
+                continue
+
+            for input_units in evaluated:
+                ex_units.estimator.record(escrow.hash, shape, input_units)
+
+            try:
+                transaction, _ = _spend_escrows(
+                    chain_context,
+                    collateral_input,
+                    script_utxos[start:end],
+                    escrow,
+                    data,
+                    evaluated,
+                    change_address,
+                    prepare,
+                )
+                break
+            except pyc.InvalidTransactionException:
+                if count == 1:
+                    raise
+
+                end -= 1
+
+        transactions.append(transaction)
+        start = end
+
+    return transactions
+
+
+def _spend_escrows_batch(
+    chain_context: pyc.ChainContext,
+    collateral_input: pyc.UTxO,
+    script_utxos: List[pyc.UTxO],
+    escrow: scripts.Script,
+    data: pyc.Datum,
+    shape: Callable[[Optional[escrow_datum.EscrowDatum]], ex_units.Shape],
+    change_address: pyc.Address,
+    prepare: Callable[[pyc.TransactionBuilder], None],
+) -> List[pyc.Transaction]:
+    # Escrows with datums of different shapes don't spend the same units,
+    # each shape is packed on its own
+    groups: Dict[ex_units.Shape, List[pyc.UTxO]] = {}
+    for script_utxo in script_utxos:
+        groups.setdefault(shape(_escrow_datum(script_utxo)), []).append(script_utxo)
+
+    transactions = []
+    for group_shape, group in groups.items():
+        transactions.extend(
+            _spend_escrows_packed(
+                chain_context,
+                collateral_input,
+                group,
+                escrow,
+                data,
+                group_shape,
+                change_address,
+                prepare,
+            )
+        )
+
+    return transactions
+
+
+def execute_escrows_batch(
+    chain_context: pyc.ChainContext,
+    collateral_input: pyc.UTxO,
+    script_utxos: List[pyc.UTxO],
+    script: Union[str, scripts.Script],
+    oracle_reference: pyc.TransactionInput,
+    receiver_address: pyc.Address,
+    vote_results: Union[List[List[Tuple[int, int]]], VoteResults],
+) -> List[pyc.Transaction]:
+    """Execute many escrows of the same proposal, packing as many script
+    inputs per transaction as the protocol's max_tx_size and execution unit
+    limits allow
+
+    Every transaction references the same oracle and uses the same
+    collateral. Fees are paid by the escrows themselves, so the collateral is
+    never spent and the transactions can be submitted in any order.
+    """
+
+    if not isinstance(vote_results, VoteResults):
+        vote_results = VoteResults.from_lists(vote_results)
+
+    def prepare(builder: pyc.TransactionBuilder):
+        builder.reference_inputs.add(oracle_reference)
+
+    return _spend_escrows_batch(
+        chain_context,
+        collateral_input,
+        script_utxos,
+        scripts.resolve(script),
+        vote_results.redeemer(),
+        lambda escrow: ex_units.escrow_shape(vote_results, escrow),
+        receiver_address,
+        prepare,
+    )
+
+
+# POSIX seconds of slot 0 counting back from the Shelley era on, where
+# every slot lasts a second (testnet is preprod)
+SLOT_ZERO_TIME = {
+    pyc.Network.TESTNET: 1655683200,
+    pyc.Network.MAINNET: 1591566291,
+}
+
+
+def posix_to_slot(posix_time: int, network: pyc.Network) -> int:
+    """The slot holding `posix_time`, in milliseconds like escrow deadlines"""
+
+    return posix_time // 1000 - SLOT_ZERO_TIME[network]
+
+
+def retrieve_escrows_batch(
+    chain_context: pyc.ChainContext,
+    collateral_input: pyc.UTxO,
+    script_utxos: List[pyc.UTxO],
+    script: Union[str, scripts.Script],
+    creator_address: pyc.Address,
+    validity_start: int,
+) -> List[pyc.Transaction]:
+    """Give many escrows past their deadline back to their creator
+
+    The transactions are signed by the creator and only valid from slot
+    `validity_start`, which has to be after the deadline of every escrow.
+    """
+
+    def prepare(builder: pyc.TransactionBuilder):
+        builder.validity_start = validity_start
+        builder.required_signers = [creator_address.payment_part]
+
+    return _spend_escrows_batch(
+        chain_context,
+        collateral_input,
+        script_utxos,
+        scripts.resolve(script),
+        data_types.escrow_redeemer(data_types.EscrowRedeemer.CreatorRetrieval),
+        ex_units.retrieval_shape,
+        creator_address,
+        prepare,
+    )
+
+
 def assemble_transaction(
     transaction: pyc.Transaction, payment_skey: pyc.SigningKey
 ) -> pyc.Transaction:
@@ -275,28 +740,59 @@ def mint_nft(
     return signed_tx
 
 
+# Scripts are immutable, so a reference script is only fetched once per hash
+_reference_scripts: Dict[
+    str, Union[pyc.PlutusV1Script, pyc.PlutusV2Script, pyc.NativeScript]
+] = {}
+
+
 def get_script(
     api: BlockFrostApi, script_hash: str
 ) -> Union[pyc.PlutusV1Script, pyc.PlutusV2Script, pyc.NativeScript]:
+    script = _reference_scripts.get(script_hash) or indexer.store.script(script_hash)
+    if script is not None:
+        return script
+
     script_type = api.script(script_hash).type
     if script_type == "plutusV1":
-        return pyc.PlutusV1Script(
+        script = pyc.PlutusV1Script(
             cbor2.loads(bytes.fromhex(api.script_cbor(script_hash).cbor))
         )
     elif script_type == "plutusV2":
-        return pyc.PlutusV2Script(
+        script = pyc.PlutusV2Script(
             cbor2.loads(bytes.fromhex(api.script_cbor(script_hash).cbor))
         )
     else:
         script_json = api.script_json(script_hash, return_type="json")["json"]
 
-        return pyc.NativeScript.from_dict(script_json)
+        script = pyc.NativeScript.from_dict(script_json)
+
+    _reference_scripts[script_hash] = script
+
+    return script
 
 
 def utxo_from_input(api: BlockFrostApi, transaction_hash: str, index: int) -> pyc.UTxO:
     result = api.transaction_utxos(transaction_hash)
     result = result.outputs[index]
 
+    script = None
+
+    if hasattr(result, "reference_script_hash") and result.reference_script_hash:
+        script = get_script(api, result.reference_script_hash)
+
+    return utxo_from_output(transaction_hash, index, result, script)
+
+
+def utxo_from_output(
+    transaction_hash: str,
+    index: int,
+    result,
+    script: Union[pyc.PlutusV1Script, pyc.PlutusV2Script, pyc.NativeScript] = None,
+) -> pyc.UTxO:
+    """UTxO from a Blockfrost `/txs/{hash}/utxos` output, with its reference
+    script already fetched"""
+
     tx_in = pyc.TransactionInput.from_primitive([transaction_hash, index])
     amount = result.amount
     lovelace_amount = 0
@@ -327,11 +823,6 @@ def utxo_from_input(api: BlockFrostApi, transaction_hash: str, index: int) -> py
     if hasattr(result, "inline_datum") and result.inline_datum is not None:
         datum = pyc.RawCBOR(bytes.fromhex(result.inline_datum))
 
-    script = None
-
-    if hasattr(result, "reference_script_hash") and result.reference_script_hash:
-        script = get_script(api, result.reference_script_hash)
-
     tx_out = pyc.TransactionOutput(
         pyc.Address.from_primitive(result.address),
         amount=amount,
@@ -0,0 +1,125 @@
+"""pycardano chain context reading from the local UTxO store
+
+`TransactionBuilder` asks its context for protocol parameters, the tip and
+UTxOs several times per build. `LocalIndexedChainContext` answers all of
+them from memory: parameters are fetched from the upstream context once per
+epoch, the tip and the UTxOs come from the `indexer.UTxOStore`. Only
+`submit_tx`, and `evaluate_tx` on execution unit cache misses, go upstream.
+
+Without an upstream, given fixed parameters, it builds transactions fully
+offline, which is what the builder benchmarks use.
+
+UTxOs are only known for the addresses the indexer tracks, so wallets
+paying through this context (e.g. the responder's collateral) must be
+tracked as well. An indexer started past the origin (`INDEXER_START`) never
+sees the UTxOs created before its start point: the UTxOs of the addresses
+in `upstream_addresses` are read from the upstream context instead.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+import pycardano as pyc
+import threading
+import time
+
+from lib import indexer
+
+
+class LocalIndexedChainContext(pyc.ChainContext):
+    def __init__(
+        self,
+        store: indexer.UTxOStore,
+        upstream: Optional[pyc.ChainContext] = None,
+        network: Optional[pyc.Network] = None,
+        protocol_param: Optional[pyc.ProtocolParameters] = None,
+        genesis_param: Optional[pyc.GenesisParameters] = None,
+        epoch_check_interval: float = 60.0,
+        timer: Callable[[], float] = time.monotonic,
+        upstream_addresses: Iterable[Union[str, pyc.Address]] = (),
+    ):
+        if upstream is None and (network is None or protocol_param is None):
+            raise ValueError("Network and protocol parameters are required offline")
+
+        self.store = store
+        self.upstream = upstream
+        self.upstream_addresses = {str(address) for address in upstream_addresses}
+
+        self._network = network
+        self._protocol_param = protocol_param
+        self._genesis_param = genesis_param
+
+        self.epoch_check_interval = epoch_check_interval
+        self.timer = timer
+
+        self._epoch: Optional[int] = None
+        self._epoch_checked = 0.0
+        self._protocol_param_epoch: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def network(self) -> pyc.Network:
+        if self._network is None:
+            self._network = self._upstream().network
+
+        return self._network
+
+    @property
+    def epoch(self) -> int:
+        if self.upstream is None:
+            return 0
+
+        now = self.timer()
+        if self._epoch is None or now - self._epoch_checked >= self.epoch_check_interval:
+            with self._lock:
+                self._epoch = self.upstream.epoch
+                self._epoch_checked = now
+
+        return self._epoch
+
+    @property
+    def last_block_slot(self) -> int:
+        tip = self.store.tip
+        if tip is not None:
+            return tip.slot
+
+        return self.upstream.last_block_slot if self.upstream is not None else 0
+
+    @property
+    def genesis_param(self) -> pyc.GenesisParameters:
+        # Genesis parameters never change
+        if self._genesis_param is None:
+            self._genesis_param = self._upstream().genesis_param
+
+        return self._genesis_param
+
+    @property
+    def protocol_param(self) -> pyc.ProtocolParameters:
+        if self.upstream is None:
+            return self._protocol_param
+
+        epoch = self.epoch
+        if self._protocol_param is None or self._protocol_param_epoch != epoch:
+            with self._lock:
+                self._protocol_param = self.upstream.protocol_param
+                self._protocol_param_epoch = epoch
+
+        return self._protocol_param
+
+    def utxos(self, address: str) -> List[pyc.UTxO]:
+        if str(address) in self.upstream_addresses:
+            return self._upstream().utxos(address)
+
+        return self.store.at_address(address)
+
+    def _upstream(self) -> pyc.ChainContext:
+        if self.upstream is None:
+            raise ValueError("No upstream chain context configured")
+
+        return self.upstream
+
+    def submit_tx(self, cbor: Union[bytes, str]):
+        return self._upstream().submit_tx(cbor)
+
+    def evaluate_tx(self, cbor: Union[bytes, str]) -> Dict[str, pyc.ExecutionUnits]:
+        return self._upstream().evaluate_tx(cbor)
@@ -0,0 +1,271 @@
+"""Process-wide registry of Blockfrost clients, one per network.
+
+The registry is initialised once per worker (see `app.py`) and handlers get
+their client through `get_blockfrost`, so every request reuses the same
+keep-alive HTTP connections instead of opening a new session each time.
+
+The async serving mode (see `async_app.py`) gets an aiohttp based client
+through `get_async_blockfrost` instead, so lookups don't block its loop.
+"""
+
+from typing import Dict
+from types import SimpleNamespace
+from blockfrost import BlockFrostApi
+from blockfrost.utils import ApiError, convert_json_to_object, request_wrapper
+from blockfrost.config import DEFAULT_API_VERSION
+from requests.adapters import HTTPAdapter
+
+import pycardano as pyc
+import threading
+import requests
+
+from lib import environment
+
+
+BLOCKFROST_URLS = {
+    "testnet": "https://cardano-preprod.blockfrost.io/api",
+    "mainnet": "https://cardano-mainnet.blockfrost.io/api",
+}
+
+NETWORKS = {
+    "testnet": pyc.Network.TESTNET,
+    "mainnet": pyc.Network.MAINNET,
+}
+
+POOL_SIZE = 10
+
+
+class PooledBlockFrostApi(BlockFrostApi):
+    """BlockFrostApi whose lookups go through a single pooled `requests.Session`
+
+    Only the endpoints used by `lib.cardano` are overridden, every other call
+    falls back to the stock (session-less) implementation.
+    """
+
+    def __init__(self, project_id: str, base_url: str, pool_size: int = POOL_SIZE):
+        super().__init__(
+            project_id=project_id, base_url=base_url, api_version=DEFAULT_API_VERSION
+        )
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self.default_headers)
+
+    @request_wrapper
+    def transaction_utxos(self, hash: str, **kwargs):
+        return self.session.get(f"{self.url}/txs/{hash}/utxos")
+
+    @request_wrapper
+    def transaction(self, hash: str, **kwargs):
+        return self.session.get(f"{self.url}/txs/{hash}")
+
+    @request_wrapper
+    def script(self, script_hash: str, **kwargs):
+        return self.session.get(f"{self.url}/scripts/{script_hash}")
+
+    @request_wrapper
+    def script_json(self, script_hash: str, **kwargs):
+        return self.session.get(f"{self.url}/scripts/{script_hash}/json")
+
+    @request_wrapper
+    def script_cbor(self, script_hash: str, **kwargs):
+        return self.session.get(f"{self.url}/scripts/{script_hash}/cbor")
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncBlockFrostApi:
+    """The Blockfrost lookups of `lib.utxos`, awaitable over one aiohttp session
+
+    Results are converted like `BlockFrostApi`'s, so the same parsing code
+    (e.g. `cardano.utxo_from_output`) reads both.
+    """
+
+    def __init__(self, project_id: str, base_url: str, pool_size: int = POOL_SIZE):
+        self.url = f"{base_url}/{DEFAULT_API_VERSION}"
+        self.project_id = project_id
+        self.pool_size = pool_size
+
+        self._session = None
+
+    def _get_session(self):
+        # aiohttp is only needed by the async serving mode
+        import aiohttp
+
+        # Created on first use, so it belongs to the loop serving requests
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                headers={"project_id": self.project_id},
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+            )
+
+        return self._session
+
+    async def _get(self, path: str):
+        import aiohttp
+
+        try:
+            async with self._get_session().get(f"{self.url}{path}") as response:
+                body = await response.json(content_type=None)
+
+                if response.status != 200:
+                    raise ApiError(
+                        SimpleNamespace(status_code=response.status, json=lambda: body)
+                    )
+        except aiohttp.ClientError as e:
+            # Raised as an OSError like the requests errors of the sync client
+            raise ConnectionError(f"Blockfrost request failed: {e}") from e
+
+        return convert_json_to_object(body)
+
+    async def transaction_utxos(self, hash: str):
+        return await self._get(f"/txs/{hash}/utxos")
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+
+_lock = threading.Lock()
+_settings: Dict[str, str] = {}
+_clients: Dict[str, PooledBlockFrostApi] = {}
+_async_clients: Dict[str, AsyncBlockFrostApi] = {}
+_chain_contexts: Dict[str, pyc.ChainContext] = {}
+
+
+def init(settings: Dict[str, str] = None):
+    """Resolve the Blockfrost configuration once, should be called at startup"""
+
+    global _settings
+
+    if settings is None:
+        settings = environment.get_environment(["BLOCKFROST_PROJECT_ID", "NETWORK_MODE"])
+
+    if settings["NETWORK_MODE"] not in BLOCKFROST_URLS:
+        raise ValueError(f"Unknown NETWORK_MODE {settings['NETWORK_MODE']}")
+
+    with _lock:
+        _settings = dict(settings)
+
+    return _settings
+
+
+def settings() -> Dict[str, str]:
+    if not _settings:
+        init()
+
+    return _settings
+
+
+def get_blockfrost(network: str = None) -> BlockFrostApi:
+    """Return the shared Blockfrost client for `network` (defaults to NETWORK_MODE)"""
+
+    config = settings()
+
+    if network is None:
+        network = config["NETWORK_MODE"]
+
+    client = _clients.get(network)
+    if client is not None:
+        return client
+
+    with _lock:
+        if network not in _clients:
+            _clients[network] = PooledBlockFrostApi(
+                project_id=config["BLOCKFROST_PROJECT_ID"],
+                base_url=BLOCKFROST_URLS[network],
+            )
+
+        return _clients[network]
+
+
+def get_async_blockfrost(network: str = None) -> AsyncBlockFrostApi:
+    """Return the shared async Blockfrost client for `network`"""
+
+    config = settings()
+
+    if network is None:
+        network = config["NETWORK_MODE"]
+
+    client = _async_clients.get(network)
+    if client is not None:
+        return client
+
+    with _lock:
+        if network not in _async_clients:
+            _async_clients[network] = AsyncBlockFrostApi(
+                project_id=config["BLOCKFROST_PROJECT_ID"],
+                base_url=BLOCKFROST_URLS[network],
+            )
+
+        return _async_clients[network]
+
+
+async def close_async():
+    """Close the async clients, from the loop they were used on"""
+
+    with _lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+
+    for client in clients:
+        await client.close()
+
+
+def transaction_landed(transaction_id: pyc.TransactionId, network: str = None) -> bool:
+    """Whether Blockfrost has `transaction_id` on chain"""
+
+    try:
+        get_blockfrost(network).transaction(str(transaction_id))
+    except ApiError as e:
+        if e.status_code == 404:
+            return False
+
+        raise
+
+    return True
+
+
+def network(name: str = None) -> pyc.Network:
+    return NETWORKS[name or settings()["NETWORK_MODE"]]
+
+
+def get_chain_context(network: str = None) -> pyc.ChainContext:
+    """Return the shared pycardano chain context for `network`, used to build
+    and submit transactions"""
+
+    config = settings()
+
+    if network is None:
+        network = config["NETWORK_MODE"]
+
+    chain_context = _chain_contexts.get(network)
+    if chain_context is not None:
+        return chain_context
+
+    with _lock:
+        if network not in _chain_contexts:
+            _chain_contexts[network] = pyc.BlockFrostChainContext(
+                project_id=config["BLOCKFROST_PROJECT_ID"],
+                network=NETWORKS[network],
+                base_url=BLOCKFROST_URLS[network],
+            )
+
+        return _chain_contexts[network]
+
+
+def shutdown():
+    global _settings
+
+    with _lock:
+        for client in _clients.values():
+            client.close()
+
+        _clients.clear()
+        _async_clients.clear()
+        _chain_contexts.clear()
+        _settings = {}
@@ -0,0 +1,409 @@
+"""Coin selection over an indexed UTxO set
+
+`UTxOIndex` keeps a wallet's UTxOs sorted by lovelace, and per native asset
+by quantity, so a selection only touches the UTxOs it ends up considering
+instead of scanning the whole wallet.
+
+Strategies take the index, the target value and a random generator and
+return the selected UTxOs:
+
+- `largest_first` covers every asset, then lovelace, with the largest UTxOs
+- `random_improve` is CIP-2's Random-Improve, it picks random UTxOs and
+  then improves the selection towards twice the target so change outputs
+  stay useful for future transactions
+- `branch_and_bound` looks for a subset of ADA-only UTxOs landing within
+  `BNB_TOLERANCE` of the target, keeping inputs and change minimal, and falls
+  back to `random_improve` when there is none
+
+Builders add their own margin for fees and change to the target, and take
+the name of the strategy to use. Without one they use `DEFAULT_STRATEGY`,
+set with `COIN_SELECTION_STRATEGY`. Random strategies get a generator with
+a fixed seed unless given one, so the same wallet and target always give
+the same selection.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import pycardano as pyc
+import bisect
+import random
+import os
+
+
+DEFAULT_STRATEGY = os.environ.get("COIN_SELECTION_STRATEGY", "largest_first")
+
+# Seed of the generator random strategies get when not given one
+SEED = 0
+
+# UTxOs below the target considered by branch and bound, and how many nodes
+# it visits before giving up
+BNB_CANDIDATES = 1_000
+BNB_MAX_TRIES = 100_000
+BNB_TOLERANCE = 1_000_000
+
+AssetKey = Tuple[pyc.ScriptHash, pyc.AssetName]
+
+
+class InsufficientFunds(ValueError):
+    pass
+
+
+def _value(amount: Union[int, pyc.Value]) -> pyc.Value:
+    return amount if isinstance(amount, pyc.Value) else pyc.Value(amount)
+
+
+def _assets(value: pyc.Value) -> Iterator[Tuple[AssetKey, int]]:
+    for policy, assets in value.multi_asset.items():
+        for name, quantity in assets.items():
+            if quantity > 0:
+                yield (policy, name), quantity
+
+
+class _SortedBucket:
+    """UTxOs sorted by a quantity, with bisect lookups"""
+
+    def __init__(self):
+        self.keys: List[int] = []
+        self.utxos: List[pyc.UTxO] = []
+
+    def extend(self, entries: List[Tuple[int, pyc.UTxO]]):
+        entries = sorted(
+            list(zip(self.keys, self.utxos)) + entries, key=lambda entry: entry[0]
+        )
+        self.keys = [quantity for quantity, _ in entries]
+        self.utxos = [utxo for _, utxo in entries]
+
+    def add(self, quantity: int, utxo: pyc.UTxO):
+        position = bisect.bisect_right(self.keys, quantity)
+        self.keys.insert(position, quantity)
+        self.utxos.insert(position, utxo)
+
+    def remove(self, quantity: int, utxo: pyc.UTxO):
+        position = bisect.bisect_left(self.keys, quantity)
+        while self.utxos[position].input != utxo.input:
+            position += 1
+
+        del self.keys[position]
+        del self.utxos[position]
+
+    def descending(
+        self, maximum: Optional[int] = None, count: Optional[int] = None
+    ) -> Iterator[pyc.UTxO]:
+        """Largest first, up to `maximum`, `count` evenly spread UTxOs if given"""
+
+        end = len(self.keys)
+        if maximum is not None:
+            end = bisect.bisect_right(self.keys, maximum)
+
+        step = 1
+        if count is not None and end > count:
+            step = end / count
+
+        position = end - 1.0
+        while position >= 0:
+            yield self.utxos[int(position)]
+            position -= step
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class UTxOIndex:
+    def __init__(self, utxos: Iterable[pyc.UTxO] = ()):
+        self._utxos: Dict[pyc.TransactionInput, pyc.UTxO] = {}
+
+        self._lovelace = _SortedBucket()
+        self._ada_only = _SortedBucket()
+        self._assets: Dict[AssetKey, _SortedBucket] = {}
+
+        self.extend(utxos)
+
+    def extend(self, utxos: Iterable[pyc.UTxO]):
+        """Add many UTxOs with a single sort instead of one insertion each"""
+
+        lovelace, ada_only = [], []
+        assets: Dict[AssetKey, List[Tuple[int, pyc.UTxO]]] = {}
+
+        for utxo in utxos:
+            if utxo.input in self._utxos:
+                continue
+
+            self._utxos[utxo.input] = utxo
+
+            amount = _value(utxo.output.amount)
+            lovelace.append((amount.coin, utxo))
+
+            if not amount.multi_asset:
+                ada_only.append((amount.coin, utxo))
+
+            for key, quantity in _assets(amount):
+                assets.setdefault(key, []).append((quantity, utxo))
+
+        self._lovelace.extend(lovelace)
+        self._ada_only.extend(ada_only)
+        for key, entries in assets.items():
+            self._assets.setdefault(key, _SortedBucket()).extend(entries)
+
+    def add(self, utxo: pyc.UTxO):
+        if utxo.input in self._utxos:
+            return
+
+        self._utxos[utxo.input] = utxo
+
+        amount = _value(utxo.output.amount)
+        self._lovelace.add(amount.coin, utxo)
+
+        if not amount.multi_asset:
+            self._ada_only.add(amount.coin, utxo)
+
+        for key, quantity in _assets(amount):
+            self._assets.setdefault(key, _SortedBucket()).add(quantity, utxo)
+
+    def remove(self, tx_in: pyc.TransactionInput) -> Optional[pyc.UTxO]:
+        utxo = self._utxos.pop(tx_in, None)
+        if utxo is None:
+            return None
+
+        amount = _value(utxo.output.amount)
+        self._lovelace.remove(amount.coin, utxo)
+
+        if not amount.multi_asset:
+            self._ada_only.remove(amount.coin, utxo)
+
+        for key, quantity in _assets(amount):
+            bucket = self._assets[key]
+            bucket.remove(quantity, utxo)
+            if not bucket:
+                del self._assets[key]
+
+        return utxo
+
+    def largest(self, asset: AssetKey = None) -> Iterator[pyc.UTxO]:
+        """UTxOs from largest to smallest lovelace, or quantity of `asset`"""
+
+        if asset is None:
+            return self._lovelace.descending()
+
+        bucket = self._assets.get(asset)
+        return bucket.descending() if bucket is not None else iter(())
+
+    def ada_only(
+        self, maximum: Optional[int] = None, count: Optional[int] = None
+    ) -> Iterator[pyc.UTxO]:
+        """ADA-only UTxOs holding at most `maximum` lovelace, largest first
+
+        With `count`, only that many UTxOs spread evenly over the range.
+        """
+
+        return self._ada_only.descending(maximum, count)
+
+    def random(self, rng: random.Random, asset: AssetKey = None) -> Optional[pyc.UTxO]:
+        bucket = self._lovelace if asset is None else self._assets.get(asset)
+        if not bucket:
+            return None
+
+        return bucket.utxos[rng.randrange(len(bucket))]
+
+    def count(self, asset: AssetKey = None) -> int:
+        if asset is None:
+            return len(self._utxos)
+
+        bucket = self._assets.get(asset)
+        return len(bucket) if bucket is not None else 0
+
+    def __contains__(self, tx_in: pyc.TransactionInput) -> bool:
+        return tx_in in self._utxos
+
+    def __iter__(self) -> Iterator[pyc.UTxO]:
+        return iter(self._utxos.values())
+
+    def __len__(self) -> int:
+        return len(self._utxos)
+
+
+class _Selection:
+    def __init__(self):
+        self.utxos: Dict[pyc.TransactionInput, pyc.UTxO] = {}
+        self.total = pyc.Value(0)
+
+    def add(self, utxo: pyc.UTxO) -> bool:
+        if utxo.input in self.utxos:
+            return False
+
+        self.utxos[utxo.input] = utxo
+        self.total += _value(utxo.output.amount)
+        return True
+
+    def quantity(self, asset: AssetKey = None) -> int:
+        if asset is None:
+            return self.total.coin
+
+        policy, name = asset
+        return self.total.multi_asset.get(policy, {}).get(name, 0)
+
+
+def _targets(target: pyc.Value) -> List[Tuple[Optional[AssetKey], int]]:
+    # Assets first, the UTxOs holding them usually carry lovelace as well
+    return list(_assets(target)) + [(None, target.coin)]
+
+
+def _largest_first(
+    index: UTxOIndex, selection: _Selection, asset: Optional[AssetKey], quantity: int
+):
+    for utxo in index.largest(asset):
+        if selection.quantity(asset) >= quantity:
+            return
+
+        selection.add(utxo)
+
+    if selection.quantity(asset) < quantity:
+        raise InsufficientFunds(
+            f"Not enough {'lovelace' if asset is None else asset[1]} to select"
+        )
+
+
+def largest_first(
+    index: UTxOIndex, target: pyc.Value, rng: random.Random = None
+) -> List[pyc.UTxO]:
+    selection = _Selection()
+
+    for asset, quantity in _targets(target):
+        _largest_first(index, selection, asset, quantity)
+
+    return list(selection.utxos.values())
+
+
+def random_improve(
+    index: UTxOIndex, target: pyc.Value, rng: random.Random = None
+) -> List[pyc.UTxO]:
+    rng = rng or random.Random(SEED)
+    selection = _Selection()
+
+    for asset, quantity in _targets(target):
+        # Random picks hit UTxOs we already hold more and more often as the
+        # bucket gets consumed, finish with largest-first in that case
+        misses = 0
+        while selection.quantity(asset) < quantity and misses < 8:
+            utxo = index.random(rng, asset)
+            if utxo is None or not selection.add(utxo):
+                misses += 1
+
+        _largest_first(index, selection, asset, quantity)
+
+    # Improvement: move the lovelace total towards twice the target without
+    # going over three times, so the change is about the size of the payment
+    ideal, maximum = 2 * target.coin, 3 * target.coin
+    while True:
+        utxo = index.random(rng)
+        if utxo is None or utxo.input in selection.utxos:
+            break
+
+        amount = _value(utxo.output.amount)
+        new_total = selection.total.coin + amount.coin
+        if amount.multi_asset or new_total > maximum:
+            break
+        if abs(ideal - new_total) >= abs(ideal - selection.total.coin):
+            break
+
+        selection.add(utxo)
+
+    return list(selection.utxos.values())
+
+
+def branch_and_bound(
+    index: UTxOIndex, target: pyc.Value, rng: random.Random = None
+) -> List[pyc.UTxO]:
+    selection = _Selection()
+
+    for asset, quantity in _assets(target):
+        _largest_first(index, selection, asset, quantity)
+
+    remaining = target.coin - selection.total.coin
+    if remaining <= 0:
+        return list(selection.utxos.values())
+
+    upper = remaining + BNB_TOLERANCE
+
+    # A spread of sizes gives the search small UTxOs to close the gap with
+    candidates = [
+        (_value(utxo.output.amount).coin, utxo)
+        for utxo in index.ada_only(upper, BNB_CANDIDATES)
+        if utxo.input not in selection.utxos
+    ]
+
+    # Sum of the candidates after each position, to prune branches that
+    # can't reach the target anymore
+    suffix = [0] * (len(candidates) + 1)
+    for position in range(len(candidates) - 1, -1, -1):
+        suffix[position] = suffix[position + 1] + candidates[position][0]
+
+    negated = [-coin for coin, _ in candidates]
+
+    tries = 0
+    chosen: List[int] = []
+
+    def search(position: int, total: int) -> bool:
+        nonlocal tries
+
+        # Recurse on inclusion only, exclusion just moves on, so the depth
+        # is bounded by the number of selected UTxOs
+        while True:
+            tries += 1
+            if tries > BNB_MAX_TRIES:
+                return False
+
+            if remaining <= total <= upper:
+                return True
+
+            # Skip straight past the candidates that would overshoot
+            position = bisect.bisect_left(negated, total - upper, lo=position)
+            if position == len(candidates):
+                return False
+            if total + suffix[position] < remaining:
+                return False
+
+            chosen.append(position)
+            if search(position + 1, total + candidates[position][0]):
+                return True
+            chosen.pop()
+
+            position += 1
+
+    if not search(0, 0):
+        return random_improve(index, target, rng)
+
+    for position in chosen:
+        selection.add(candidates[position][1])
+
+    return list(selection.utxos.values())
+
+
+STRATEGIES: Dict[
+    str, Callable[[UTxOIndex, pyc.Value, Optional[random.Random]], List[pyc.UTxO]]
+] = {
+    "largest_first": largest_first,
+    "random_improve": random_improve,
+    "branch_and_bound": branch_and_bound,
+}
+
+
+def select(
+    utxos: Union[UTxOIndex, Iterable[pyc.UTxO]],
+    target: Union[int, pyc.Value],
+    strategy: str = None,
+    rng: random.Random = None,
+) -> List[pyc.UTxO]:
+    """Select UTxOs covering `target`, raises InsufficientFunds otherwise
+
+    Plain lists are indexed on every call, callers selecting repeatedly from
+    the same wallet should keep a `UTxOIndex` around instead.
+    """
+
+    strategy = strategy or DEFAULT_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown coin selection strategy {strategy}")
+
+    index = utxos if isinstance(utxos, UTxOIndex) else UTxOIndex(utxos)
+
+    return STRATEGIES[strategy](index, _value(target), rng)
@@ -0,0 +1,288 @@
+"""Pool of dedicated collateral UTxOs per wallet
+
+Script transactions used to take the first UTxO of the wallet holding
+enough ADA as collateral, so builds running at the same time all picked the
+same one. A `CollateralManager` treats the wallet's ADA-only UTxOs of
+exactly `amount` lovelace as its pool, and leases each of them to a single
+build at a time. When all of them are taken and the pool is smaller than
+`pool_size`, the wallet's other funds are split to create the missing ones,
+through the wallet's transaction pipeline (see `lib/wallet.py`) which keeps
+the collateral out of every other build. The split outputs are leased right
+away, the node accepts transactions spending outputs of the mempool.
+
+Once a build is submitted, its collateral is held until the transaction
+lands, that is until one of its inputs is reported spent (see `on_spent`,
+fed by the indexer), or `hold_timeout` seconds have passed. Without an
+indexer, `confirmed` looks the held transactions up instead, as collateral
+is leased and at most every `confirm_interval` seconds.
+
+`find` only looks a collateral up, for one-off transactions (see
+`simulate.py`) that shouldn't split funds.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import pycardano as pyc
+import threading
+import logging
+import time
+
+from lib import cardano, coin_selection
+from lib.wallet import Wallet
+
+
+class NoCollateral(Exception):
+    pass
+
+
+def _is_collateral(output: pyc.TransactionOutput, amount: int) -> bool:
+    if isinstance(output.amount, int):
+        return output.amount == amount
+
+    return not output.amount.multi_asset and output.amount.coin == amount
+
+
+def find(
+    chain_context: pyc.ChainContext,
+    address: pyc.Address,
+    amount: int = cardano.COLLATERAL_AMOUNT,
+) -> pyc.UTxO:
+    """A collateral UTxO of `address`, neither leased nor created
+
+    Raises NoCollateral when there's none.
+    """
+
+    for utxo in chain_context.utxos(str(address)):
+        if _is_collateral(utxo.output, amount):
+            return utxo
+
+    raise NoCollateral(f"No collateral available at {address}")
+
+
+class CollateralManager:
+    def __init__(
+        self,
+        chain_context: pyc.ChainContext,
+        signing_key: pyc.PaymentSigningKey,
+        amount: int = cardano.COLLATERAL_AMOUNT,
+        pool_size: int = 4,
+        hold_timeout: float = 600.0,
+        confirmed: Optional[Callable[[pyc.TransactionId], bool]] = None,
+        confirm_interval: float = 20.0,
+        wallet: Optional[Wallet] = None,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.chain_context = chain_context
+        self.signing_key = signing_key
+        self.amount = amount
+        self.pool_size = pool_size
+        self.hold_timeout = hold_timeout
+        self.confirmed = confirmed
+        self.confirm_interval = confirm_interval
+        self.timer = timer
+
+        self.wallet = wallet or Wallet(chain_context, signing_key, reserved=self.is_collateral)
+        self.address = self.wallet.address
+
+        self._leased: Set[pyc.TransactionInput] = set()
+        # Held collateral with its expiry, and the inputs releasing it
+        self._held: Dict[pyc.TransactionInput, float] = {}
+        self._releases: Dict[pyc.TransactionInput, pyc.TransactionInput] = {}
+        # Transactions holding each collateral, when looked up by `confirmed`
+        self._holders: Dict[pyc.TransactionInput, List[pyc.TransactionId]] = {}
+        self._next_check = 0.0
+        # Outputs of the last split until the chain context reports them
+        self._split: Optional[Tuple[List[pyc.UTxO], float]] = None
+        self._splitting = False
+
+        self._cond = threading.Condition()
+
+        self.leases = 0
+        self.splits = 0
+        self.waits = 0
+
+    def is_collateral(self, output: pyc.TransactionOutput) -> bool:
+        return _is_collateral(output, self.amount)
+
+    def _expire(self):
+        now = self.timer()
+
+        for tx_in, expires in list(self._held.items()):
+            if expires <= now:
+                self._unhold(tx_in)
+
+        if self._split is not None and self._split[1] <= now:
+            self._split = None
+
+    def _unhold(self, collateral: pyc.TransactionInput):
+        self._held.pop(collateral, None)
+        self._holders.pop(collateral, None)
+
+        for tx_in in [i for i, held in self._releases.items() if held == collateral]:
+            del self._releases[tx_in]
+
+    def _pool(self, utxos: List[pyc.UTxO]) -> List[pyc.UTxO]:
+        """Collateral UTxOs among the wallet's `utxos`, with the pending split's"""
+
+        pool = [utxo for utxo in utxos if self.is_collateral(utxo.output)]
+
+        if self._split is not None:
+            known = {utxo.input for utxo in pool}
+            outputs = [utxo for utxo in self._split[0] if utxo.input not in known]
+
+            if outputs:
+                pool.extend(outputs)
+            else:
+                self._split = None
+
+        return pool
+
+    def _check_landed(self):
+        """Release the held collateral whose transactions `confirmed` finds"""
+
+        with self._cond:
+            now = self.timer()
+            if self.confirmed is None or not self._holders or now < self._next_check:
+                return
+
+            self._next_check = now + self.confirm_interval
+            holders = list(self._holders.items())
+
+        # Lookups go over the network, leases carry on meanwhile
+        landed = []
+        for collateral, transaction_ids in holders:
+            try:
+                if any(self.confirmed(transaction_id) for transaction_id in transaction_ids):
+                    landed.append((collateral, transaction_ids))
+            except Exception:
+                logging.warning(f"Couldn't look up the transactions holding {collateral}")
+
+        if landed:
+            with self._cond:
+                for collateral, transaction_ids in landed:
+                    # Unless it was released and held again meanwhile
+                    if self._holders.get(collateral) is transaction_ids:
+                        self._unhold(collateral)
+
+                self._cond.notify_all()
+
+    def _create(self, count: int) -> List[pyc.UTxO]:
+        """Submit a split creating `count` collateral UTxOs, returns them"""
+
+        signed_tx = self.wallet.submit(
+            lambda funds: cardano.create_collateral(
+                self.chain_context, funds, self.address, self.amount, count
+            )
+        )
+
+        transaction_id = signed_tx.transaction_body.id
+        return [
+            pyc.UTxO(pyc.TransactionInput(transaction_id, index), output)
+            for index, output in enumerate(signed_tx.transaction_body.outputs)
+            if self.is_collateral(output)
+        ]
+
+    def lease(self, wait: float = 0.0) -> pyc.UTxO:
+        """Take a collateral UTxO, waiting up to `wait` seconds for one
+
+        Raises NoCollateral when none is free and no more can be created.
+        """
+
+        deadline = self.timer() + wait
+        splittable = True
+
+        self._check_landed()
+
+        while True:
+            # Fetched without the lock, releases and holds don't wait on the
+            # network
+            utxos = self.chain_context.utxos(str(self.address))
+
+            with self._cond:
+                self._expire()
+                pool = self._pool(utxos)
+
+                for utxo in pool:
+                    if utxo.input not in self._leased and utxo.input not in self._held:
+                        self._leased.add(utxo.input)
+                        self.leases += 1
+                        return utxo
+
+                if self._splitting:
+                    # Its outputs are leased as soon as it is submitted
+                    self._cond.wait()
+                    continue
+
+                if not (splittable and self._split is None and len(pool) < self.pool_size):
+                    remaining = deadline - self.timer()
+                    if remaining <= 0:
+                        raise NoCollateral(f"No collateral available at {self.address}")
+
+                    self.waits += 1
+                    self._cond.wait(remaining)
+                    continue
+
+                self._splitting = True
+
+            # Submitted without the lock as well
+            outputs = None
+            try:
+                outputs = self._create(self.pool_size - len(pool))
+            except coin_selection.InsufficientFunds:
+                splittable = False
+            finally:
+                with self._cond:
+                    self._splitting = False
+                    if outputs is not None:
+                        self._split = (outputs, self.timer() + self.hold_timeout)
+                        self.splits += 1
+
+                    self._cond.notify_all()
+
+    def release(self, collateral: pyc.UTxO):
+        """Give back a collateral that wasn't used"""
+
+        with self._cond:
+            self._leased.discard(collateral.input)
+            self._unhold(collateral.input)
+
+            self._cond.notify()
+
+    def hold(self, collateral: pyc.UTxO, *transactions: pyc.Transaction):
+        """Keep `collateral` until any of `transactions` lands"""
+
+        with self._cond:
+            self._leased.discard(collateral.input)
+            self._held[collateral.input] = self.timer() + self.hold_timeout
+
+            if self.confirmed is not None:
+                self._holders[collateral.input] = [
+                    transaction.transaction_body.id for transaction in transactions
+                ]
+
+            for transaction in transactions:
+                for tx_in in transaction.transaction_body.inputs:
+                    self._releases[tx_in] = collateral.input
+
+    def on_spent(self, tx_in: pyc.TransactionInput):
+        with self._cond:
+            collateral = self._releases.get(tx_in)
+            if collateral is not None:
+                self._unhold(collateral)
+                self._cond.notify()
+
+            # Collateral lost to a failing script
+            if tx_in in self._held or tx_in in self._leased:
+                self._leased.discard(tx_in)
+                self._unhold(tx_in)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "leased": len(self._leased),
+                "held": len(self._held),
+                "leases": self.leases,
+                "splits": self.splits,
+                "waits": self.waits,
+            }
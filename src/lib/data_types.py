@@ -1,11 +1,13 @@
 from __future__ import annotations
-from typing import Tuple, List
+from typing import Tuple, List, Union
 from dataclasses import dataclass
 
 import pycardano as pyc
 import enum
 import cbor2
-import copy
+
+# Imported by name, `oracle_datum` is also the datum constructor below
+from lib.oracle_datum import OracleDatum
 
 
 @dataclass
@@ -180,13 +182,14 @@ def cbor_datum_to_dict(cbor: bytes) -> dict:
     return datum_to_dict(datum_from_cbor(cbor))
 
 
-def update_datum_with_results(datum: pyc.Datum, results: bytes) -> pyc.Datum:
-    datum_copy = copy.deepcopy(datum)
-    raw_datum = datum_copy.items
-
-    raw_datum[-1] = ResultsSome(results)
+def update_datum_with_results(
+    datum: Union[pyc.Datum, OracleDatum], results: bytes
+) -> pyc.Datum:
+    if isinstance(datum, OracleDatum):
+        return datum.with_results(results).to_datum()
 
-    return pyc.IndefiniteList(raw_datum)
+    # Fields are never mutated, so the new datum shares all but the results
+    return pyc.IndefiniteList(datum.items[:-1] + [ResultsSome(results)])
 
 
 def oracle_redeemer(results: bytes, signatures: List[bytes]) -> pyc.Datum:
@@ -1,15 +1,23 @@
 from typing import List
+from functools import lru_cache
 from dotenv import load_dotenv
 
 import sys
 import os
 
 
+@lru_cache(maxsize=None)
+def load():
+    # Only parse the .env file once per process, every later
+    # lookup is served straight from os.environ
+    sys.path.append("src")
+    load_dotenv()
+
+
 def get_environment(env_names: List[str]):
     # Initialise env variables, if any of them are not
     # here, raise exception
-    sys.path.append("src")
-    load_dotenv()
+    load()
 
     envs = {}
     for env in env_names:
@@ -0,0 +1,118 @@
+"""Direct CBOR decoding of escrow datums
+
+The counterpart of `oracle_datum` for the datums built by
+`data_types.escrow_datum`: `decode` reads the plain CBOR items into an
+`EscrowDatum` holding only bytes and ints, so indexing thousands of escrows
+doesn't build pycardano objects for each of them.
+"""
+
+from __future__ import annotations
+from typing import Tuple
+
+import cbor2
+
+from lib.oracle_datum import CONSTR_0, CONSTR_1
+
+
+# `VoteUseCount` and `VoteUseWeigth` constructors
+VOTE_COUNT = CONSTR_0
+VOTE_WEIGHT = CONSTR_1
+
+
+class EscrowDatum:
+    __slots__ = (
+        "policy_id",
+        "creator_hash",
+        "deadline",
+        "question_index",
+        "vote_use",
+        "payment_parts",
+    )
+
+    def __init__(
+        self,
+        policy_id: bytes,
+        creator_hash: bytes,
+        deadline: int,
+        question_index: int,
+        vote_use: int,
+        payment_parts: Tuple[bytes, ...],
+    ):
+        self.policy_id = policy_id
+        self.creator_hash = creator_hash
+        self.deadline = deadline
+        self.question_index = question_index
+        self.vote_use = vote_use
+        self.payment_parts = payment_parts
+
+    def to_dict(self) -> dict:
+        return {
+            "policy_id": self.policy_id.hex(),
+            "creator": self.creator_hash.hex(),
+            "deadline": self.deadline,
+            "question_index": self.question_index,
+            "vote_use": "count" if self.vote_use == VOTE_COUNT else "weight",
+            "payment_parts": [part.hex() for part in self.payment_parts],
+        }
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, EscrowDatum) and all(
+            getattr(self, key) == getattr(other, key) for key in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"EscrowDatum(policy_id={self.policy_id.hex()!r}, deadline={self.deadline})"
+        )
+
+
+def _address(item) -> bytes:
+    if (
+        not isinstance(item, cbor2.CBORTag)
+        or item.tag != CONSTR_0
+        or not isinstance(item.value, list)
+        or len(item.value) != 1
+        or not isinstance(item.value[0], bytes)
+    ):
+        raise ValueError("Malformed escrow address")
+
+    return item.value[0]
+
+
+def decode(cbor: bytes) -> EscrowDatum:
+    """Decode an escrow datum, raises ValueError if `cbor` isn't one"""
+
+    try:
+        data = cbor2.loads(cbor)
+    except Exception as e:
+        raise ValueError(f"Invalid CBOR: {e}")
+
+    if not isinstance(data, list) or len(data) != 6:
+        raise ValueError("Escrow datum should be a list of 6 fields")
+
+    policy_id, creator, deadline, question_index, vote_use, addresses = data
+
+    if not (
+        isinstance(policy_id, bytes)
+        and isinstance(creator, bytes)
+        and isinstance(deadline, int)
+        and isinstance(question_index, int)
+        and isinstance(addresses, list)
+    ):
+        raise ValueError("Malformed escrow datum")
+
+    if (
+        not isinstance(vote_use, cbor2.CBORTag)
+        or vote_use.tag not in (VOTE_COUNT, VOTE_WEIGHT)
+        or vote_use.value != []
+    ):
+        raise ValueError("Unknown vote use")
+
+    return EscrowDatum(
+        policy_id,
+        creator,
+        deadline,
+        question_index,
+        vote_use.tag,
+        tuple(_address(address) for address in addresses),
+    )
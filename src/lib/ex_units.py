@@ -0,0 +1,125 @@
+"""Execution unit estimates for the oracle and escrow redeemers
+
+The builders used to leave `ex_units` unset, so every transaction paid for
+a round-trip to the chain context's evaluate endpoint. The units a script
+spends only depend on the shape of its redeemer (how many signatures, how
+many questions and choices) and, for escrows, of the datum it reads (how
+many addresses it pays out to, how votes are counted, which question), so
+they are measured once per shape and reused from then on.
+
+Stored units already include the safety margin: on a miss the builder is
+told to pad the evaluated units by `margin` (see `prepare`), and the units
+it sets on the redeemer are what gets recorded.
+"""
+
+from __future__ import annotations
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+import pycardano as pyc
+import threading
+import os
+
+from lib.escrow_datum import EscrowDatum
+from lib.vote_results import VoteResults
+
+
+Shape = Tuple[Hashable, ...]
+
+
+def oracle_shape(results: bytes, signatures: List[bytes]) -> Shape:
+    questions = results.count(b"|") + 1
+    choices = results.count(b",") + questions
+
+    return ("oracle", len(signatures), questions, choices)
+
+
+def escrow_datum_shape(escrow: Optional[EscrowDatum]) -> Shape:
+    """The fields of an escrow datum its validator's cost depends on, datums
+    we can't decode share a shape of their own"""
+
+    if escrow is None:
+        return (None,)
+
+    return (len(escrow.payment_parts), escrow.vote_use, escrow.question_index)
+
+
+def escrow_shape(
+    vote_results: Union[List[List[Tuple[int, int]]], VoteResults],
+    escrow: Optional[EscrowDatum],
+) -> Shape:
+    if isinstance(vote_results, VoteResults):
+        shape = ("escrow", len(vote_results), vote_results.choices)
+    else:
+        shape = ("escrow", len(vote_results), sum(len(votes) for votes in vote_results))
+
+    return shape + escrow_datum_shape(escrow)
+
+
+def retrieval_shape(escrow: Optional[EscrowDatum]) -> Shape:
+    # Creator retrievals have no results, only the datum matters
+    return ("retrieval",) + escrow_datum_shape(escrow)
+
+
+class ExUnitsEstimator:
+    def __init__(self, margin: float = 0.2):
+        self.margin = margin
+
+        self._units: Dict[Tuple[pyc.ScriptHash, Shape], pyc.ExecutionUnits] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, script_hash: pyc.ScriptHash, shape: Shape) -> Optional[pyc.ExecutionUnits]:
+        with self._lock:
+            units = self._units.get((script_hash, shape))
+            if units is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return pyc.ExecutionUnits(units.mem, units.steps)
+
+    def record(self, script_hash: pyc.ScriptHash, shape: Shape, units: pyc.ExecutionUnits):
+        """Remember `units` for the shape, keeping the largest ever seen"""
+
+        with self._lock:
+            known = self._units.get((script_hash, shape))
+            if known is not None:
+                units = pyc.ExecutionUnits(
+                    max(known.mem, units.mem), max(known.steps, units.steps)
+                )
+
+            self._units[(script_hash, shape)] = units
+
+    def redeemer(
+        self, script_hash: pyc.ScriptHash, shape: Shape, data: pyc.Datum
+    ) -> pyc.Redeemer:
+        """Spend redeemer with cached units, or None units to evaluate them"""
+
+        return pyc.Redeemer(
+            pyc.RedeemerTag.SPEND, data, ex_units=self.get(script_hash, shape)
+        )
+
+    def pad(self, units: pyc.ExecutionUnits) -> pyc.ExecutionUnits:
+        """`units` evaluated outside of a builder, with our margin added"""
+
+        return pyc.ExecutionUnits(
+            int(units.mem * (1 + self.margin)), int(units.steps * (1 + self.margin))
+        )
+
+    def prepare(self, builder: pyc.TransactionBuilder):
+        """Make the builder pad the units it evaluates by our margin"""
+
+        builder.execution_memory_buffer = self.margin
+        builder.execution_step_buffer = self.margin
+
+    def clear(self):
+        with self._lock:
+            self._units.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"shapes": len(self._units), "hits": self.hits, "misses": self.misses}
+
+
+estimator = ExUnitsEstimator(margin=float(os.environ.get("EX_UNITS_MARGIN", 0.2)))
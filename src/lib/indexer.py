@@ -0,0 +1,698 @@
+"""Local index of the UTxOs sitting at the oracle and escrow script addresses
+
+An `Indexer` follows the chain through a `BlockSource` (Ogmios chain-sync,
+or a replay file for tests and benchmarks) and keeps the unspent outputs at
+the tracked addresses in a `UTxOStore`. The store is indexed by transaction
+input, address and the proposal_id of oracle datums, so lookups are
+dictionary accesses instead of Blockfrost requests.
+
+Escrows are indexed by minting policy, creator and deadline as well. An
+oracle and the escrows it settles share the minting policy, so the escrows
+an oracle answer settles are one lookup away (see `escrows_for_oracle` and
+`settleable`).
+
+Transactions are decoded straight from their CBOR: only outputs paying to a
+tracked address are turned into pycardano objects, and transaction ids are
+hashed from the original body bytes so they match the ledger's.
+
+The last `ROLLBACK_DEPTH` blocks keep an undo log, rollbacks reported by
+the source restore the store to the requested point.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple, Union
+from dataclasses import dataclass, field
+from collections import deque
+
+import pycardano as pyc
+import threading
+import logging
+import hashlib
+import base64
+import bisect
+import cbor2
+import json
+import io
+
+from lib import escrow_datum, oracle_datum
+
+
+# Ouroboros' security parameter, blocks older than that are immutable
+ROLLBACK_DEPTH = 2160
+
+
+@dataclass(frozen=True)
+class Point:
+    slot: int
+    hash: str
+
+    def to_ogmios(self) -> dict:
+        return {"slot": self.slot, "hash": self.hash}
+
+
+@dataclass
+class RollForward:
+    point: Point
+    transactions: List[bytes]
+    tip: Optional[Point] = None
+
+
+@dataclass
+class RollBackward:
+    point: Optional[Point]  # None means the origin
+    tip: Optional[Point] = None
+
+
+Event = Union[RollForward, RollBackward]
+
+
+@dataclass(frozen=True)
+class IndexedUTxO:
+    utxo: pyc.UTxO
+    datum: Optional[oracle_datum.OracleDatum]
+    slot: int
+    escrow: Optional[escrow_datum.EscrowDatum] = None
+
+    @property
+    def proposal_id(self) -> Optional[str]:
+        return self.datum.proposal_id if self.datum is not None else None
+
+
+class BlockSource:
+    """Yields chain events starting right after the first known point"""
+
+    def events(self, points: List[Point]) -> Iterator[Event]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ReplaySource(BlockSource):
+    """Replays blocks from a JSON lines file
+
+    Each line is either a block, `{"slot": 1, "hash": "..", "transactions":
+    ["<tx cbor hex>", ...]}`, or a rollback, `{"rollback": {"slot": 1,
+    "hash": ".."}}` (`{"rollback": null}` rolls back to the origin).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def events(self, points: List[Point]) -> Iterator[Event]:
+        start = max((point.slot for point in points), default=-1)
+
+        with open(self.path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+
+                entry = json.loads(line)
+                if "rollback" in entry:
+                    point = entry["rollback"]
+                    yield RollBackward(Point(point["slot"], point["hash"]) if point else None)
+                    continue
+
+                if entry["slot"] <= start:
+                    continue
+
+                yield RollForward(
+                    Point(entry["slot"], entry["hash"]),
+                    [bytes.fromhex(tx) for tx in entry["transactions"]],
+                )
+
+
+class OgmiosSource(BlockSource):
+    """Ogmios (v5) chain-sync client, keeps `pipeline` requests in flight"""
+
+    def __init__(self, url: str, pipeline: int = 50, timeout: float = 30.0):
+        self.url = url
+        self.pipeline = pipeline
+        self.timeout = timeout
+
+        self._ws = None
+
+    def _request(self, method: str, args: dict = None):
+        self._ws.send(
+            json.dumps(
+                {
+                    "type": "jsonwsp/request",
+                    "version": "1.0",
+                    "servicename": "ogmios",
+                    "methodname": method,
+                    "args": args or {},
+                }
+            )
+        )
+
+    def _response(self) -> dict:
+        response = json.loads(self._ws.recv())
+        if "fault" in response:
+            raise ValueError(f"Ogmios fault: {response['fault']}")
+
+        return response["result"]
+
+    @staticmethod
+    def _point(point) -> Optional[Point]:
+        if point == "origin" or point is None:
+            return None
+
+        return Point(point["slot"], point["hash"])
+
+    def events(self, points: List[Point]) -> Iterator[Event]:
+        import websocket
+
+        self._ws = websocket.create_connection(self.url, timeout=self.timeout)
+
+        self._request(
+            "FindIntersect",
+            {"points": [point.to_ogmios() for point in points] + ["origin"]},
+        )
+        result = self._response()
+        if "IntersectionFound" not in result:
+            raise ValueError(f"No intersection with {points}")
+
+        for _ in range(self.pipeline):
+            self._request("RequestNext")
+
+        while True:
+            result = self._response()
+            self._request("RequestNext")
+
+            if "RollBackward" in result:
+                rollback = result["RollBackward"]
+                yield RollBackward(
+                    self._point(rollback["point"]), self._point(rollback.get("tip"))
+                )
+                continue
+
+            forward = result["RollForward"]
+            _, block = next(iter(forward["block"].items()))
+
+            header = block.get("header", {})
+            if "slot" not in header:
+                # Epoch boundary blocks carry no transactions
+                continue
+
+            yield RollForward(
+                Point(header["slot"], block["headerHash"]),
+                [base64.b64decode(tx["raw"]) for tx in block.get("body", [])],
+                self._point(forward.get("tip")),
+            )
+
+    def close(self):
+        if self._ws is not None:
+            self._ws.close()
+            self._ws = None
+
+
+def _unwrap(value):
+    # Conway encodes input sets with tag 258
+    return value.value if isinstance(value, cbor2.CBORTag) else value
+
+
+def _script(primitive) -> Union[pyc.NativeScript, pyc.PlutusV1Script, pyc.PlutusV2Script]:
+    script_type, script = cbor2.loads(primitive.value)
+    if script_type == 0:
+        return pyc.NativeScript.from_primitive(script)
+    if script_type == 1:
+        return pyc.PlutusV1Script(script)
+
+    return pyc.PlutusV2Script(script)
+
+
+def _output(primitive) -> pyc.TransactionOutput:
+    datum = datum_hash = script = None
+
+    if isinstance(primitive, dict):
+        address, amount = primitive[0], primitive[1]
+
+        option = primitive.get(2)
+        if option is not None:
+            if option[0] == 0:
+                datum_hash = pyc.DatumHash(option[1])
+            else:
+                datum = pyc.RawCBOR(option[1].value)
+
+        if 3 in primitive:
+            script = _script(primitive[3])
+    else:
+        address, amount = primitive[0], primitive[1]
+        if len(primitive) > 2:
+            datum_hash = pyc.DatumHash(primitive[2])
+
+    return pyc.TransactionOutput(
+        pyc.Address.from_primitive(address),
+        pyc.Value.from_primitive(amount) if isinstance(amount, list) else amount,
+        datum_hash=datum_hash,
+        datum=datum,
+        script=script,
+    )
+
+
+def decode_transaction(
+    cbor: bytes, addresses: Set[bytes]
+) -> Tuple[List[pyc.TransactionInput], List[pyc.UTxO]]:
+    """Inputs spent by a transaction and its outputs paying to `addresses`"""
+
+    fp = io.BytesIO(cbor)
+    # Skip the array header, the body comes right after
+    fp.read(1)
+
+    decoder = cbor2.CBORDecoder(fp)
+    body = decoder.decode()
+    body_end = fp.tell()
+
+    valid = True
+    if cbor[0] == 0x84:
+        decoder.decode()
+        valid = decoder.decode()
+
+    transaction_id = pyc.TransactionId(
+        hashlib.blake2b(cbor[1:body_end], digest_size=32).digest()
+    )
+
+    if valid:
+        spent = _unwrap(body[0])
+        outputs = list(enumerate(body[1]))
+    else:
+        # Failed scripts only consume the collateral
+        spent = _unwrap(body.get(13, []))
+        outputs = [(len(body[1]), body[16])] if 16 in body else []
+
+    created = []
+    for index, primitive in outputs:
+        address = primitive[0] if isinstance(primitive, list) else primitive.get(0)
+        if address not in addresses:
+            continue
+
+        created.append(
+            pyc.UTxO(pyc.TransactionInput(transaction_id, index), _output(primitive))
+        )
+
+    return (
+        [pyc.TransactionInput(pyc.TransactionId(tx_id), index) for tx_id, index in spent],
+        created,
+    )
+
+
+@dataclass
+class _Undo:
+    point: Point
+    added: List[pyc.TransactionInput] = field(default_factory=list)
+    removed: List[IndexedUTxO] = field(default_factory=list)
+
+
+def _deadline_key(deadline: int, tx_in: pyc.TransactionInput) -> Tuple[int, bytes, int]:
+    return (deadline, tx_in.transaction_id.payload, tx_in.index)
+
+
+def _index(
+    mapping: Dict[Hashable, Dict[pyc.TransactionInput, IndexedUTxO]],
+    key: Hashable,
+    entry: IndexedUTxO,
+):
+    mapping.setdefault(key, {})[entry.utxo.input] = entry
+
+
+def _unindex(
+    mapping: Dict[Hashable, Dict[pyc.TransactionInput, IndexedUTxO]],
+    key: Hashable,
+    entry: IndexedUTxO,
+):
+    del mapping[key][entry.utxo.input]
+    if not mapping[key]:
+        del mapping[key]
+
+
+class UTxOStore:
+    def __init__(self, rollback_depth: int = ROLLBACK_DEPTH):
+        self._utxos: Dict[pyc.TransactionInput, IndexedUTxO] = {}
+        self._by_address: Dict[str, Dict[pyc.TransactionInput, IndexedUTxO]] = {}
+        self._by_proposal: Dict[str, Dict[pyc.TransactionInput, IndexedUTxO]] = {}
+        self._scripts: Dict[str, Union[pyc.NativeScript, pyc.PlutusV1Script, pyc.PlutusV2Script]] = {}
+
+        # Oracles and escrows by minting policy, escrows by creator and
+        # sorted by deadline
+        self._oracles_by_policy: Dict[bytes, Dict[pyc.TransactionInput, IndexedUTxO]] = {}
+        self._escrows_by_policy: Dict[bytes, Dict[pyc.TransactionInput, IndexedUTxO]] = {}
+        self._escrows_by_creator: Dict[bytes, Dict[pyc.TransactionInput, IndexedUTxO]] = {}
+        self._escrow_deadlines: List[Tuple[int, bytes, int]] = []
+
+        self._undo: deque[_Undo] = deque(maxlen=rollback_depth)
+        self._spent_listeners: List[Callable[[pyc.TransactionInput], None]] = []
+        self._added_listeners: List[Callable[[List[IndexedUTxO]], None]] = []
+        self._lock = threading.RLock()
+
+        self.tip: Optional[Point] = None
+
+    def on_spent(self, listener: Callable[[pyc.TransactionInput], None]):
+        """Call `listener` with every indexed input that gets spent"""
+
+        self._spent_listeners.append(listener)
+
+    def on_added(self, listener: Callable[[List[IndexedUTxO]], None]):
+        """Call `listener` with the entries created by every block, and with
+        those unspent again by a rollback"""
+
+        self._added_listeners.append(listener)
+
+    def get(self, tx_in: pyc.TransactionInput) -> Optional[IndexedUTxO]:
+        return self._utxos.get(tx_in)
+
+    def at_address(self, address: Union[str, pyc.Address]) -> List[pyc.UTxO]:
+        with self._lock:
+            return [entry.utxo for entry in self._by_address.get(str(address), {}).values()]
+
+    def by_proposal(self, proposal_id: str) -> List[IndexedUTxO]:
+        with self._lock:
+            return list(self._by_proposal.get(proposal_id, {}).values())
+
+    def oracles(self, policy_id: bytes) -> List[IndexedUTxO]:
+        with self._lock:
+            return list(self._oracles_by_policy.get(policy_id, {}).values())
+
+    def escrows(
+        self,
+        policy_id: Optional[bytes] = None,
+        creator: Optional[bytes] = None,
+        deadline_from: Optional[int] = None,
+        deadline_to: Optional[int] = None,
+    ) -> List[IndexedUTxO]:
+        """Escrows matching every given filter, by deadline
+
+        The deadline window is inclusive on both ends.
+        """
+
+        with self._lock:
+            if deadline_from is None and deadline_to is None:
+                if policy_id is not None:
+                    entries = self._escrows_by_policy.get(policy_id, {}).values()
+                elif creator is not None:
+                    entries = self._escrows_by_creator.get(creator, {}).values()
+                else:
+                    entries = (entry for entry in self._utxos.values() if entry.escrow)
+            else:
+                start = bisect.bisect_left(
+                    self._escrow_deadlines,
+                    (deadline_from,) if deadline_from is not None else (),
+                )
+                end = (
+                    bisect.bisect_left(self._escrow_deadlines, (deadline_to + 1,))
+                    if deadline_to is not None
+                    else len(self._escrow_deadlines)
+                )
+                entries = (
+                    self._utxos[pyc.TransactionInput(pyc.TransactionId(tx_id), index)]
+                    for _, tx_id, index in self._escrow_deadlines[start:end]
+                )
+
+            return sorted(
+                (
+                    entry
+                    for entry in entries
+                    if (policy_id is None or entry.escrow.policy_id == policy_id)
+                    and (creator is None or entry.escrow.creator_hash == creator)
+                ),
+                key=lambda entry: _deadline_key(entry.escrow.deadline, entry.utxo.input),
+            )
+
+    def escrows_for_oracle(
+        self,
+        tx_in: pyc.TransactionInput,
+        creator: Optional[bytes] = None,
+        deadline_from: Optional[int] = None,
+        deadline_to: Optional[int] = None,
+    ) -> List[IndexedUTxO]:
+        """Escrows settled by the results of the oracle UTxO at `tx_in`"""
+
+        oracle = self._utxos.get(tx_in)
+        if oracle is None or oracle.datum is None:
+            return []
+
+        return self.escrows(oracle.datum.policy_id, creator, deadline_from, deadline_to)
+
+    def settleable(self) -> List[Tuple[IndexedUTxO, List[IndexedUTxO]]]:
+        """Oracle UTxOs holding results, with the escrows they settle"""
+
+        with self._lock:
+            return [
+                (oracle, self.escrows(policy_id=policy_id))
+                for policy_id, oracles in self._oracles_by_policy.items()
+                if policy_id in self._escrows_by_policy
+                for oracle in oracles.values()
+                if oracle.datum.results is not None
+            ]
+
+    def script(self, script_hash: str):
+        return self._scripts.get(script_hash)
+
+    def points(self) -> List[Point]:
+        """Recent points, most recent first, to find an intersection from"""
+
+        with self._lock:
+            return [undo.point for undo in reversed(self._undo)]
+
+    def _add(self, entry: IndexedUTxO):
+        tx_in = entry.utxo.input
+
+        self._utxos[tx_in] = entry
+        _index(self._by_address, str(entry.utxo.output.address), entry)
+        if entry.datum is not None:
+            _index(self._by_proposal, entry.datum.proposal_id, entry)
+            _index(self._oracles_by_policy, entry.datum.policy_id, entry)
+
+        if entry.escrow is not None:
+            _index(self._escrows_by_policy, entry.escrow.policy_id, entry)
+            _index(self._escrows_by_creator, entry.escrow.creator_hash, entry)
+            bisect.insort(self._escrow_deadlines, _deadline_key(entry.escrow.deadline, tx_in))
+
+        script = entry.utxo.output.script
+        if script is not None:
+            if isinstance(script, pyc.NativeScript):
+                script_hash = script.hash()
+            else:
+                script_hash = pyc.plutus_script_hash(script)
+
+            self._scripts[script_hash.payload.hex()] = script
+
+    def _remove(self, tx_in: pyc.TransactionInput) -> Optional[IndexedUTxO]:
+        entry = self._utxos.pop(tx_in, None)
+        if entry is None:
+            return None
+
+        _unindex(self._by_address, str(entry.utxo.output.address), entry)
+        if entry.datum is not None:
+            _unindex(self._by_proposal, entry.datum.proposal_id, entry)
+            _unindex(self._oracles_by_policy, entry.datum.policy_id, entry)
+
+        if entry.escrow is not None:
+            _unindex(self._escrows_by_policy, entry.escrow.policy_id, entry)
+            _unindex(self._escrows_by_creator, entry.escrow.creator_hash, entry)
+
+            key = _deadline_key(entry.escrow.deadline, tx_in)
+            del self._escrow_deadlines[bisect.bisect_left(self._escrow_deadlines, key)]
+
+        return entry
+
+    def roll_forward(
+        self,
+        point: Point,
+        transactions: Iterable[Tuple[List[pyc.TransactionInput], List[IndexedUTxO]]],
+    ):
+        """Apply a block given as (spent inputs, created entries) per transaction"""
+
+        undo = _Undo(point)
+        spent = []
+        added = []
+
+        with self._lock:
+            for inputs, entries in transactions:
+                for tx_in in inputs:
+                    entry = self._remove(tx_in)
+                    if entry is not None:
+                        undo.removed.append(entry)
+                        spent.append(tx_in)
+
+                for entry in entries:
+                    self._add(entry)
+                    undo.added.append(entry.utxo.input)
+                    added.append(entry)
+
+            self._undo.append(undo)
+            self.tip = point
+
+        for tx_in in spent:
+            for listener in self._spent_listeners:
+                try:
+                    listener(tx_in)
+                except Exception:
+                    logging.exception(f"Spent listener failed for {tx_in}")
+
+        if added:
+            for listener in self._added_listeners:
+                try:
+                    listener(added)
+                except Exception:
+                    logging.exception(f"Added listener failed at {point}")
+
+    def roll_backward(self, point: Optional[Point]):
+        restored = []
+
+        with self._lock:
+            while self._undo and (point is None or self._undo[-1].point.slot > point.slot):
+                undo = self._undo.pop()
+
+                for tx_in in reversed(undo.added):
+                    self._remove(tx_in)
+
+                for entry in reversed(undo.removed):
+                    self._add(entry)
+                    restored.append(entry)
+
+            self.tip = self._undo[-1].point if self._undo else point
+
+            # Unspent again, unless their creation was rolled back too
+            restored = [entry for entry in restored if entry.utxo.input in self._utxos]
+
+        if restored:
+            for listener in self._added_listeners:
+                try:
+                    listener(restored)
+                except Exception:
+                    logging.exception(f"Added listener failed rolling back to {point}")
+
+    def clear(self):
+        with self._lock:
+            self._utxos.clear()
+            self._by_address.clear()
+            self._by_proposal.clear()
+            self._oracles_by_policy.clear()
+            self._escrows_by_policy.clear()
+            self._escrows_by_creator.clear()
+            self._escrow_deadlines.clear()
+            self._scripts.clear()
+            self._undo.clear()
+            self.tip = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "utxos": len(self._utxos),
+            "proposals": len(self._by_proposal),
+            "escrows": len(self._escrow_deadlines),
+            "slot": self.tip.slot if self.tip is not None else 0,
+        }
+
+
+class Indexer:
+    def __init__(
+        self,
+        source: BlockSource,
+        store: UTxOStore,
+        addresses: Iterable[pyc.Address],
+        start: Optional[Point] = None,
+        retry_delay: float = 5.0,
+    ):
+        self.source = source
+        self.store = store
+        self.start = start
+        self.retry_delay = retry_delay
+
+        self.addresses: Set[bytes] = set()
+        for address in addresses:
+            self.track(address)
+
+        self.synced = False
+
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def track(self, address: pyc.Address):
+        self.addresses.add(address.to_primitive())
+
+    def _entry(self, utxo: pyc.UTxO, slot: int) -> IndexedUTxO:
+        datum = escrow = None
+        if isinstance(utxo.output.datum, pyc.RawCBOR):
+            cbor = utxo.output.datum.cbor
+            try:
+                datum = oracle_datum.decode(cbor)
+            except ValueError:
+                try:
+                    escrow = escrow_datum.decode(cbor)
+                except ValueError:
+                    pass
+
+        return IndexedUTxO(utxo, datum, slot, escrow)
+
+    def apply(self, event: Event):
+        if isinstance(event, RollBackward):
+            self.store.roll_backward(event.point)
+        else:
+            transactions = []
+            for cbor in event.transactions:
+                spent, created = decode_transaction(cbor, self.addresses)
+                transactions.append(
+                    (spent, [self._entry(utxo, event.point.slot) for utxo in created])
+                )
+
+            self.store.roll_forward(event.point, transactions)
+
+        if event.tip is not None and self.store.tip is not None:
+            self.synced = self.store.tip.slot >= event.tip.slot
+
+    def run(self):
+        """Follow the source until it is exhausted or `stop` is called"""
+
+        while not self._stopping.is_set():
+            points = self.store.points() or ([self.start] if self.start else [])
+
+            try:
+                for event in self.source.events(points):
+                    self.apply(event)
+
+                    if self._stopping.is_set():
+                        return
+
+                self.synced = True
+                return
+            except Exception:
+                logging.exception(f"Indexer lost its block source, retrying in {self.retry_delay}s")
+                self.synced = False
+            finally:
+                self.source.close()
+
+            self._stopping.wait(self.retry_delay)
+
+    def start_thread(self):
+        if self._thread is not None:
+            return
+
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self.run, name="utxo-indexer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stopping.set()
+        self.source.close()
+
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.store.stats(), synced=int(self.synced))
+
+
+store = UTxOStore()
+
+# Set by app.py when INDEXER_SOURCE is configured
+indexer: Optional[Indexer] = None
+
+
+def source(url: str) -> BlockSource:
+    """Ogmios for ws:// and wss:// urls, a replay file otherwise"""
+
+    if url.startswith(("ws://", "wss://")):
+        return OgmiosSource(url)
+
+    return ReplaySource(url)
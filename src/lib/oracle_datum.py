@@ -0,0 +1,264 @@
+"""Direct CBOR codec for oracle datums
+
+`data_types.cbor_datum_to_dict` goes through pycardano's PlutusData classes,
+tries `ResultsSome` and falls back to `ResultsNone` on exception, and builds
+the hash and address objects of every field up front. `decode` reads the
+plain CBOR items instead, tells the results constructors apart by their
+tag (121 is `ResultsSome`, 122 is `ResultsNone`) and only materializes the
+pycardano types when they are accessed.
+
+Records keep the bytes they were decoded from, `to_cbor` gives them back
+unchanged, and records built from scratch encode exactly like
+`data_types.oracle_datum`.
+"""
+
+from __future__ import annotations
+from typing import List, Optional
+
+import pycardano as pyc
+import cbor2
+
+
+# Plutus data constructors 0 and 1
+CONSTR_0 = 121
+CONSTR_1 = 122
+
+FIELDS = (
+    "proposal_id",
+    "minting_policy_identifier",
+    "creator",
+    "deadline",
+    "oracles",
+    "min_signatures",
+    "payment_address",
+    "results",
+)
+
+
+def _head(major: int, value: int) -> bytes:
+    if value < 24:
+        return bytes([major << 5 | value])
+    if value < 0x100:
+        return bytes([major << 5 | 24, value])
+    if value < 0x10000:
+        return bytes([major << 5 | 25]) + value.to_bytes(2, "big")
+    if value < 0x100000000:
+        return bytes([major << 5 | 26]) + value.to_bytes(4, "big")
+
+    return bytes([major << 5 | 27]) + value.to_bytes(8, "big")
+
+
+def _bytes(value: bytes) -> bytes:
+    return _head(2, len(value)) + value
+
+
+def encode_int(value: int) -> bytes:
+    return _head(0, value) if value >= 0 else _head(1, -1 - value)
+
+
+def _constr(tag: int, fields: List[bytes]) -> bytes:
+    # pycardano encodes constructor fields as indefinite lists, unless empty
+    if not fields:
+        return _head(6, tag) + b"\x80"
+
+    return _head(6, tag) + b"\x9f" + b"".join(fields) + b"\xff"
+
+
+def encode_results(results: Optional[bytes]) -> bytes:
+    if results is None:
+        return _constr(CONSTR_1, [])
+
+    return _constr(CONSTR_0, [_bytes(results)])
+
+
+class OracleDatum:
+    """Decoded oracle datum, also readable like `data_types.datum_to_dict`"""
+
+    __slots__ = (
+        "proposal_id",
+        "policy_id",
+        "creator_hash",
+        "deadline",
+        "oracles",
+        "min_signatures",
+        "payment_part",
+        "results",
+        "_cbor",
+        "_minting_policy_identifier",
+        "_creator",
+        "_payment_address",
+    )
+
+    def __init__(
+        self,
+        proposal_id: str,
+        policy_id: bytes,
+        creator_hash: bytes,
+        deadline: int,
+        oracles: List[bytes],
+        min_signatures: int,
+        payment_part: bytes,
+        results: Optional[bytes] = None,
+        cbor: Optional[bytes] = None,
+    ):
+        self.proposal_id = proposal_id
+        self.policy_id = policy_id
+        self.creator_hash = creator_hash
+        self.deadline = deadline
+        self.oracles = oracles
+        self.min_signatures = min_signatures
+        self.payment_part = payment_part
+        self.results = results
+
+        self._cbor = cbor
+        self._minting_policy_identifier = None
+        self._creator = None
+        self._payment_address = None
+
+    @property
+    def minting_policy_identifier(self) -> pyc.ScriptHash:
+        if self._minting_policy_identifier is None:
+            self._minting_policy_identifier = pyc.ScriptHash.from_primitive(self.policy_id)
+
+        return self._minting_policy_identifier
+
+    @property
+    def creator(self) -> pyc.VerificationKeyHash:
+        if self._creator is None:
+            self._creator = pyc.VerificationKeyHash.from_primitive(self.creator_hash)
+
+        return self._creator
+
+    @property
+    def payment_address(self) -> pyc.Address:
+        if self._payment_address is None:
+            self._payment_address = pyc.Address(
+                payment_part=pyc.VerificationKeyHash.from_primitive(self.payment_part),
+                network=pyc.Network.TESTNET,
+            )
+
+        return self._payment_address
+
+    def with_results(self, results: Optional[bytes]) -> OracleDatum:
+        """Same datum with other results, sharing every other field
+
+        The encoding is spliced from ours, only the results are re-encoded.
+        """
+
+        datum = OracleDatum(
+            self.proposal_id,
+            self.policy_id,
+            self.creator_hash,
+            self.deadline,
+            self.oracles,
+            self.min_signatures,
+            self.payment_part,
+            results,
+        )
+        datum._minting_policy_identifier = self._minting_policy_identifier
+        datum._creator = self._creator
+        datum._payment_address = self._payment_address
+
+        if self._cbor is not None:
+            tail = encode_results(self.results) + b"\xff"
+            if self._cbor.endswith(tail):
+                datum._cbor = self._cbor[: -len(tail)] + encode_results(results) + b"\xff"
+
+        return datum
+
+    def __getitem__(self, key: str):
+        if key not in FIELDS:
+            raise KeyError(key)
+
+        return getattr(self, key)
+
+    def to_dict(self) -> dict:
+        return {key: getattr(self, key) for key in FIELDS}
+
+    def to_cbor(self) -> bytes:
+        if self._cbor is None:
+            self._cbor = (
+                b"\x9f"
+                + _bytes(bytes(self.proposal_id, "utf-8"))
+                + _bytes(self.policy_id)
+                + _bytes(self.creator_hash)
+                + encode_int(self.deadline)
+                + b"\x9f"
+                + b"".join(_bytes(oracle) for oracle in self.oracles)
+                + b"\xff"
+                + encode_int(self.min_signatures)
+                + _constr(CONSTR_0, [_bytes(self.payment_part)])
+                + encode_results(self.results)
+                + b"\xff"
+            )
+
+        return self._cbor
+
+    def to_datum(self) -> pyc.RawCBOR:
+        """Datum to put in a transaction output"""
+
+        return pyc.RawCBOR(self.to_cbor())
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, OracleDatum) and self.to_cbor() == other.to_cbor()
+
+    def __repr__(self) -> str:
+        return f"OracleDatum(proposal_id={self.proposal_id!r}, results={self.results!r})"
+
+
+def _tagged(item, tag: int, length: int) -> list:
+    if not isinstance(item, cbor2.CBORTag) or item.tag != tag:
+        raise ValueError(f"Expected constructor tag {tag}")
+    if not isinstance(item.value, list) or len(item.value) != length:
+        raise ValueError(f"Constructor {tag} should have {length} fields")
+
+    return item.value
+
+
+def decode(cbor: bytes) -> OracleDatum:
+    """Decode an oracle datum, raises ValueError if `cbor` isn't one"""
+
+    try:
+        data = cbor2.loads(cbor)
+    except Exception as e:
+        raise ValueError(f"Invalid CBOR: {e}")
+
+    if not isinstance(data, list) or len(data) != 8:
+        raise ValueError("Oracle datum should be a list of 8 fields")
+
+    proposal_id, policy_id, creator, deadline, oracles, min_signatures, payment, results = data
+
+    if not (
+        isinstance(proposal_id, bytes)
+        and isinstance(policy_id, bytes)
+        and isinstance(creator, bytes)
+        and isinstance(deadline, int)
+        and isinstance(oracles, list)
+        and isinstance(min_signatures, int)
+    ):
+        raise ValueError("Malformed oracle datum")
+
+    if isinstance(results, cbor2.CBORTag) and results.tag == CONSTR_1:
+        _tagged(results, CONSTR_1, 0)
+        results = None
+    else:
+        (results,) = _tagged(results, CONSTR_0, 1)
+
+    (payment_part,) = _tagged(payment, CONSTR_0, 1)
+
+    try:
+        proposal_id = proposal_id.decode("utf-8")
+    except UnicodeDecodeError:
+        raise ValueError("Proposal id isn't valid UTF-8")
+
+    return OracleDatum(
+        proposal_id,
+        policy_id,
+        creator,
+        deadline,
+        oracles,
+        min_signatures,
+        payment_part,
+        results,
+        cbor,
+    )
@@ -0,0 +1,184 @@
+"""Incremental quorum tracking for oracle signatures
+
+Signatures are tallied per `(script_input, results)` as they are accepted by
+the API, and a tally is marked as reached as soon as it holds the datum's
+`min_signatures`. Looking up whether a proposal reached quorum is then a
+dictionary access instead of a query over the signature table.
+
+The tracker lives in process memory, `warm_up` rebuilds it from the recent
+signatures of the database when a worker starts. Script inputs are dropped
+once they are spent or answered (see `discard`), so it only holds the open
+requests.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from dataclasses import dataclass, field
+
+import pycardano as pyc
+import threading
+import logging
+
+
+@dataclass
+class Tally:
+    script_input: str
+    proposal_id: str
+    results: str
+    min_signatures: Optional[int] = None
+    pubkeys: Set[str] = field(default_factory=set)
+
+    @property
+    def reached(self) -> bool:
+        return self.min_signatures is not None and len(self.pubkeys) >= self.min_signatures
+
+    def to_dict(self) -> dict:
+        return {
+            "proposal_id": self.proposal_id,
+            "script_input": self.script_input,
+            "results": self.results,
+            "signatures": len(self.pubkeys),
+            "min_signatures": self.min_signatures,
+        }
+
+
+class QuorumTracker:
+    def __init__(self):
+        self._tallies: Dict[Tuple[str, str], Tally] = {}
+        # Results with a tally per script input, so it can be discarded at once
+        self._results: Dict[str, Set[str]] = {}
+        # Which results each oracle currently backs, resubmissions move it
+        self._votes: Dict[Tuple[str, str], str] = {}
+        self._min_signatures: Dict[str, int] = {}
+
+        self._reached: Dict[str, Tally] = {}
+        self._reached_by_proposal: Dict[str, Dict[str, Tally]] = {}
+
+        self._listeners: List[Callable[[Tally], None]] = []
+        self._lock = threading.Lock()
+
+    def on_quorum(self, listener: Callable[[Tally], None]):
+        """Call `listener` with the tally every time a script input reaches quorum"""
+
+        self._listeners.append(listener)
+
+    def add(
+        self,
+        script_input: str,
+        proposal_id: str,
+        pubkey: str,
+        results: str,
+        min_signatures: Optional[int] = None,
+    ) -> Optional[Tally]:
+        """Count a signature, returns the tally if it just reached quorum"""
+
+        # Each oracle counts once, whatever the case of its hex key
+        pubkey = pubkey.lower()
+
+        with self._lock:
+            if min_signatures is not None:
+                self._min_signatures[script_input] = min_signatures
+
+            previous = self._votes.get((script_input, pubkey))
+            if previous is not None and previous != results:
+                self._remove(script_input, pubkey, previous)
+
+            self._votes[(script_input, pubkey)] = results
+
+            tally = self._tallies.get((script_input, results))
+            if tally is None:
+                tally = self._tallies[(script_input, results)] = Tally(
+                    script_input, proposal_id, results
+                )
+                self._results.setdefault(script_input, set()).add(results)
+
+            tally.pubkeys.add(pubkey)
+            tally.min_signatures = self._min_signatures.get(script_input)
+
+            if script_input in self._reached or not tally.reached:
+                return None
+
+            self._reached[script_input] = tally
+            self._reached_by_proposal.setdefault(proposal_id, {})[script_input] = tally
+
+        for listener in self._listeners:
+            try:
+                listener(tally)
+            except Exception:
+                logging.exception(f"Quorum listener failed for {script_input}")
+
+        return tally
+
+    def _remove(self, script_input: str, pubkey: str, results: str):
+        tally = self._tallies[(script_input, results)]
+        tally.pubkeys.discard(pubkey)
+
+        if self._reached.get(script_input) is tally and not tally.reached:
+            del self._reached[script_input]
+            del self._reached_by_proposal[tally.proposal_id][script_input]
+
+    def get(self, script_input: str) -> Optional[Tally]:
+        return self._reached.get(script_input)
+
+    def reached(self, proposal_id: str = None) -> List[Tally]:
+        with self._lock:
+            if proposal_id is None:
+                return list(self._reached.values())
+
+            return list(self._reached_by_proposal.get(proposal_id, {}).values())
+
+    def discard(self, script_input: str):
+        """Forget everything about a script input, e.g. once it was spent"""
+
+        with self._lock:
+            tally = self._reached.pop(script_input, None)
+            if tally is not None:
+                del self._reached_by_proposal[tally.proposal_id][script_input]
+
+            # Every vote is in exactly one of the input's tallies
+            for results in self._results.pop(script_input, ()):
+                for pubkey in self._tallies.pop((script_input, results)).pubkeys:
+                    del self._votes[(script_input, pubkey)]
+
+            self._min_signatures.pop(script_input, None)
+
+    def on_spent(self, tx_in: pyc.TransactionInput):
+        self.discard(f"{tx_in.transaction_id}#{tx_in.index}")
+
+    def clear(self):
+        with self._lock:
+            self._tallies.clear()
+            self._results.clear()
+            self._votes.clear()
+            self._min_signatures.clear()
+            self._reached.clear()
+            self._reached_by_proposal.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"tallies": len(self._tallies), "reached": len(self._reached)}
+
+
+tracker = QuorumTracker()
+
+
+def warm_up(
+    signatures: Iterable[Tuple[str, str, str, str]],
+    min_signatures: Callable[[str], Optional[int]],
+):
+    """Rebuild the tracker from stored (script_input, proposal_id, pubkey, results)
+
+    `min_signatures` resolves the datum threshold of a script input, it is
+    called once per distinct script input.
+    """
+
+    thresholds: Dict[str, Optional[int]] = {}
+
+    for script_input, proposal_id, pubkey, results in signatures:
+        if script_input not in thresholds:
+            try:
+                thresholds[script_input] = min_signatures(script_input)
+            except Exception:
+                logging.warning(f"Could not resolve min_signatures of {script_input}")
+                thresholds[script_input] = None
+
+        tracker.add(script_input, proposal_id, pubkey, results, thresholds[script_input])
@@ -0,0 +1,342 @@
+"""Background worker answering oracle data requests once they reach quorum
+
+Script inputs announced by the quorum tracker are queued and answered with
+`cardano.submit_oracles_data`, using the stored signatures in the order the
+oracles appear in the datum. Failed builds are retried with exponential
+backoff. Submitted responses are checked again after `confirm_timeout`, and
+answered again if the script input is still unspent, so a dropped
+transaction doesn't leave the request unanswered. Only queued, running and
+submitted inputs are kept in `states`; once an input is done or given up on
+it can be queued again. With a local chain context, jobs wait until `ready`
+says the indexer reached the chain tip, and inputs missing from its store
+are checked upstream before being skipped, as they may predate the
+indexer's start point. Listeners registered with `on_done` hear about
+inputs that were answered, found spent or given up on, e.g. so the quorum
+tracker forgets them and a new quorum can queue them again.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Union
+from dataclasses import dataclass, field
+from blockfrost import BlockFrostApi
+
+import pycardano as pyc
+import threading
+import logging
+import heapq
+import time
+
+from lib import cardano, scripts, utxos
+from lib.chain_context import LocalIndexedChainContext
+from lib.collateral import CollateralManager
+from lib.quorum import Tally
+
+
+# Placeholder for oracles that didn't sign the agreed results, it has the
+# length of an Ed25519 signature but never verifies
+MISSING_SIGNATURE = bytes(64)
+
+
+@dataclass(order=True)
+class Job:
+    not_before: float
+    script_input: str = field(compare=False)
+    results: str = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+    # Set once submitted, the job is then due to check the response landed
+    transaction_id: Optional[pyc.TransactionId] = field(default=None, compare=False)
+
+
+class Responder:
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUBMITTED = "submitted"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+    ANSWERED = "answered"
+
+    def __init__(
+        self,
+        chain_context: pyc.ChainContext,
+        api: BlockFrostApi,
+        signing_key: pyc.PaymentSigningKey,
+        script: Union[str, scripts.Script],
+        load_signatures: Callable[[str, str], Dict[str, str]],
+        collateral: Optional[CollateralManager] = None,
+        ready: Optional[Callable[[], bool]] = None,
+        ready_interval: float = 1.0,
+        max_attempts: int = 5,
+        backoff: float = 5.0,
+        max_backoff: float = 300.0,
+        confirm_timeout: float = 600.0,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.chain_context = chain_context
+        self.api = api
+        self.signing_key = signing_key
+        self.script = scripts.resolve(script)
+        self.load_signatures = load_signatures
+        self.collateral = collateral or CollateralManager(chain_context, signing_key)
+        self.ready = ready
+        self.ready_interval = ready_interval
+
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.confirm_timeout = confirm_timeout
+        self.timer = timer
+
+        self.address = pyc.Address(
+            payment_part=pyc.VerificationKey.from_signing_key(signing_key).hash(),
+            network=chain_context.network,
+        )
+
+        # State of the script inputs in progress, this is what makes
+        # enqueueing idempotent. Finished inputs are only counted
+        self.states: Dict[str, str] = {}
+        self.transactions: Dict[str, pyc.TransactionId] = {}
+        self._finished: Dict[str, int] = {self.ANSWERED: 0, self.SKIPPED: 0, self.FAILED: 0}
+
+        self._jobs: List[Job] = []
+        self._listeners: List[Callable[[str], None]] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def on_done(self, listener: Callable[[str], None]):
+        """Call `listener` with every script input answered, skipped or failed"""
+
+        self._listeners.append(listener)
+
+    def on_quorum(self, tally: Tally):
+        self.enqueue(tally.script_input, tally.results)
+
+    def enqueue(self, script_input: str, results: str) -> bool:
+        with self._cond:
+            if script_input in self.states:
+                return False
+
+            self.states[script_input] = self.QUEUED
+            heapq.heappush(self._jobs, Job(self.timer(), script_input, results))
+
+            self._cond.notify()
+
+        return True
+
+    def respond(self, script_input: str, results: str) -> Optional[pyc.TransactionId]:
+        """Build, sign and submit the oracle response for `script_input`
+
+        Returns None when the script input was already spent or answered, or
+        fewer than `min_signatures` of its oracles signed `results`.
+        """
+
+        transaction_hash, index = script_input.split("#")
+        resolved = utxos.resolve(self.api, transaction_hash, int(index))
+        script_utxo = resolved.utxo
+
+        datum = resolved.datum
+        if datum is None or datum.results is not None:
+            return None
+
+        if not self._unspent(script_utxo):
+            utxos.invalidate(script_utxo.input)
+            return None
+
+        stored = self.load_signatures(script_input, results)
+
+        # The validator only counts the datum's oracles, each one once
+        signed = {oracle for oracle in datum.oracles if oracle.hex() in stored}
+        if len(signed) < datum.min_signatures:
+            logging.warning(
+                f"Only {len(signed)} of {datum.min_signatures} signatures are "
+                f"stored for {script_input}, not responding"
+            )
+            return None
+
+        signatures = [
+            bytes.fromhex(stored[oracle.hex()]) if oracle in signed else MISSING_SIGNATURE
+            for oracle in datum.oracles
+        ]
+
+        payment_address = pyc.Address(
+            payment_part=pyc.VerificationKeyHash.from_primitive(datum.payment_part),
+            network=self.chain_context.network,
+        )
+
+        collateral = self.collateral.lease()
+        try:
+            transaction = cardano.submit_oracles_data(
+                self.chain_context,
+                collateral,
+                script_utxo,
+                self.script,
+                datum,
+                payment_address,
+                bytes(results, "utf-8"),
+                signatures,
+            )
+
+            signed_tx = cardano.assemble_transaction(transaction, self.signing_key)
+
+            self.chain_context.submit_tx(signed_tx.to_cbor())
+        except Exception:
+            self.collateral.release(collateral)
+            raise
+
+        self.collateral.hold(collateral, signed_tx)
+
+        utxos.invalidate_spent(signed_tx)
+
+        return signed_tx.transaction_body.id
+
+    def _unspent(self, script_utxo: pyc.UTxO) -> bool:
+        # Only this output is looked up, the script address holds every
+        # oracle request
+        if isinstance(self.chain_context, LocalIndexedChainContext):
+            if self.chain_context.store.get(script_utxo.input) is not None:
+                return True
+
+            # The local store misses UTxOs created before the indexer's start
+            if self.chain_context.upstream is None:
+                return False
+
+        transaction_hash = script_utxo.input.transaction_id.payload.hex()
+        output = self.api.transaction_utxos(transaction_hash).outputs[script_utxo.input.index]
+
+        return getattr(output, "consumed_by_tx", None) is None
+
+    def _ready(self) -> bool:
+        return self.ready is None or self.ready()
+
+    def run_pending(self) -> int:
+        """Process every job that is due, returns how many were processed"""
+
+        if not self._ready():
+            return 0
+
+        processed = 0
+        while True:
+            with self._cond:
+                if not self._jobs or self._jobs[0].not_before > self.timer():
+                    return processed
+
+                job = heapq.heappop(self._jobs)
+                self.states[job.script_input] = self.RUNNING
+
+            self._process(job)
+            processed += 1
+
+    def _process(self, job: Job):
+        try:
+            transaction_id = self.respond(job.script_input, job.results)
+        except Exception:
+            job.attempts += 1
+
+            with self._cond:
+                if job.attempts < self.max_attempts:
+                    self._retry(job)
+                    return
+
+                logging.exception(f"Giving up responding to {job.script_input}")
+                self._finish(job.script_input, self.FAILED)
+
+            self._notify(job.script_input)
+            return
+
+        with self._cond:
+            if transaction_id is None:
+                # Spent by the response we submitted before, or by someone else
+                answered = job.transaction_id is not None
+                self._finish(job.script_input, self.ANSWERED if answered else self.SKIPPED)
+            else:
+                logging.info(f"Responded to {job.script_input} with {transaction_id}")
+                self.states[job.script_input] = self.SUBMITTED
+                self.transactions[job.script_input] = transaction_id
+
+                # Due again to check the response landed, it's answered again
+                # if the script input is still unspent by then
+                job.attempts = 0
+                job.transaction_id = transaction_id
+                job.not_before = self.timer() + self.confirm_timeout
+                heapq.heappush(self._jobs, job)
+
+                self._cond.notify()
+
+        self._notify(job.script_input)
+
+    def _retry(self, job: Job):
+        delay = min(self.max_backoff, self.backoff * 2 ** (job.attempts - 1))
+        logging.warning(f"Responding to {job.script_input} failed, retrying in {delay}s")
+
+        job.not_before = self.timer() + delay
+        self.states[job.script_input] = self.QUEUED
+        heapq.heappush(self._jobs, job)
+
+        self._cond.notify()
+
+    def _finish(self, script_input: str, state: str):
+        # Called with the lock held, the input can be queued again from now on
+        del self.states[script_input]
+        self.transactions.pop(script_input, None)
+        self._finished[state] += 1
+
+    def _notify(self, script_input: str):
+        for listener in self._listeners:
+            try:
+                listener(script_input)
+            except Exception:
+                logging.exception(f"Responder listener failed for {script_input}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._jobs:
+                        timeout = self._jobs[0].not_before - self.timer()
+                        if timeout <= 0:
+                            if self._ready():
+                                break
+
+                            timeout = self.ready_interval
+                    else:
+                        timeout = None
+
+                    self._cond.wait(timeout)
+
+                if self._stopping:
+                    return
+
+            self.run_pending()
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="oracle-responder", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+            thread, self._thread = self._thread, None
+
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            counts = {state: 0 for state in [self.QUEUED, self.RUNNING, self.SUBMITTED]}
+            for state in self.states.values():
+                counts[state] += 1
+
+            return {**counts, **self._finished}
+
+
+# Set by app.py when RESPONDER_SKEY is configured
+worker: Optional[Responder] = None
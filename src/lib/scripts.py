@@ -0,0 +1,78 @@
+"""Registry of the Plutus scripts used by the transaction builders
+
+Scripts are decoded once per process, and their hash and addresses are
+memoized, so building a transaction doesn't re-read or re-hash them.
+"""
+
+from __future__ import annotations
+from typing import Dict, Union
+from functools import lru_cache
+
+import pycardano as pyc
+import threading
+import cbor2
+import os
+
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "scripts")
+
+
+class Script:
+    def __init__(self, script_hex: str):
+        self.hex = script_hex.strip()
+        self.plutus_script = pyc.PlutusV2Script(cbor2.loads(bytes.fromhex(self.hex)))
+        self.hash: pyc.ScriptHash = pyc.plutus_script_hash(self.plutus_script)
+
+        self._addresses: Dict[pyc.Network, pyc.Address] = {}
+        self._lock = threading.Lock()
+
+    def address(self, network: pyc.Network = pyc.Network.TESTNET) -> pyc.Address:
+        address = self._addresses.get(network)
+        if address is None:
+            with self._lock:
+                address = self._addresses.setdefault(
+                    network, pyc.Address(self.hash, network=network)
+                )
+
+        return address
+
+    def __repr__(self) -> str:
+        return f"Script(hash={self.hash.payload.hex()})"
+
+
+def from_hex(script_hex: str) -> Script:
+    return _from_hex(script_hex.strip())
+
+
+@lru_cache(maxsize=None)
+def _from_hex(script_hex: str) -> Script:
+    return Script(script_hex)
+
+
+@lru_cache(maxsize=None)
+def from_file(path: str) -> Script:
+    with open(path, "r") as f:
+        return from_hex(f.read())
+
+
+def load(name: str) -> Script:
+    """Load one of the bundled scripts, e.g. `load("oracle")` or `load("escrow")`"""
+
+    return from_file(os.path.abspath(os.path.join(SCRIPTS_DIR, f"{name}.plutus")))
+
+
+def oracle() -> Script:
+    return load("oracle")
+
+
+def escrow() -> Script:
+    return load("escrow")
+
+
+def resolve(script: Union[str, Script]) -> Script:
+    """Accept either a registry handle or a raw script hex string"""
+
+    if isinstance(script, Script):
+        return script
+
+    return from_hex(script)
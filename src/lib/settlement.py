@@ -0,0 +1,520 @@
+"""Background scheduler settling escrows and giving expired ones back
+
+Escrows come from the indexer's store and wait in a heap ordered by
+deadline. When an oracle holding results is indexed, the escrows sharing
+its minting policy are executed right away with
+`cardano.execute_escrows_batch`. Only oracle UTxOs at the oracle script
+holding a token of that policy count, anyone can pay an oracle datum to
+the tracked addresses but only the request's creator mints its token. An
+escrow reaching its deadline without results is given back to its creator
+with `cardano.retrieve_escrows_batch`, provided we hold the creator's key.
+So is one whose settlement kept failing, unless another oracle UTxO of its
+policy can settle it.
+
+A single thread sleeps until the earliest job is due or the store reports
+new escrows or results, so the chain is never polled. Submitted escrows are
+checked again after `confirm_timeout`: those the store still holds unspent
+are queued again, like those a rollback gives back. Transactions are
+built on a thread pool with at most `wallet_concurrency` of them in flight
+per wallet, as builds from the same wallet compete for its UTxOs, each with
+collateral leased from the wallet's `CollateralManager`.
+"""
+
+from __future__ import annotations
+from typing import Callable, Deque, Dict, List, Optional, Set, Union
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from collections import defaultdict, deque
+
+import pycardano as pyc
+import threading
+import logging
+import heapq
+import time
+
+from lib import cardano, scripts, utxos
+from lib.collateral import CollateralManager
+from lib.escrow_datum import VOTE_COUNT, EscrowDatum
+from lib.indexer import IndexedUTxO, UTxOStore
+from lib.vote_results import VoteResults
+
+
+SETTLE = "settle"
+DEADLINE = "deadline"
+CONFIRM = "confirm"
+
+
+@dataclass(order=True)
+class Job:
+    due: float
+    kind: str = field(compare=False)
+    # The oracle UTxO for settlements, the escrow for deadlines and
+    # confirmations
+    tx_in: pyc.TransactionInput = field(compare=False)
+    attempts: int = field(default=0, compare=False)
+
+
+@dataclass
+class Task:
+    wallet: bytes
+    entries: List[IndexedUTxO]
+    jobs: List[Job]
+    oracle: Optional[IndexedUTxO] = None
+    receiver: Optional[pyc.Address] = None
+
+
+def receiver(escrow: EscrowDatum, results: VoteResults, network: pyc.Network) -> pyc.Address:
+    """Address of the choice winning the escrow's question
+
+    Choices are compared by vote count or weight as the escrow says, ties go
+    to the first choice.
+    """
+
+    if escrow.question_index >= len(results):
+        raise ValueError(f"Results have no question {escrow.question_index}")
+
+    votes = results.counts if escrow.vote_use == VOTE_COUNT else results.weights
+    start = results.offsets[escrow.question_index]
+    end = results.offsets[escrow.question_index + 1]
+
+    winner = max(range(start, end), key=lambda choice: votes[choice]) - start
+    if winner >= len(escrow.payment_parts):
+        raise ValueError(f"Escrow has no address for choice {winner}")
+
+    return pyc.Address(
+        payment_part=pyc.VerificationKeyHash(escrow.payment_parts[winner]),
+        network=network,
+    )
+
+
+class Scheduler:
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUBMITTED = "submitted"
+    SKIPPED = "skipped"
+    FAILED = "failed"
+
+    def __init__(
+        self,
+        chain_context: pyc.ChainContext,
+        store: UTxOStore,
+        signing_keys: List[pyc.PaymentSigningKey],
+        script: Union[str, scripts.Script],
+        oracle_script: Optional[Union[str, scripts.Script]] = None,
+        wallet_concurrency: int = 1,
+        max_workers: int = 4,
+        collateral_pool_size: int = 4,
+        collateral_wait: float = 60.0,
+        retrieval_delay: float = 120.0,
+        confirm_timeout: float = 600.0,
+        max_attempts: int = 5,
+        backoff: float = 5.0,
+        max_backoff: float = 300.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.chain_context = chain_context
+        self.store = store
+        self.script = scripts.resolve(script)
+        self.oracle_script = scripts.resolve(oracle_script or scripts.oracle())
+
+        self.wallet_concurrency = wallet_concurrency
+        self.retrieval_delay = retrieval_delay
+        self.confirm_timeout = confirm_timeout
+        self.collateral_wait = collateral_wait
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+
+        # Executions are paid by the first key, retrievals by the creator's
+        self.keys: Dict[bytes, pyc.PaymentSigningKey] = {}
+        for signing_key in signing_keys:
+            key_hash = pyc.VerificationKey.from_signing_key(signing_key).hash()
+            self.keys[key_hash.payload] = signing_key
+
+        self.settler = next(iter(self.keys))
+
+        self.collateral: Dict[bytes, CollateralManager] = {
+            wallet: CollateralManager(chain_context, signing_key, pool_size=collateral_pool_size)
+            for wallet, signing_key in self.keys.items()
+        }
+
+        # State of every escrow we have seen
+        self.states: Dict[pyc.TransactionInput, str] = {}
+        self.transactions: Dict[pyc.TransactionInput, pyc.TransactionId] = {}
+        # Oracle UTxOs each escrow couldn't be settled with
+        self.failed_oracles: Dict[pyc.TransactionInput, Set[pyc.TransactionInput]] = {}
+
+        self._jobs: List[Job] = []
+        self._running: Dict[bytes, int] = defaultdict(int)
+        self._waiting: Dict[bytes, Deque[Task]] = defaultdict(deque)
+
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="escrow-settlement")
+
+    def address(self, wallet: bytes) -> pyc.Address:
+        return pyc.Address(
+            payment_part=pyc.VerificationKeyHash(wallet),
+            network=self.chain_context.network,
+        )
+
+    def load(self):
+        """Schedule every escrow and settlement already in the store"""
+
+        self.on_added(self.store.escrows())
+        self.on_added([oracle for oracle, _ in self.store.settleable()])
+
+    def on_added(self, entries: List[IndexedUTxO]):
+        with self._cond:
+            for entry in entries:
+                if entry.escrow is not None:
+                    self._schedule_deadline(entry)
+                elif entry.datum is not None and self._settles(entry):
+                    heapq.heappush(self._jobs, Job(self.clock(), SETTLE, entry.utxo.input))
+
+            self._cond.notify()
+
+    def _schedule_deadline(self, entry: IndexedUTxO):
+        tx_in = entry.utxo.input
+        if self.states.get(tx_in) in (self.QUEUED, self.RUNNING):
+            return
+
+        # Either new, or unspent again after a rollback or a submission that
+        # never made it
+        self.states[tx_in] = self.QUEUED
+
+        due = self._retrievable(entry)
+        if self._answered(entry) is not None:
+            due = min(due, self.clock())
+
+        heapq.heappush(self._jobs, Job(due, DEADLINE, tx_in))
+
+    def _retrievable(self, entry: IndexedUTxO) -> float:
+        # Deadlines are POSIX milliseconds, the delay lets the chain tip move
+        # past them before a retrieval is valid
+        return entry.escrow.deadline / 1000 + self.retrieval_delay
+
+    def _settles(self, oracle: IndexedUTxO) -> bool:
+        """Whether `oracle` is an answered request of the oracle script"""
+
+        output = oracle.utxo.output
+        if oracle.datum.results is None or output.address.payment_part != self.oracle_script.hash:
+            return False
+
+        if not isinstance(output.amount, pyc.Value):
+            return False
+
+        asset = output.amount.multi_asset.get(oracle.datum.minting_policy_identifier)
+        return asset is not None and any(quantity > 0 for quantity in asset.values())
+
+    def _answered(self, escrow: IndexedUTxO) -> Optional[IndexedUTxO]:
+        failed = self.failed_oracles.get(escrow.utxo.input, ())
+        for oracle in self.store.oracles(escrow.escrow.policy_id):
+            if oracle.utxo.input not in failed and self._settles(oracle):
+                return oracle
+
+        return None
+
+    def _pending(self, entries: List[IndexedUTxO], oracle: IndexedUTxO) -> List[IndexedUTxO]:
+        # Failed escrows may still be settled by another oracle UTxO
+        return [
+            entry
+            for entry in entries
+            if self.states.get(entry.utxo.input, self.QUEUED) in (self.QUEUED, self.FAILED)
+            and oracle.utxo.input not in self.failed_oracles.get(entry.utxo.input, ())
+        ]
+
+    def _settlements(self, oracle: IndexedUTxO, job: Job) -> List[Task]:
+        """Tasks executing the pending escrows of `oracle`, one per receiver"""
+
+        try:
+            results = VoteResults.parse(oracle.datum.results.decode("utf-8"))
+        except ValueError:
+            logging.warning(f"Oracle {oracle.utxo.input} holds invalid results")
+            return []
+
+        addresses: Dict[str, pyc.Address] = {}
+        by_receiver: Dict[str, List[IndexedUTxO]] = defaultdict(list)
+        for entry in self._pending(self.store.escrows_for_oracle(oracle.utxo.input), oracle):
+            try:
+                address = receiver(entry.escrow, results, self.chain_context.network)
+            except ValueError as e:
+                logging.warning(f"Can't settle escrow {entry.utxo.input}: {e}")
+                self.states[entry.utxo.input] = self.SKIPPED
+                continue
+
+            addresses[str(address)] = address
+            by_receiver[str(address)].append(entry)
+
+        return [
+            Task(
+                self.settler,
+                entries,
+                [Job(job.due, SETTLE, job.tx_in, job.attempts)],
+                oracle,
+                addresses[address],
+            )
+            for address, entries in by_receiver.items()
+        ]
+
+    def run_pending(self) -> int:
+        """Dispatch every job that is due, returns how many were dispatched"""
+
+        with self._cond:
+            due = []
+            now = self.clock()
+            while self._jobs and self._jobs[0].due <= now:
+                due.append(heapq.heappop(self._jobs))
+
+            oracles: Dict[pyc.TransactionInput, Job] = {}
+            retrievals: Dict[bytes, Task] = {}
+
+            for job in due:
+                if job.kind == SETTLE:
+                    oracles.setdefault(job.tx_in, job)
+                    continue
+
+                if job.kind == CONFIRM:
+                    entry = self.store.get(job.tx_in)
+                    if self.states.get(job.tx_in) == self.SUBMITTED and entry is not None:
+                        logging.warning(f"Escrow {job.tx_in} is still unspent, queueing it again")
+                        self._schedule_deadline(entry)
+                    continue
+
+                if self.states.get(job.tx_in) != self.QUEUED:
+                    continue
+
+                entry = self.store.get(job.tx_in)
+                if entry is None:
+                    # Spent by someone else
+                    self.states[job.tx_in] = self.SKIPPED
+                    continue
+
+                oracle = self._answered(entry)
+                if oracle is not None:
+                    oracles.setdefault(oracle.utxo.input, Job(now, SETTLE, oracle.utxo.input))
+                    continue
+
+                # Due early for results that are gone or couldn't settle it
+                if now < self._retrievable(entry):
+                    heapq.heappush(self._jobs, Job(self._retrievable(entry), DEADLINE, job.tx_in))
+                    continue
+
+                creator = entry.escrow.creator_hash
+                if creator not in self.keys:
+                    # Still settled if an oracle UTxO shows up that can
+                    unsettled = job.tx_in in self.failed_oracles
+                    self.states[job.tx_in] = self.FAILED if unsettled else self.SKIPPED
+                    continue
+
+                task = retrievals.setdefault(creator, Task(creator, [], []))
+                task.entries.append(entry)
+                task.jobs.append(job)
+
+            tasks = list(retrievals.values())
+            for tx_in, job in oracles.items():
+                oracle = self.store.get(tx_in)
+                if oracle is not None and self._settles(oracle):
+                    tasks.extend(self._settlements(oracle, job))
+
+            for task in tasks:
+                for entry in task.entries:
+                    self.states[entry.utxo.input] = self.RUNNING
+
+                self._waiting[task.wallet].append(task)
+                self._start(task.wallet)
+
+            return len(due)
+
+    def _start(self, wallet: bytes):
+        while self._running[wallet] < self.wallet_concurrency and self._waiting[wallet]:
+            self._running[wallet] += 1
+            self._pool.submit(self._execute, self._waiting[wallet].popleft())
+
+    def _build(self, task: Task, collateral: pyc.UTxO) -> List[pyc.Transaction]:
+        script_utxos = [entry.utxo for entry in task.entries]
+
+        if task.oracle is not None:
+            return cardano.execute_escrows_batch(
+                self.chain_context,
+                collateral,
+                script_utxos,
+                self.script,
+                task.oracle.utxo.input,
+                task.receiver,
+                VoteResults.parse(task.oracle.datum.results.decode("utf-8")),
+            )
+
+        # Valid from the slot after the latest deadline
+        validity_start = 1 + max(
+            cardano.posix_to_slot(entry.escrow.deadline, self.chain_context.network)
+            for entry in task.entries
+        )
+
+        return cardano.retrieve_escrows_batch(
+            self.chain_context,
+            collateral,
+            script_utxos,
+            self.script,
+            self.address(task.wallet),
+            validity_start,
+        )
+
+    def _execute(self, task: Task):
+        manager = self.collateral[task.wallet]
+        collateral = None
+        submitted: List[pyc.Transaction] = []
+
+        try:
+            collateral = manager.lease(self.collateral_wait)
+
+            for transaction in self._build(task, collateral):
+                signed_tx = cardano.assemble_transaction(transaction, self.keys[task.wallet])
+
+                self.chain_context.submit_tx(signed_tx.to_cbor())
+
+                utxos.invalidate_spent(signed_tx)
+                submitted.append(signed_tx)
+        except Exception:
+            logging.exception(f"Settling {len(task.entries)} escrows failed")
+            failed = True
+        else:
+            failed = False
+        finally:
+            if collateral is not None:
+                if submitted:
+                    manager.hold(collateral, *submitted)
+                else:
+                    manager.release(collateral)
+
+        with self._cond:
+            for signed_tx in submitted:
+                for tx_in in signed_tx.transaction_body.inputs:
+                    self.states[tx_in] = self.SUBMITTED
+                    self.transactions[tx_in] = signed_tx.transaction_body.id
+                    self.failed_oracles.pop(tx_in, None)
+
+                    heapq.heappush(
+                        self._jobs, Job(self.clock() + self.confirm_timeout, CONFIRM, tx_in)
+                    )
+
+            if submitted:
+                self._cond.notify()
+
+        if failed:
+            # Only what wasn't submitted is retried
+            task.entries = [
+                entry
+                for entry in task.entries
+                if self.states[entry.utxo.input] != self.SUBMITTED
+            ]
+            if task.entries:
+                self._retry(task)
+        else:
+            logging.info(f"Submitted {len(task.entries)} escrows of {task.wallet.hex()}")
+
+        with self._cond:
+            self._running[task.wallet] -= 1
+            if not self._stopping:
+                self._start(task.wallet)
+
+    def _retry(self, task: Task):
+        with self._cond:
+            attempts = max(job.attempts for job in task.jobs) + 1
+            if attempts >= self.max_attempts:
+                logging.error(f"Giving up on {len(task.entries)} escrows")
+                for entry in task.entries:
+                    self.states[entry.utxo.input] = self.FAILED
+
+                if task.oracle is not None:
+                    # Another oracle UTxO may settle them, or they are given
+                    # back once past their deadline
+                    for entry in task.entries:
+                        self.failed_oracles.setdefault(entry.utxo.input, set()).add(
+                            task.oracle.utxo.input
+                        )
+                        self._schedule_deadline(entry)
+
+                    self._cond.notify()
+
+                return
+
+            delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+            logging.warning(f"Settling {len(task.entries)} escrows failed, retrying in {delay}s")
+
+            for entry in task.entries:
+                self.states[entry.utxo.input] = self.QUEUED
+
+            for job in task.jobs:
+                job.due = self.clock() + delay
+                job.attempts = attempts
+                heapq.heappush(self._jobs, job)
+
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    if self._jobs:
+                        timeout = self._jobs[0].due - self.clock()
+                        if timeout <= 0:
+                            break
+                    else:
+                        timeout = None
+
+                    self._cond.wait(timeout)
+
+                if self._stopping:
+                    return
+
+            self.run_pending()
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="escrow-scheduler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+            thread, self._thread = self._thread, None
+
+        if thread is not None:
+            thread.join(timeout)
+
+        self._pool.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            counts = {
+                state: 0
+                for state in [
+                    self.QUEUED,
+                    self.RUNNING,
+                    self.SUBMITTED,
+                    self.SKIPPED,
+                    self.FAILED,
+                ]
+            }
+            for state in self.states.values():
+                counts[state] += 1
+
+            counts["scheduled"] = len(self._jobs)
+            counts["in_flight"] = sum(self._running.values())
+
+            return counts
+
+
+# Set by app.py when SETTLEMENT_SKEYS is configured
+scheduler: Optional[Scheduler] = None
@@ -1,4 +1,23 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from nacl.signing import SigningKey, VerifyKey
+from nacl.exceptions import BadSignatureError
+
+import threading
+import os
+
+from lib import vote_results
+
+
+# Batches smaller than this are verified on the calling thread, splitting
+# them up costs more than the verification itself
+PARALLEL_THRESHOLD = 256
+
+VKEY_CACHE_SIZE = 4096
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
 
 
 def sign(skey_hex: str, message_hex: str):
@@ -9,8 +28,13 @@ def sign(skey_hex: str, message_hex: str):
     return signed
 
 
+@lru_cache(maxsize=VKEY_CACHE_SIZE)
+def verify_key(vkey_hex: str) -> VerifyKey:
+    return VerifyKey(bytes.fromhex(vkey_hex))
+
+
 def verify(vkey_hex: str, message_hex: str, signature_hex: str):
-    vkey = VerifyKey(bytes.fromhex(vkey_hex))
+    vkey = verify_key(vkey_hex)
 
     return vkey.verify(
         bytes.fromhex(message_hex),
@@ -18,16 +42,70 @@ def verify(vkey_hex: str, message_hex: str, signature_hex: str):
     )
 
 
+def _verify_chunk(chunk: Sequence[Tuple[str, str, str]]) -> List[bool]:
+    # Every oracle signs the same results, so decode each message only once
+    messages: Dict[str, bytes] = {}
+
+    valid = []
+    for vkey_hex, message_hex, signature_hex in chunk:
+        try:
+            message = messages.get(message_hex)
+            if message is None:
+                message = messages[message_hex] = bytes.fromhex(message_hex)
+
+            verify_key(vkey_hex).verify(message, bytes.fromhex(signature_hex))
+        except (BadSignatureError, ValueError, TypeError):
+            valid.append(False)
+        else:
+            valid.append(True)
+
+    return valid
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=min(8, os.cpu_count() or 1),
+                thread_name_prefix="signature",
+            )
+
+        return _executor
+
+
+def verify_many(
+    triples: Iterable[Tuple[str, str, str]], workers: Optional[int] = None
+) -> List[bool]:
+    """Verify many (vkey_hex, message_hex, signature_hex) triples at once
+
+    Returns one boolean per triple, in order, instead of raising on the first
+    bad signature. Large batches are spread across a thread pool, libsodium
+    releases the GIL while verifying so the chunks run in parallel.
+    """
+
+    triples = list(triples)
+
+    if workers is None:
+        workers = _get_executor()._max_workers
+
+    if workers <= 1 or len(triples) < PARALLEL_THRESHOLD:
+        return _verify_chunk(triples)
+
+    size = -(-len(triples) // workers)
+    chunks = [triples[i : i + size] for i in range(0, len(triples), size)]
+
+    valid = []
+    for chunk_valid in _get_executor().map(_verify_chunk, chunks):
+        valid.extend(chunk_valid)
+
+    return valid
+
+
 # Function that should enforce the standard for a string
 # It should make sure that the string is in the follwing format:
 # "<question1choice1>,<question1choice2>,...|<question2choice1>,<question2choice2>,...|..."
 # where everything inside <> should be an integer
 def enforce_standard(results: str) -> bool:
-    for question in results.split("|"):
-        for choice in question.split(","):
-            try:
-                int(choice)
-            except ValueError:
-                return False
-
-    return True
+    return vote_results.is_standard(results)
@@ -0,0 +1,110 @@
+"""Cached resolution of script UTxOs and their decoded oracle datums
+
+Every oracle answering a proposal submits against the same `tx_hash#index`,
+so the Blockfrost lookup and the datum decoding are done once and shared
+until the entry expires or the UTxO is spent. Lookups still missing the
+cache are coalesced: concurrent ones for the same input share one call.
+"""
+
+from __future__ import annotations
+from typing import Optional
+from dataclasses import dataclass
+from blockfrost import BlockFrostApi
+
+import pycardano as pyc
+import asyncio
+import os
+
+from lib import cardano, clients, indexer, oracle_datum
+from lib.cache import SingleFlight, TTLCache
+
+
+@dataclass(frozen=True)
+class ResolvedInput:
+    utxo: pyc.UTxO
+    datum: Optional[oracle_datum.OracleDatum]  # None without an oracle datum
+
+
+cache = TTLCache(
+    maxsize=int(os.environ.get("UTXO_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("UTXO_CACHE_TTL", 60)),
+)
+
+# Oracles submit for a new proposal all at once, cache misses for the same
+# input are fetched once for all of them
+lookups = SingleFlight()
+
+
+def tx_input(transaction_hash: str, index: int) -> pyc.TransactionInput:
+    return pyc.TransactionInput.from_primitive([transaction_hash, index])
+
+
+def _cached(key: pyc.TransactionInput) -> Optional[ResolvedInput]:
+    indexed = indexer.store.get(key)
+    if indexed is not None:
+        return ResolvedInput(indexed.utxo, indexed.datum)
+
+    return cache.get(key)
+
+
+def _decoded(key: pyc.TransactionInput, utxo: pyc.UTxO) -> ResolvedInput:
+    datum = None
+    if isinstance(utxo.output.datum, pyc.RawCBOR):
+        try:
+            datum = oracle_datum.decode(utxo.output.datum.cbor)
+        except ValueError:
+            pass
+
+    resolved = ResolvedInput(utxo, datum)
+    cache.set(key, resolved)
+
+    return resolved
+
+
+def resolve(api: BlockFrostApi, transaction_hash: str, index: int) -> ResolvedInput:
+    key = tx_input(transaction_hash, index)
+
+    resolved = _cached(key)
+    if resolved is not None:
+        return resolved
+
+    return lookups.do(
+        key, lambda: _decoded(key, cardano.utxo_from_input(api, transaction_hash, index))
+    )
+
+
+async def resolve_async(
+    api: clients.AsyncBlockFrostApi, transaction_hash: str, index: int
+) -> ResolvedInput:
+    """`resolve` for the async serving mode, awaiting the Blockfrost lookup"""
+
+    key = tx_input(transaction_hash, index)
+
+    resolved = _cached(key)
+    if resolved is not None:
+        return resolved
+
+    async def fetch() -> ResolvedInput:
+        result = (await api.transaction_utxos(transaction_hash)).outputs[index]
+
+        script = None
+        if getattr(result, "reference_script_hash", None):
+            # Rare and cached once fetched, not worth an async client of its own
+            script = await asyncio.to_thread(
+                cardano.get_script, clients.get_blockfrost(), result.reference_script_hash
+            )
+
+        return _decoded(key, cardano.utxo_from_output(transaction_hash, index, result, script))
+
+    return await lookups.do_async(key, fetch)
+
+
+def invalidate(tx_in: pyc.TransactionInput) -> bool:
+    return cache.invalidate(tx_in)
+
+
+def invalidate_spent(transaction: pyc.Transaction):
+    """Drop every input spent by `transaction` from the cache"""
+
+    for tx_in in transaction.transaction_body.inputs:
+        cache.invalidate(tx_in)
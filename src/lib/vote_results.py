@@ -0,0 +1,143 @@
+"""Columnar vote results
+
+Escrow executions carry the votes of every question as `<count>:<weight>`
+pairs, `"1:10,2:20|3:30"`. `VoteResults` keeps them in flat integer arrays,
+counts and weights per choice plus the offset where each question starts,
+instead of nested lists of tuples.
+
+Parsing checks the layout with one precompiled pattern and converts every
+number in a single `map(int, ...)` pass. Questions are exposed as
+memoryview slices of the arrays, and the escrow redeemer is encoded straight
+from them, byte-identical to `data_types.escrow_redeemer`.
+"""
+
+from __future__ import annotations
+from typing import Iterator, List, Tuple
+from itertools import accumulate
+from array import array
+
+import pycardano as pyc
+import re
+
+from lib.oracle_datum import encode_int
+
+
+# Pairs separated by "," and questions by "|", the numbers themselves are
+# validated by `int()` when converting them
+_PAIRS = re.compile(r"[^:,|]+:[^:,|]+(?:[,|][^:,|]+:[^:,|]+)*")
+
+# Escrow execution redeemer, constructor 1
+_EXECUTION_TAG = b"\xd8\x7a"
+
+
+def is_standard(results: str) -> bool:
+    """Whether oracle results follow `<weight>,<weight>,...|<weight>,...`"""
+
+    try:
+        # Consumed in C, stops at the first invalid number
+        for _ in map(int, results.replace("|", ",").split(",")):
+            pass
+    except ValueError:
+        return False
+
+    return True
+
+
+class VoteResults:
+    __slots__ = ("counts", "weights", "offsets")
+
+    def __init__(self, counts: array, weights: array, offsets: array):
+        self.counts = counts
+        self.weights = weights
+        # offsets[i]:offsets[i + 1] are the choices of question i
+        self.offsets = offsets
+
+    @classmethod
+    def parse(cls, results: str) -> VoteResults:
+        if _PAIRS.fullmatch(results) is None:
+            raise ValueError(f"Invalid vote results {results!r}")
+
+        offsets = array(
+            "q",
+            accumulate([votes.count(",") + 1 for votes in results.split("|")], initial=0),
+        )
+
+        try:
+            # Materializing the list first is faster than feeding array a map
+            numbers = array(
+                "q",
+                list(map(int, results.replace("|", ",").replace(":", ",").split(","))),
+            )
+        except (ValueError, OverflowError):
+            raise ValueError(f"Invalid vote results {results!r}")
+
+        return cls(numbers[0::2], numbers[1::2], offsets)
+
+    @classmethod
+    def from_lists(cls, results: List[List[Tuple[int, int]]]) -> VoteResults:
+        offsets = array("q", [0])
+        counts, weights = array("q"), array("q")
+
+        for votes in results:
+            for count, weight in votes:
+                counts.append(count)
+                weights.append(weight)
+
+            offsets.append(len(counts))
+
+        return cls(counts, weights, offsets)
+
+    @property
+    def choices(self) -> int:
+        return len(self.counts)
+
+    def question(self, index: int) -> Tuple[memoryview, memoryview]:
+        """Counts and weights of a question, without copying them"""
+
+        start, end = self.offsets[index], self.offsets[index + 1]
+
+        return memoryview(self.counts)[start:end], memoryview(self.weights)[start:end]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __iter__(self) -> Iterator[Tuple[memoryview, memoryview]]:
+        for index in range(len(self)):
+            yield self.question(index)
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, VoteResults)
+            and self.counts == other.counts
+            and self.weights == other.weights
+            and self.offsets == other.offsets
+        )
+
+    def to_lists(self) -> List[List[Tuple[int, int]]]:
+        return [list(zip(counts, weights)) for counts, weights in self]
+
+    def redeemer_cbor(self, oracle_index: int = 0) -> bytes:
+        """`data_types.escrow_redeemer(EscrowExecution, ...)` encoded"""
+
+        parts = [_EXECUTION_TAG, b"\x9f", encode_int(oracle_index), b"\x9f"]
+
+        counts, weights, offsets = self.counts, self.weights, self.offsets
+        for index in range(len(self)):
+            parts.append(b"\x9f")
+            parts.extend(
+                b"\x9f" + encode_int(counts[choice]) + encode_int(weights[choice]) + b"\xff"
+                for choice in range(offsets[index], offsets[index + 1])
+            )
+            parts.append(b"\xff")
+
+        parts.append(b"\xff\xff")
+
+        return b"".join(parts)
+
+    def redeemer(self, oracle_index: int = 0) -> pyc.RawCBOR:
+        """Escrow execution redeemer data, ready for `pyc.Redeemer`"""
+
+        return pyc.RawCBOR(self.redeemer_cbor(oracle_index))
+
+    def __repr__(self) -> str:
+        return f"VoteResults(questions={len(self)}, choices={self.choices})"
@@ -0,0 +1,287 @@
+"""Transaction pipeline of a wallet, with UTxO locking and chained change
+
+Builders take the wallet's UTxOs as plain lists, so two builds running at
+the same time from the same key select the same inputs and the second one
+is rejected at submission. `Wallet.submit` hands every build the UTxOs no
+pending transaction spends, plus the outputs of pending transactions, so
+new transactions chain off unconfirmed change instead of waiting for it to
+land. The node accepts such chains in its mempool.
+
+The inputs of a submitted transaction stay locked until it is confirmed,
+that is until one of its outputs shows up in the chain context or, when it
+spends nothing unconfirmed, its inputs are gone. A transaction that isn't
+confirmed within `confirm_timeout` seconds, or whose submission fails, is
+rolled back with every transaction chained off it: their locks are released
+and their outputs forgotten.
+
+The builders spending the wallet's funds (`create_data_request`,
+`create_data_requests_batch` and `create_escrow`) have wrappers going
+through the pipeline.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+from dataclasses import dataclass
+
+import pycardano as pyc
+import threading
+import logging
+import time
+
+from lib import cardano, scripts
+
+
+class Conflict(Exception):
+    pass
+
+
+@dataclass
+class Pending:
+    inputs: List[pyc.TransactionInput]
+    outputs: List[pyc.UTxO]
+    # Pending transactions whose outputs it spends
+    parents: Set[pyc.TransactionId]
+    submitted_at: float
+
+
+class Wallet:
+    def __init__(
+        self,
+        chain_context: pyc.ChainContext,
+        signing_key: pyc.PaymentSigningKey,
+        reserved: Optional[Callable[[pyc.TransactionOutput], bool]] = None,
+        confirm_timeout: float = 600.0,
+        max_conflicts: int = 3,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.chain_context = chain_context
+        self.signing_key = signing_key
+        self.reserved = reserved
+        self.confirm_timeout = confirm_timeout
+        self.max_conflicts = max_conflicts
+        self.timer = timer
+
+        self.address = pyc.Address(
+            payment_part=pyc.VerificationKey.from_signing_key(signing_key).hash(),
+            network=chain_context.network,
+        )
+
+        # Insertion ordered, parents always come before their children
+        self._pending: Dict[pyc.TransactionId, Pending] = {}
+        self._locked: Dict[pyc.TransactionInput, pyc.TransactionId] = {}
+        self._unconfirmed: Dict[pyc.TransactionInput, Tuple[pyc.UTxO, pyc.TransactionId]] = {}
+        self._lock = threading.Lock()
+
+        self.submitted = 0
+        self.confirmed = 0
+        self.rolled_back = 0
+        self.conflicts = 0
+
+    def _confirm(self, transaction_id: pyc.TransactionId):
+        pending = self._pending.pop(transaction_id)
+
+        for tx_in in pending.inputs:
+            self._locked.pop(tx_in, None)
+
+        for utxo in pending.outputs:
+            self._unconfirmed.pop(utxo.input, None)
+
+        for other in self._pending.values():
+            other.parents.discard(transaction_id)
+
+        self.confirmed += 1
+
+    def _roll_back(self, transaction_id: pyc.TransactionId):
+        pending = self._pending.pop(transaction_id, None)
+        if pending is None:
+            return
+
+        for tx_in in pending.inputs:
+            self._locked.pop(tx_in, None)
+
+        for utxo in pending.outputs:
+            self._unconfirmed.pop(utxo.input, None)
+
+        self.rolled_back += 1
+        logging.warning(f"Rolled back transaction {transaction_id}")
+
+        children = [
+            child_id
+            for child_id, child in self._pending.items()
+            if transaction_id in child.parents
+        ]
+        for child_id in children:
+            self._roll_back(child_id)
+
+    def _refresh(self) -> List[pyc.UTxO]:
+        utxos = list(self.chain_context.utxos(str(self.address)))
+        present = {utxo.input for utxo in utxos}
+        now = self.timer()
+
+        for transaction_id in list(self._pending):
+            pending = self._pending.get(transaction_id)
+            if pending is None:
+                continue
+
+            landed = any(utxo.input in present for utxo in pending.outputs)
+            spent = not pending.parents and not any(
+                tx_in in present for tx_in in pending.inputs
+            )
+
+            if landed or spent:
+                self._confirm(transaction_id)
+            elif now - pending.submitted_at > self.confirm_timeout:
+                self._roll_back(transaction_id)
+
+        return utxos
+
+    def available(self) -> List[pyc.UTxO]:
+        """UTxOs free to spend, unconfirmed change included"""
+
+        with self._lock:
+            utxos = self._refresh()
+            utxos.extend(utxo for utxo, _ in self._unconfirmed.values())
+
+            return [
+                utxo
+                for utxo in utxos
+                if utxo.input not in self._locked
+                and (self.reserved is None or not self.reserved(utxo.output))
+            ]
+
+    def submit(self, build: Callable[[List[pyc.UTxO]], pyc.Transaction]) -> pyc.Transaction:
+        """Build a transaction from the available UTxOs, sign and submit it
+
+        Builds racing for the same UTxOs are retried with what is left, up
+        to `max_conflicts` times before raising Conflict.
+        """
+
+        return self.submit_many(lambda utxos: [build(utxos)])[0]
+
+    def submit_many(
+        self, build: Callable[[List[pyc.UTxO]], List[pyc.Transaction]]
+    ) -> List[pyc.Transaction]:
+        """`submit` for builds of several transactions, each one possibly
+        spending the change of the previous ones, submitted in order"""
+
+        for _ in range(self.max_conflicts + 1):
+            utxos = self.available()
+            signed_txs = [
+                cardano.assemble_transaction(transaction, self.signing_key)
+                for transaction in build(utxos)
+            ]
+
+            with self._lock:
+                ours = {utxo.input for utxo in utxos}
+
+                if any(
+                    tx_in in self._locked
+                    for signed_tx in signed_txs
+                    for tx_in in signed_tx.transaction_body.inputs
+                ):
+                    self.conflicts += 1
+                    continue
+
+                for signed_tx in signed_txs:
+                    body = signed_tx.transaction_body
+                    inputs = [
+                        tx_in
+                        for tx_in in body.inputs
+                        if tx_in in ours or tx_in in self._unconfirmed
+                    ]
+
+                    outputs = [
+                        pyc.UTxO(pyc.TransactionInput(body.id, index), output)
+                        for index, output in enumerate(body.outputs)
+                        if output.address == self.address
+                    ]
+                    parents = {
+                        self._unconfirmed[tx_in][1]
+                        for tx_in in inputs
+                        if tx_in in self._unconfirmed
+                    }
+
+                    self._pending[body.id] = Pending(inputs, outputs, parents, self.timer())
+                    for tx_in in inputs:
+                        self._locked[tx_in] = body.id
+                    for utxo in outputs:
+                        self._unconfirmed[utxo.input] = (utxo, body.id)
+
+            for signed_tx in signed_txs:
+                try:
+                    self.chain_context.submit_tx(signed_tx.to_cbor())
+                except Exception:
+                    # Along with the ones chained off it
+                    with self._lock:
+                        self._roll_back(signed_tx.transaction_body.id)
+
+                    raise
+
+                with self._lock:
+                    self.submitted += 1
+
+            return signed_txs
+
+        raise Conflict(f"Builds at {self.address} keep selecting locked UTxOs")
+
+    def create_data_request(
+        self,
+        script: Union[str, scripts.Script],
+        script_amount: pyc.Value,
+        script_datum: pyc.Datum,
+        strategy: str = None,
+    ) -> pyc.Transaction:
+        return self.submit(
+            lambda utxos: cardano.create_data_request(
+                self.chain_context,
+                utxos,
+                self.address,
+                script,
+                script_amount,
+                script_datum,
+                strategy,
+            )
+        )
+
+    def create_data_requests_batch(
+        self,
+        script: Union[str, scripts.Script],
+        requests: List[Tuple[pyc.Datum, Union[int, pyc.Value]]],
+        strategy: str = None,
+    ) -> List[pyc.Transaction]:
+        return self.submit_many(
+            lambda utxos: cardano.create_data_requests_batch(
+                self.chain_context, utxos, self.address, script, requests, strategy
+            )
+        )
+
+    def create_escrow(
+        self,
+        script: Union[str, scripts.Script],
+        script_amount: pyc.Value,
+        script_datum: pyc.Datum,
+        strategy: str = None,
+    ) -> pyc.Transaction:
+        return self.submit(
+            lambda utxos: cardano.create_escrow(
+                self.chain_context,
+                utxos,
+                self.address,
+                script,
+                script_amount,
+                script_datum,
+                strategy,
+            )
+        )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "locked": len(self._locked),
+                "unconfirmed": len(self._unconfirmed),
+                "submitted": self.submitted,
+                "confirmed": self.confirmed,
+                "rolled_back": self.rolled_back,
+                "conflicts": self.conflicts,
+            }
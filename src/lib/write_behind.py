@@ -0,0 +1,290 @@
+"""Write-behind buffer for oracle signatures
+
+Storing every submission on its own costs one database transaction, and one
+fsync, per signature. `WriteBehind` queues verified submissions in memory
+and a background thread writes them in bulk, as soon as `batch_size` of them
+are pending or the oldest one has waited `flush_interval` seconds.
+
+How long a submission waits is set by the durability mode:
+
+- `group`: the request returns once the batch holding it is committed, so
+  an acknowledged signature is stored, but concurrent submissions share
+  their transaction.
+- `buffered`: the request returns as soon as the submission is queued.
+  Whatever is still queued is lost if the process dies without draining.
+
+A batch that keeps failing is written again in halves, so only the entries
+that can't be stored are dropped.
+
+The queue is bounded: when `max_pending` entries are waiting, `put` blocks
+up to `put_timeout` seconds and then raises `QueueFull`. `stop` drains it.
+"""
+
+from __future__ import annotations
+from typing import Any, Callable, Deque, Dict, List, Optional
+from collections import deque
+
+import threading
+import logging
+import time
+
+
+GROUP = "group"
+BUFFERED = "buffered"
+
+DURABILITY_MODES = (GROUP, BUFFERED)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class _Entry:
+    __slots__ = ("items", "queued_at", "done", "error")
+
+    def __init__(self, items: List[Any], queued_at: float, wait: bool):
+        self.items = items
+        self.queued_at = queued_at
+        self.done = threading.Event() if wait else None
+        self.error: Optional[BaseException] = None
+
+
+class WriteBehind:
+    def __init__(
+        self,
+        write: Callable[[List[Any]], None],
+        durability: str = BUFFERED,
+        max_pending: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        put_timeout: float = 1.0,
+        max_attempts: int = 3,
+        retry_delay: float = 0.5,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability {durability}")
+
+        self.write = write
+        self.durability = durability
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.timer = timer
+
+        self.written = 0
+        self.batches = 0
+        self.rejected = 0
+        self.failed = 0
+
+        self._entries: Deque[_Entry] = deque()
+        # Queued items, and those plus the ones being written
+        self._queued = 0
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    def put(self, items: List[Any]):
+        """Queue `items`, waiting for their write in `group` durability
+
+        Raises QueueFull when there's still no room after `put_timeout`.
+        """
+
+        entry = _Entry(items, self.timer(), self.durability == GROUP)
+
+        with self._cond:
+            deadline = time.monotonic() + self.put_timeout
+
+            # Anything fits in an empty queue, even more than `max_pending`
+            while self._pending and self._pending + len(items) > self.max_pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.rejected += len(items)
+                    raise QueueFull(f"{self._pending} entries waiting to be written")
+
+                self._cond.wait(remaining)
+
+            self._entries.append(entry)
+            self._queued += len(items)
+            self._pending += len(items)
+
+            self._cond.notify_all()
+
+        if self._thread is None:
+            # Not running (e.g. already stopped), don't leave it queued
+            self.flush()
+
+        if entry.done is not None:
+            entry.done.wait()
+
+            if entry.error is not None:
+                raise entry.error
+
+    def _take(self) -> List[_Entry]:
+        entries = []
+        count = 0
+
+        with self._cond:
+            while self._entries and (not entries or count < self.batch_size):
+                entry = self._entries.popleft()
+                entries.append(entry)
+                count += len(entry.items)
+
+            self._queued -= count
+
+        return entries
+
+    def _write_apart(self, items: List[Any], start: int = 0) -> Dict[int, Exception]:
+        """Write the halves of a failed batch separately, down to single
+        entries, returns the positions of those still failing with their error"""
+
+        errors = {}
+        middle = len(items) // 2
+
+        for offset, half in ((start, items[:middle]), (start + middle, items[middle:])):
+            try:
+                self.write(half)
+            except Exception as e:
+                if len(half) == 1:
+                    errors[offset] = e
+                else:
+                    errors.update(self._write_apart(half, offset))
+
+        return errors
+
+    def _write(self, entries: List[_Entry]):
+        items = [item for entry in entries for item in entry.items]
+
+        error = None
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.write(items)
+                error = None
+                break
+            except Exception as e:
+                error = e
+
+                if attempt < self.max_attempts:
+                    logging.warning(f"Writing {len(items)} entries failed, retrying")
+                    time.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+        # A single bad entry shouldn't take the rest of its batch down
+        errors: Dict[int, Exception] = {}
+        if error is not None:
+            if len(items) > 1:
+                logging.warning(f"Writing {len(items)} entries failed, writing them apart")
+                errors = self._write_apart(items)
+            else:
+                errors = {0: error}
+
+        if errors:
+            logging.error(
+                f"Dropping {len(errors)} entries", exc_info=next(iter(errors.values()))
+            )
+
+        with self._cond:
+            self._pending -= len(items)
+            self.batches += 1
+
+            self.written += len(items) - len(errors)
+            self.failed += len(errors)
+
+            # Room for blocked producers
+            self._cond.notify_all()
+
+        start = 0
+        for entry in entries:
+            end = start + len(entry.items)
+
+            if entry.done is not None:
+                entry.error = next(
+                    (errors[i] for i in range(start, end) if i in errors), None
+                )
+                entry.done.set()
+
+            start = end
+
+    def flush(self) -> int:
+        """Write everything queued so far, returns how many entries"""
+
+        written = 0
+        with self._flush_lock:
+            while True:
+                entries = self._take()
+                if not entries:
+                    return written
+
+                self._write(entries)
+                written += sum(len(entry.items) for entry in entries)
+
+    def _due(self) -> Optional[float]:
+        """Seconds until the next batch is due, 0 if it is, None if idle"""
+
+        if not self._entries:
+            return None
+        if self._queued >= self.batch_size:
+            return 0
+
+        return max(0, self._entries[0].queued_at + self.flush_interval - self.timer())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    timeout = self._due()
+                    if timeout == 0:
+                        break
+
+                    self._cond.wait(timeout)
+
+                if self._stopping:
+                    return
+
+            with self._flush_lock:
+                entries = self._take()
+                if entries:
+                    self._write(entries)
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="write-behind", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """Stop the background thread and drain what is left"""
+
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+            thread, self._thread = self._thread, None
+
+        if thread is not None:
+            thread.join(timeout)
+
+        self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "pending": self._pending,
+                "written": self.written,
+                "batches": self.batches,
+                "rejected": self.rejected,
+                "failed": self.failed,
+            }
+
+
+# Set by app.py when SIGNATURE_DURABILITY selects a write-behind mode
+signatures: Optional[WriteBehind] = None
@@ -0,0 +1,64 @@
+"""index and deduplicate signatures
+
+Revision ID: 3f1c2a9b7d10
+Revises: 
+Create Date: 2026-10-17 10:12:41.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c2a9b7d10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # Deployments so far created the table through db.create_all()
+    if not sa.inspect(bind).has_table('signature'):
+        op.create_table(
+            'signature',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('proposal_id', sa.String(), nullable=False),
+            sa.Column('pubkey', sa.String(), nullable=False),
+            sa.Column('signature', sa.String(), nullable=False),
+            sa.Column('results', sa.String(), nullable=False),
+            sa.Column('script_input', sa.String(), nullable=False),
+            sa.Column('creation_date', sa.DateTime(timezone=False),
+                      server_default=sa.func.now(), nullable=False),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    # Keep only the latest submission of every oracle for a script input,
+    # keys were stored as sent, in any case
+    op.execute(
+        "DELETE FROM signature WHERE id NOT IN ("
+        "SELECT MAX(id) FROM signature "
+        "GROUP BY LOWER(script_input), LOWER(pubkey))"
+    )
+    op.execute("UPDATE signature SET pubkey = LOWER(pubkey), "
+               "script_input = LOWER(script_input)")
+
+    # db.create_all(), run as app.py is imported, may have created them
+    existing = {index['name']
+                for index in sa.inspect(bind).get_indexes('signature')}
+
+    indexes = [
+        ('uq_signature_script_input_pubkey', ['script_input', 'pubkey'], True),
+        ('ix_signature_script_input_results', ['script_input', 'results'], False),
+        ('ix_signature_proposal_id', ['proposal_id'], False),
+    ]
+    for name, columns, unique in indexes:
+        if name not in existing:
+            op.create_index(name, 'signature', columns, unique=unique)
+
+
+def downgrade():
+    op.drop_index('ix_signature_proposal_id', table_name='signature')
+    op.drop_index('ix_signature_script_input_results', table_name='signature')
+    op.drop_index('uq_signature_script_input_pubkey', table_name='signature')
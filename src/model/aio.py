@@ -0,0 +1,65 @@
+"""Async database sessions for the async serving mode
+
+Flask-SQLAlchemy's `db.session` is bound to the Flask app context and blocks
+on every query. The async handlers (see `api/oracles_async.py`) go through
+an `AsyncSession` on an engine of their own instead, same database, with the
+async counterpart of the configured driver (asyncpg for PostgreSQL,
+aiosqlite for SQLite).
+"""
+
+from typing import List, Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from .signature import Signature
+
+
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+engine: Optional[AsyncEngine] = None
+session = None
+
+
+def async_url(url: str) -> str:
+    """`url` with its driver swapped for the async one of its dialect"""
+
+    url = make_url(url)
+
+    dialect = url.get_backend_name()
+    if dialect not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver known for {dialect}")
+
+    return str(url.set(drivername=f"{dialect}+{ASYNC_DRIVERS[dialect]}"))
+
+
+def init(url: str, **engine_options):
+    global engine, session
+
+    engine = create_async_engine(async_url(url), **engine_options)
+    session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def dispose():
+    global engine, session
+
+    if engine is not None:
+        await engine.dispose()
+
+    engine = session = None
+
+
+async def upsert_signatures(rows: List[dict]):
+    """`Signature.upsert` and commit, in a session of its own"""
+
+    statement = Signature.upsert_statement(rows, engine.dialect.name)
+    if statement is None:
+        return
+
+    async with session() as s:
+        await s.execute(statement)
+        await s.commit()
@@ -0,0 +1,160 @@
+"""Connection pools of the signature store, and routing of reads to a replica
+
+Pool parameters come from the environment (`DB_POOL_SIZE`, `DB_MAX_OVERFLOW`,
+`DB_POOL_TIMEOUT`, `DB_POOL_RECYCLE`, `DB_POOL_PRE_PING`). With
+`DB_REPLICA_CONN` set, read-only queries (see `read_session`) go to a replica
+through a pool of their own, so they no longer wait behind submission writes.
+
+Both pools time every checkout, including the wait for a free connection
+when the pool is exhausted, and `stats` reports it per pool. SQLite keeps
+the pools Flask-SQLAlchemy picks for it and isn't instrumented.
+"""
+
+from __future__ import annotations
+from typing import Callable, Dict, Mapping, Optional
+from contextlib import contextmanager
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+import threading
+import time
+
+from . import db
+
+
+def _flag(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+POOL_SETTINGS: Dict[str, tuple] = {
+    "DB_POOL_SIZE": ("pool_size", int),
+    "DB_MAX_OVERFLOW": ("max_overflow", int),
+    "DB_POOL_TIMEOUT": ("pool_timeout", float),
+    "DB_POOL_RECYCLE": ("pool_recycle", int),
+    "DB_POOL_PRE_PING": ("pool_pre_ping", _flag),
+}
+
+
+class PoolStats:
+    def __init__(self, timer: Callable[[], float] = time.perf_counter):
+        self.timer = timer
+        self.pool: Optional[QueuePool] = None
+
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+        self._lock = threading.Lock()
+
+    def observe(self, wait: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = {
+                "checkouts": self.checkouts,
+                "wait_seconds": self.wait_total,
+                "max_wait_seconds": self.wait_max,
+            }
+
+        if self.pool is not None:
+            stats["size"] = self.pool.size()
+            stats["checked_out"] = self.pool.checkedout()
+            stats["overflow"] = self.pool.overflow()
+
+        return stats
+
+
+def timed_pool(stats: PoolStats) -> type:
+    """QueuePool class reporting every checkout to `stats`
+
+    A class rather than an instance hook, so the pools an engine recreates
+    (e.g. after `dispose`) keep reporting.
+    """
+
+    class TimedQueuePool(QueuePool):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+
+            stats.pool = self
+
+        def connect(self):
+            start = stats.timer()
+            try:
+                return super().connect()
+            finally:
+                stats.observe(stats.timer() - start)
+
+    return TimedQueuePool
+
+
+pools: Dict[str, PoolStats] = {}
+
+_replica: Optional[sessionmaker] = None
+
+
+def _pooled(url: Optional[str]) -> bool:
+    return bool(url) and make_url(url).get_backend_name() != "sqlite"
+
+
+def pool_settings(url: str, environ: Mapping[str, str]) -> dict:
+    """Pool options set in `environ`, none for SQLite"""
+
+    if not _pooled(url):
+        return {}
+
+    return {
+        option: parse(environ[variable])
+        for variable, (option, parse) in POOL_SETTINGS.items()
+        if environ.get(variable)
+    }
+
+
+def engine_options(url: str, name: str, environ: Mapping[str, str]) -> dict:
+    """Engine options for `url`, with its checkouts reported as pool `name`"""
+
+    if not _pooled(url):
+        return {}
+
+    pools[name] = PoolStats()
+
+    return {**pool_settings(url, environ), "poolclass": timed_pool(pools[name])}
+
+
+def init_replica(url: Optional[str], environ: Mapping[str, str]):
+    global _replica
+
+    if not url:
+        _replica = None
+        return
+
+    engine = create_engine(url, **engine_options(url, "replica", environ))
+    _replica = sessionmaker(bind=engine)
+
+
+@contextmanager
+def read_session() -> Session:
+    """Session for read-only queries, on the replica when there is one
+
+    Replicas lag behind, callers needing their own writes use `db.session`.
+    """
+
+    if _replica is None:
+        yield db.session
+        return
+
+    session = _replica()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    return {name: pool.stats() for name, pool in pools.items()}
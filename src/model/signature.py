@@ -1,10 +1,40 @@
+from typing import List
+
 from . import db
 
 from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+
+
+# Dialects with an INSERT ... ON CONFLICT, which `Signature.upsert` relies on
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def check_dialect(url: str):
+    """Raise ValueError when signatures can't be upserted in the database at
+    `url`, should be called at startup"""
+
+    dialect = make_url(url).get_backend_name()
+    if dialect not in UPSERT_INSERTS:
+        raise ValueError(
+            f"Unsupported database {dialect}, use one of {', '.join(UPSERT_INSERTS)}"
+        )
 
 
 class Signature(db.Model):
     __tablename__ = "signature"
+    __table_args__ = (
+        # An oracle signs a given script input only once, resubmissions
+        # replace the previous signature (see `upsert`)
+        db.Index("uq_signature_script_input_pubkey", "script_input", "pubkey", unique=True),
+        # Quorum lookups: signatures for a script input agreeing on results
+        db.Index("ix_signature_script_input_results", "script_input", "results"),
+        db.Index("ix_signature_proposal_id", "proposal_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
 
@@ -18,3 +48,36 @@ class Signature(db.Model):
     creation_date = db.Column(
         db.DateTime(timezone=False), server_default=func.now(), nullable=False
     )
+
+    @classmethod
+    def upsert_statement(cls, rows: List[dict], dialect: str):
+        """INSERT ... ON CONFLICT (script_input, pubkey) DO UPDATE for `rows`,
+        None if there's nothing to insert"""
+
+        # A single statement can't touch the same row twice, the last
+        # submission of an oracle wins
+        unique_rows = list(
+            {(row["script_input"], row["pubkey"]): row for row in rows}.values()
+        )
+        if not unique_rows:
+            return None
+
+        # Other dialects are rejected at startup by `check_dialect`
+        statement = UPSERT_INSERTS[dialect](cls.__table__).values(unique_rows)
+        return statement.on_conflict_do_update(
+            index_elements=["script_input", "pubkey"],
+            set_={
+                "proposal_id": statement.excluded.proposal_id,
+                "signature": statement.excluded.signature,
+                "results": statement.excluded.results,
+                "creation_date": func.now(),
+            },
+        )
+
+    @classmethod
+    def upsert(cls, rows: List[dict]):
+        """Upsert `rows` in the current session, must be committed by the caller"""
+
+        statement = cls.upsert_statement(rows, db.engine.dialect.name)
+        if statement is not None:
+            db.session.execute(statement)
@@ -1,6 +1,8 @@
 """A CLI utility to build oracle transactions in the preprod network"""
 
-from lib import cardano, data_types
+from lib import cardano, collateral, data_types, scripts
+from lib.vote_results import VoteResults
+from lib.wallet import Wallet
 from dotenv import load_dotenv
 from blockfrost import BlockFrostApi
 
@@ -56,6 +58,8 @@ def main():
         print("Creator provided has no UTxOs in his address")
         exit(1)
 
+    wallet = Wallet(chain_context, skey)
+
     if parser_args[0].transaction_type == "oracle_request":
         sub_parser = argparse.ArgumentParser(parents=[parser])
 
@@ -86,43 +90,29 @@ def main():
             bytes(args.results, "utf-8") if args.results else None
         )
 
-        with open("./scripts/oracle.plutus", "r") as f:
-            script_hex = f.read()
-
-            script_value = (
-                pyc.Value.from_primitive(
-                    [
-                        10_000_000,
-                        {
-                            args.nft.split(".")[0]: {
-                                bytes.fromhex(args.nft.split(".")[1]): 1
-                            }
-                        },
-                    ]
-                )
-                if args.nft
-                else 10_000_000
-            )
-
-            transaction = cardano.create_data_request(
-                chain_context,
-                utxos,
-                address,
-                script_hex,
-                script_value,
-                datum,
+        script = scripts.oracle()
+
+        script_value = (
+            pyc.Value.from_primitive(
+                [
+                    10_000_000,
+                    {
+                        args.nft.split(".")[0]: {
+                            bytes.fromhex(args.nft.split(".")[1]): 1
+                        }
+                    },
+                ]
             )
+            if args.nft
+            else 10_000_000
+        )
 
-            print("======== Transaction =========")
-            print(transaction)
-            print("==============================")
-
-            signed_tx = cardano.assemble_transaction(transaction, skey)
-
-            chain_context.submit_tx(signed_tx.to_cbor())
+        signed_tx = wallet.create_data_request(script, script_value, datum)
 
-            print("==============================")
-            print(f"Transaction {signed_tx.transaction_body.id} submitted successfully")
+        print("======== Transaction =========")
+        print(signed_tx)
+        print("==============================")
+        print(f"Transaction {signed_tx.transaction_body.id} submitted successfully")
     elif parser_args[0].transaction_type == "oracle_respond":
         sub_parser = argparse.ArgumentParser(parents=[parser])
         sub_parser.add_argument("-i", "--input", required=True)
@@ -134,36 +124,35 @@ def main():
         tx_hash, index = args.input.split("#")
         input_utxo = cardano.utxo_from_input(api, tx_hash, int(index))
 
-        with open("./scripts/oracle.plutus", "r") as f:
-            script_hex = f.read()
+        script = scripts.oracle()
 
-            datum = data_types.datum_from_cbor(input_utxo.output.datum.cbor)
+        datum = data_types.datum_from_cbor(input_utxo.output.datum.cbor)
 
-            plutus_credential = datum.items[6]
+        plutus_credential = datum.items[6]
 
-            payment_address = pyc.Address(
-                payment_part=pyc.VerificationKeyHash.from_primitive(
-                    plutus_credential.payment_part
-                ),
-                network=pyc.Network.TESTNET,
-            )
+        payment_address = pyc.Address(
+            payment_part=pyc.VerificationKeyHash.from_primitive(
+                plutus_credential.payment_part
+            ),
+            network=pyc.Network.TESTNET,
+        )
 
-            transaction = cardano.submit_oracles_data(
-                chain_context,
-                utxos[0],
-                input_utxo,
-                script_hex,
-                datum,
-                payment_address,
-                bytes(args.results, "utf-8"),
-                [bytes.fromhex(sig) for sig in args.signatures],
-            )
+        transaction = cardano.submit_oracles_data(
+            chain_context,
+            collateral.find(chain_context, address),
+            input_utxo,
+            script,
+            datum,
+            payment_address,
+            bytes(args.results, "utf-8"),
+            [bytes.fromhex(sig) for sig in args.signatures],
+        )
 
-            signed_tx = cardano.assemble_transaction(transaction, skey)
+        signed_tx = cardano.assemble_transaction(transaction, skey)
 
-            chain_context.submit_tx(signed_tx.to_cbor())
+        chain_context.submit_tx(signed_tx.to_cbor())
 
-            print(f"Transaction {signed_tx.transaction_body.id} submitted successfully")
+        print(f"Transaction {signed_tx.transaction_body.id} submitted successfully")
     elif parser_args[0].transaction_type == "escrow_create":
         sub_parser = argparse.ArgumentParser(parents=[parser])
 
@@ -188,71 +177,45 @@ def main():
             [pyc.Address.from_primitive(addr) for addr in args.addresses],
         )
 
-        with open("./scripts/escrow.plutus", "r") as f:
-            script_hex = f.read()
-
-            transaction = cardano.create_escrow(
-                chain_context,
-                utxos,
-                address,
-                script_hex,
-                10_000_000,
-                datum,
-            )
-
-            print("======== Transaction =========")
-            print(transaction)
-            print("==============================")
-
-            signed_tx = cardano.assemble_transaction(transaction, skey)
+        script = scripts.escrow()
 
-            chain_context.submit_tx(signed_tx.to_cbor())
+        signed_tx = wallet.create_escrow(script, 10_000_000, datum)
 
-            print("==============================")
-            print(f"Transaction {signed_tx.transaction_body.id} submitted successfully")
+        print("======== Transaction =========")
+        print(signed_tx)
+        print("==============================")
+        print(f"Transaction {signed_tx.transaction_body.id} submitted successfully")
     elif parser_args[0].transaction_type == "escrow_claim":
         sub_parser = argparse.ArgumentParser(parents=[parser])
-        sub_parser.add_argument("-i", "--input", required=True)
+        sub_parser.add_argument("-i", "--input", nargs="+", required=True)
         sub_parser.add_argument("-o", "--oracle_input", required=True)
         sub_parser.add_argument("-a", "--receiver_address", required=True)
         sub_parser.add_argument("-r", "--results", required=True)
 
         args = sub_parser.parse_args()
 
-        tx_hash, index = args.input.split("#")
-        input_utxo = cardano.utxo_from_input(api, tx_hash, int(index))
+        input_utxos = []
+        for script_input in args.input:
+            tx_hash, index = script_input.split("#")
+            input_utxos.append(cardano.utxo_from_input(api, tx_hash, int(index)))
 
         tx_hash, index = args.oracle_input.split("#")
         oracle_input_utxo = cardano.utxo_from_input(api, tx_hash, int(index))
 
-        with open("./scripts/escrow.plutus", "r") as f:
-            script_hex = f.read()
-
-            # Find collateral
-            collateral = None
-            for utxo in utxos:
-                if isinstance(utxo.output.amount, int):
-                    if utxo.output.amount >= 5_000_000:
-                        collateral = utxo
-                        break
-                else:
-                    if utxo.output.amount >= pyc.Value(5_000_000):
-                        collateral = utxo
-                        break
-
-            if collateral is None:
-                raise Exception("No collateral found")
-
-            transaction = cardano.execute_escrow(
-                chain_context,
-                collateral,
-                input_utxo,
-                script_hex,
-                oracle_input_utxo.input,
-                pyc.Address.from_primitive(args.receiver_address),
-                data_types.parse_vote_results(args.results)
-            )
+        script = scripts.escrow()
+
+        # Many escrows are settled in as few transactions as possible
+        transactions = cardano.execute_escrows_batch(
+            chain_context,
+            collateral.find(chain_context, address),
+            input_utxos,
+            script,
+            oracle_input_utxo.input,
+            pyc.Address.from_primitive(args.receiver_address),
+            VoteResults.parse(args.results)
+        )
 
+        for transaction in transactions:
             signed_tx = cardano.assemble_transaction(transaction, skey)
 
             chain_context.submit_tx(signed_tx.to_cbor())
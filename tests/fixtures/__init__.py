@@ -1 +1,3 @@
-from .api import api
\ No newline at end of file
+from .api import api
+from .utxo import TX_HASH, ORACLE_DATUM, OPEN_ORACLE_DATUM, ORACLES, oracle_utxo
+from .chain_context import FixedChainContext, wallet_utxos
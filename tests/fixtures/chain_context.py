@@ -0,0 +1,107 @@
+from typing import Dict, List
+
+import pycardano as pyc
+
+
+# Preprod protocol parameters (Babbage era)
+PROTOCOL_PARAM = pyc.ProtocolParameters(
+    min_fee_constant=155381,
+    min_fee_coefficient=44,
+    max_block_size=90112,
+    max_tx_size=16384,
+    max_block_header_size=1100,
+    key_deposit=2000000,
+    pool_deposit=500000000,
+    pool_influence=0.3,
+    monetary_expansion=0.003,
+    treasury_expansion=0.2,
+    decentralization_param=0,
+    extra_entropy="",
+    protocol_major_version=8,
+    protocol_minor_version=0,
+    min_utxo=4310,
+    min_pool_cost=340000000,
+    price_mem=0.0577,
+    price_step=0.0000721,
+    max_tx_ex_mem=14000000,
+    max_tx_ex_steps=10000000000,
+    max_block_ex_mem=62000000,
+    max_block_ex_steps=20000000000,
+    max_val_size=5000,
+    collateral_percent=150,
+    max_collateral_inputs=3,
+    coins_per_utxo_word=4310,
+    coins_per_utxo_byte=4310,
+    cost_models={},
+)
+
+GENESIS_PARAM = pyc.GenesisParameters(
+    active_slots_coefficient=0.05,
+    update_quorum=5,
+    max_lovelace_supply=45000000000000000,
+    network_magic=1,
+    epoch_length=432000,
+    system_start=1654041600,
+    slots_per_kes_period=129600,
+    slot_length=1,
+    max_kes_evolutions=62,
+    security_param=2160,
+)
+
+
+class FixedChainContext(pyc.ChainContext):
+    """Offline chain context with fixed parameters and an in-memory UTxO set"""
+
+    def __init__(self, utxos: Dict[str, List[pyc.UTxO]] = None):
+        self._utxos = utxos or {}
+        self.submitted = []
+        self.evaluations = 0
+
+    @property
+    def protocol_param(self) -> pyc.ProtocolParameters:
+        return PROTOCOL_PARAM
+
+    @property
+    def genesis_param(self) -> pyc.GenesisParameters:
+        return GENESIS_PARAM
+
+    @property
+    def network(self) -> pyc.Network:
+        return pyc.Network.TESTNET
+
+    @property
+    def epoch(self) -> int:
+        return 300
+
+    @property
+    def last_block_slot(self) -> int:
+        return 2000
+
+    def utxos(self, address: str) -> List[pyc.UTxO]:
+        return self._utxos.get(str(address), [])
+
+    def submit_tx(self, cbor):
+        self.submitted.append(cbor)
+
+    def evaluate_tx(self, cbor) -> Dict[str, pyc.ExecutionUnits]:
+        self.evaluations += 1
+
+        tx = pyc.Transaction.from_cbor(cbor)
+        return {
+            f"{redeemer.tag.name.lower()}:{redeemer.index}": pyc.ExecutionUnits(
+                1_000_000, 400_000_000
+            )
+            for redeemer in tx.transaction_witness_set.redeemer
+        }
+
+
+def wallet_utxos(
+    address: pyc.Address, amounts: List[int], tx_hash: str = "aa" * 32
+) -> List[pyc.UTxO]:
+    return [
+        pyc.UTxO(
+            pyc.TransactionInput.from_primitive([tx_hash, i]),
+            pyc.TransactionOutput(address, amount),
+        )
+        for i, amount in enumerate(amounts)
+    ]
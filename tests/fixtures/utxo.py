@@ -0,0 +1,42 @@
+import pycardano as pyc
+
+
+TX_HASH = "5e0cba9e817823ce82c32ded0b22f6790f075cd39ae9e0ab9af7ad1cc81edf17"
+
+# Datum for "test_proposal_id" with three oracles, min_signatures = 2 and
+# results = b"test"
+ORACLE_DATUM = b"\x9fPtest_proposal_idX\x1c\x02\xaa~\x9d\x83\xf4:\xd5J\xb2XY\x00)-\xb7(\x0e\xc44\x10\xe7V=\xac\x93M\x17X\x1cl)\xe3\xe7V\xa5\xf7yG\x924\x0b\x94\xb1Bk\xab\x9a\xd6\x1d\x87\x06\x1a\x8c6\x9f \t\x00\x9fX \x14\x88\x9c\xdbKr\xad\x10\xd4\xd4$<OP\x14\x1e\xea\x1d\x10\xa3H,\xd2\n}\xa6$]\x05\xea\x01\xf1X \xf3o\x9af\xf3\x91a'\xe1\xef0>\xefl\xdd\xe2$\xc8=\xa1\xfcF\xc3\xd9H\xd2\xa6\x8a\xf6-\xce\xd8X \xc3\xe9\x91\xc8\x91\x9bN/\xf0<\xf2\xa7\x95\xaf\xe9\x8c\x14\xb3\xd3\xeb\xe2\xe3\x80Y\x8e\x8b\x8bF\xdd\xac(\xc4\xff\x02\xd8y\x9fX\x1c\xe1\xb6\xff\xd6m\x96jK\xa1\xb5\xde\x07\x18\x9f\x07\x84\xcb\xce\xda\x95t\xc8~b\xc28/c\xff\xd8y\x9fDtest\xff\xff"
+
+# Same datum still waiting for results (ResultsNone)
+OPEN_ORACLE_DATUM = ORACLE_DATUM[:-10] + b"\xd8z\x80\xff"
+
+# Oracle public keys from the datum above with their signatures for b"test"
+ORACLES = [
+    (
+        "14889cdb4b72ad10d4d4243c4f50141eea1d10a3482cd20a7da6245d05ea01f1",
+        "01b54753c635dbbb59614b52679d413cd0e32332c9f50af83eaf8db23607e6dd74f4a8dc9ccae3842e248c380b5d5398f9f033edf0288100bc7f79c61861900b",
+    ),
+    (
+        "f36f9a66f3916127e1ef303eef6cdde224c83da1fc46c3d948d2a68af62dced8",
+        "102acc4091aa573b9cabf7bbcec53ca11e77d706a5681cbf25c57c11bb6029c31b6dd186c6d64438c99277dd8019a87d163a5b05b33bbe4f75627ce00943eb03",
+    ),
+    (
+        "c3e991c8919b4e2ff03cf2a795afe98c14b3d3ebe2e380598e8b8b46ddac28c4",
+        "a0bcc215d5c8d5689b3f9600ca95cf0b0fb7c7529b414f4c02b225ea283b205e106ad416c95be9eedbe24a71e6e5f80f4e64f4cf79eb1bb8a8ca180eb3661e00",
+    ),
+]
+
+
+def oracle_utxo(
+    tx_hash: str = TX_HASH, index: int = 0, datum: bytes = ORACLE_DATUM
+) -> pyc.UTxO:
+    return pyc.UTxO(
+        pyc.TransactionInput.from_primitive([tx_hash, index]),
+        pyc.TransactionOutput(
+            pyc.Address.from_primitive(
+                "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+            ),
+            10_000_000,
+            datum=pyc.RawCBOR(datum),
+        ),
+    )
@@ -0,0 +1,166 @@
+from fixtures import api, ORACLE_DATUM, ORACLES, TX_HASH
+
+from blockfrost.utils import convert_json_to_object
+
+import asyncio
+import pytest
+
+
+ADDRESS = "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+
+
+class MockAsyncBlockfrostApi:
+    def __init__(self):
+        self.calls = []
+
+    async def transaction_utxos(self, hash: str):
+        self.calls.append(hash)
+
+        return convert_json_to_object(
+            {
+                "hash": hash,
+                "outputs": [
+                    {
+                        "address": ADDRESS,
+                        "amount": [{"unit": "lovelace", "quantity": "10000000"}],
+                        "data_hash": None,
+                        "inline_datum": ORACLE_DATUM.hex(),
+                        "reference_script_hash": None,
+                    }
+                ],
+            }
+        )
+
+
+def test_resolve_async(api):
+    from lib import utxos
+
+    utxos.cache.clear()
+
+    client = MockAsyncBlockfrostApi()
+
+    first = asyncio.run(utxos.resolve_async(client, TX_HASH, 0))
+    second = asyncio.run(utxos.resolve_async(client, TX_HASH, 0))
+
+    assert first is second
+    assert client.calls == [TX_HASH]
+
+    assert str(first.utxo.output.address) == ADDRESS
+    assert first.utxo.output.amount.coin == 10_000_000
+    assert first.datum.proposal_id == "test_proposal_id"
+    assert first.datum.min_signatures == 2
+
+
+def test_async_submit(api, monkeypatch):
+    from api import oracles_async
+    from lib import quorum, utxos
+
+    utxos.cache.clear()
+    quorum.tracker.clear()
+
+    client = MockAsyncBlockfrostApi()
+    stored = []
+
+    async def upsert_signatures(rows):
+        stored.extend(rows)
+
+    monkeypatch.setattr("api.oracles_async.clients.get_async_blockfrost", lambda: client)
+    monkeypatch.setattr("api.oracles_async.aio.upsert_signatures", upsert_signatures)
+
+    pubkey, signature = ORACLES[0]
+    data = {
+        "transaction_hash": TX_HASH,
+        "index": 0,
+        "pubkey": pubkey,
+        "signature": signature,
+        "results": "test",
+    }
+
+    monkeypatch.setattr("api.oracles.signature.enforce_standard", lambda *_: True)
+
+    assert asyncio.run(oracles_async.submit("test_proposal_id", data)) == (
+        {"success": True},
+        200,
+    )
+    assert stored[0]["script_input"] == f"{TX_HASH}#0"
+    assert stored[0]["pubkey"] == pubkey
+
+    response, _ = asyncio.run(
+        oracles_async.submit_batch(
+            {
+                "signatures": [
+                    {**data, "proposal_id": "test_proposal_id", "pubkey": ORACLES[1][0]},
+                    {
+                        **data,
+                        "proposal_id": "test_proposal_id",
+                        "pubkey": ORACLES[1][0],
+                        "signature": ORACLES[1][1],
+                    },
+                ]
+            }
+        )
+    )
+
+    assert response["results"] == [
+        {"success": False, "message": "Invalid signature"},
+        {"success": True},
+    ]
+    # The first submission already cached the script input
+    assert client.calls == [TX_HASH]
+    assert len(stored) == 2
+
+
+def test_async_handlers_keep_operation_ids(api):
+    import async_app
+
+    from api import oracles, oracles_async
+
+    assert async_app.resolve_handler("api.oracles.submit") is oracles_async.submit
+    assert async_app.resolve_handler("api.oracles.submit_batch") is oracles_async.submit_batch
+    assert async_app.resolve_handler("api.oracles.get_quorum") is oracles.get_quorum
+
+
+def test_async_database_url(api):
+    from model import aio
+
+    assert aio.async_url("postgresql://user:pass@db:5432/voteaire") == (
+        "postgresql+asyncpg://user:pass@db:5432/voteaire"
+    )
+    assert aio.async_url("sqlite://") == "sqlite+aiosqlite://"
+
+
+def test_async_upsert_signatures(api, tmp_path):
+    pytest.importorskip("aiosqlite")
+
+    from model import aio
+    from model.signature import Signature
+    from sqlalchemy import create_engine
+
+    url = f"sqlite:///{tmp_path / 'signatures.db'}"
+    Signature.__table__.create(create_engine(url))
+
+    pubkey, signature = ORACLES[0]
+    row = {
+        "proposal_id": "test_proposal_id",
+        "pubkey": pubkey,
+        "signature": signature,
+        "results": "test",
+        "script_input": f"{TX_HASH}#0",
+    }
+
+    async def upsert_twice():
+        aio.init(url)
+        try:
+            await aio.upsert_signatures([row])
+            # Resubmissions replace the stored signature
+            await aio.upsert_signatures([{**row, "results": "other"}])
+        finally:
+            await aio.dispose()
+
+    asyncio.run(upsert_twice())
+
+    with create_engine(url).connect() as connection:
+        stored = connection.execute(
+            Signature.__table__.select()).mappings().all()
+
+    assert [(s["pubkey"], s["results"]) for s in stored] == [(pubkey, "other")]
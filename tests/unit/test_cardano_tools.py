@@ -1,3 +1,295 @@
-from fixtures import api
+from fixtures import api, FixedChainContext, OPEN_ORACLE_DATUM, ORACLES, oracle_utxo, wallet_utxos
 
-import pycardano as pyc
\ No newline at end of file
+import pycardano as pyc
+
+
+def test_create_data_requests_batch(api):
+    from lib import cardano, scripts
+
+    address = pyc.Address.from_primitive(
+        "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+    )
+    context = FixedChainContext()
+    wallet = wallet_utxos(address, [100_000_000] * 20)
+
+    requests = [(pyc.RawCBOR(OPEN_ORACLE_DATUM), 3_000_000) for _ in range(200)]
+
+    transactions = cardano.create_data_requests_batch(
+        context, wallet, address, scripts.oracle(), requests
+    )
+
+    assert 1 < len(transactions) < 10
+
+    script_address = scripts.oracle().address(context.network)
+    script_outputs = 0
+    for previous, transaction in zip([None] + transactions, transactions):
+        body = transaction.transaction_body
+        assert len(transaction.to_cbor("bytes")) <= context.protocol_param.max_tx_size
+
+        if previous is not None:
+            # Every transaction spends the change of the previous one
+            assert [i.transaction_id for i in body.inputs] == [
+                previous.transaction_body.id
+            ]
+
+        script_outputs += sum(
+            1 for output in body.outputs if output.address == script_address
+        )
+
+    assert script_outputs == len(requests)
+
+
+def test_data_requests_batch_tops_up_the_change(api, monkeypatch):
+    from lib import cardano, scripts
+
+    address = pyc.Address.from_primitive(
+        "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+    )
+    context = FixedChainContext()
+
+    # Nothing reserved for the fees of the transactions after the first
+    monkeypatch.setattr("lib.cardano.BATCH_FEE_RESERVE", 0)
+
+    requests = [(pyc.RawCBOR(OPEN_ORACLE_DATUM), 3_000_000) for _ in range(200)]
+    wallet = wallet_utxos(address, [600_000_000 + cardano.CHANGE_MARGIN, 100_000_000])
+
+    transactions = cardano.create_data_requests_batch(
+        context, wallet, address, scripts.oracle(), requests, strategy="largest_first"
+    )
+
+    inputs = [
+        tx_in for transaction in transactions for tx_in in transaction.transaction_body.inputs
+    ]
+
+    # The other UTxO of the wallet paid for the fees the change couldn't
+    assert wallet[1].input in inputs[1:]
+    assert len(inputs) == len(set(inputs))
+
+    script_address = scripts.oracle().address(context.network)
+    assert sum(
+        1
+        for transaction in transactions
+        for output in transaction.transaction_body.outputs
+        if output.address == script_address
+    ) == len(requests)
+
+
+def test_submit_oracles_data_reuses_ex_units(api):
+    from lib import cardano, data_types, ex_units, scripts
+
+    address = pyc.Address.from_primitive(
+        "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+    )
+    context = FixedChainContext()
+    ex_units.estimator.clear()
+
+    oracle = scripts.oracle()
+    collateral = wallet_utxos(address, [10_000_000])[0]
+    script_utxo = pyc.UTxO(
+        oracle_utxo().input,
+        pyc.TransactionOutput(
+            oracle.address(context.network),
+            10_000_000,
+            datum=pyc.RawCBOR(OPEN_ORACLE_DATUM),
+        ),
+    )
+    datum = data_types.datum_from_cbor(OPEN_ORACLE_DATUM)
+    signatures = [bytes.fromhex(signature) for _, signature in ORACLES]
+
+    for _ in range(3):
+        transaction = cardano.submit_oracles_data(
+            context, collateral, script_utxo, oracle, datum, address, b"test", signatures
+        )
+
+    # Only the first build is evaluated, with the margin on top
+    assert context.evaluations == 1
+    units = transaction.transaction_witness_set.redeemer[0].ex_units
+    assert units.mem == int(1_000_000 * (1 + ex_units.estimator.margin))
+
+    # A different redeemer shape is measured again
+    cardano.submit_oracles_data(
+        context, collateral, script_utxo, oracle, datum, address, b"test", signatures[:2]
+    )
+    assert context.evaluations == 2
+
+
+def test_execute_escrows_batch(api):
+    from lib import cardano, ex_units, scripts
+    from lib.vote_results import VoteResults
+
+    address = pyc.Address.from_primitive(
+        "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+    )
+    context = FixedChainContext()
+    ex_units.estimator.clear()
+
+    escrow = scripts.escrow()
+    collateral = wallet_utxos(address, [10_000_000])[0]
+    oracle_reference = oracle_utxo().input
+    script_utxos = [
+        pyc.UTxO(
+            pyc.TransactionInput.from_primitive(["ee" * 32, i]),
+            pyc.TransactionOutput(
+                escrow.address(context.network),
+                10_000_000,
+                datum=pyc.RawCBOR(b"\x80"),
+            ),
+        )
+        for i in range(30)
+    ]
+
+    transactions = cardano.execute_escrows_batch(
+        context,
+        collateral,
+        script_utxos,
+        escrow,
+        oracle_reference,
+        address,
+        VoteResults.parse("1:10,2:20|3:30,4:40"),
+    )
+
+    # 1.2M memory per escrow, 14M per transaction
+    assert [len(tx.transaction_body.inputs) for tx in transactions] == [11, 11, 8]
+
+    spent = set()
+    for transaction in transactions:
+        body = transaction.transaction_body
+        assert len(transaction.to_cbor("bytes")) <= context.protocol_param.max_tx_size
+        assert body.reference_inputs == [oracle_reference]
+        assert body.collateral == [collateral.input]
+        assert sum(r.ex_units.mem for r in transaction.transaction_witness_set.redeemer) <= (
+            context.protocol_param.max_tx_ex_mem
+        )
+
+        spent.update(body.inputs)
+
+    assert spent == {utxo.input for utxo in script_utxos}
+
+    # A single escrow was measured to pack them, then every packed
+    # transaction was evaluated
+    assert context.evaluations == 4
+
+    cardano.execute_escrows_batch(
+        context,
+        collateral,
+        script_utxos[:11],
+        escrow,
+        oracle_reference,
+        address,
+        VoteResults.parse("1:10,2:20|3:30,4:40"),
+    )
+    # The measured units are reused, only the new transaction is evaluated
+    assert context.evaluations == 5
+
+
+class CrowdedChainContext(FixedChainContext):
+    """Script inputs cost more the more of them share a transaction"""
+
+    def evaluate_tx(self, cbor):
+        self.evaluations += 1
+
+        redeemers = pyc.Transaction.from_cbor(cbor).transaction_witness_set.redeemer
+        return {
+            f"spend:{redeemer.index}": pyc.ExecutionUnits(
+                1_000_000 * len(redeemers) + redeemer.index, 400_000_000
+            )
+            for redeemer in redeemers
+        }
+
+
+def test_packed_escrows_are_evaluated(api):
+    from lib import cardano, ex_units, scripts
+    from lib.vote_results import VoteResults
+
+    address = pyc.Address.from_primitive(
+        "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+    )
+    context = CrowdedChainContext()
+    ex_units.estimator.clear()
+
+    escrow = scripts.escrow()
+    script_utxos = [
+        pyc.UTxO(
+            pyc.TransactionInput.from_primitive(["ee" * 32, i]),
+            pyc.TransactionOutput(
+                escrow.address(context.network),
+                10_000_000,
+                datum=pyc.RawCBOR(b"\x80"),
+            ),
+        )
+        for i in range(6)
+    ]
+
+    transactions = cardano.execute_escrows_batch(
+        context,
+        wallet_utxos(address, [10_000_000])[0],
+        script_utxos,
+        escrow,
+        oracle_utxo().input,
+        address,
+        VoteResults.parse("1:10,2:20"),
+    )
+
+    # A lone escrow suggests 11 per transaction, 3 of them actually fit
+    assert [len(tx.transaction_body.inputs) for tx in transactions] == [3, 3]
+
+    for transaction in transactions:
+        redeemers = transaction.transaction_witness_set.redeemer
+
+        # Every redeemer has the units evaluated for its own index
+        assert [r.ex_units.mem for r in sorted(redeemers, key=lambda r: r.index)] == [
+            int((3_000_000 + index) * 1.2) for index in range(3)
+        ]
+        assert sum(r.ex_units.mem for r in redeemers) <= context.protocol_param.max_tx_ex_mem
+
+
+def test_escrow_units_depend_on_the_datum(api):
+    from lib import cardano, data_types, ex_units, scripts
+    from lib.vote_results import VoteResults
+    from pycardano.serialization import default_encoder
+
+    import cbor2
+
+    address = pyc.Address.from_primitive(
+        "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+    )
+    context = FixedChainContext()
+    ex_units.estimator.clear()
+
+    escrow = scripts.escrow()
+
+    def escrow_utxo(index, receivers):
+        datum = data_types.escrow_datum(
+            pyc.ScriptHash(bytes(28)),
+            address.payment_part,
+            0,
+            0,
+            data_types.VoteUseCount(),
+            [address] * receivers,
+        )
+
+        return pyc.UTxO(
+            pyc.TransactionInput.from_primitive(["ee" * 32, index]),
+            pyc.TransactionOutput(
+                escrow.address(context.network),
+                10_000_000,
+                datum=pyc.RawCBOR(cbor2.dumps(datum, default=default_encoder)),
+            ),
+        )
+
+    script_utxos = [escrow_utxo(i, 2 if i % 2 else 5) for i in range(6)]
+
+    transactions = cardano.execute_escrows_batch(
+        context,
+        wallet_utxos(address, [10_000_000])[0],
+        script_utxos,
+        escrow,
+        oracle_utxo().input,
+        address,
+        VoteResults.parse("1:10,2:20"),
+    )
+
+    # Escrows paying out to 2 and to 5 addresses are measured and packed apart
+    assert context.evaluations == 4
+    assert ex_units.estimator.stats()["shapes"] == 2
+    assert sorted(len(tx.transaction_body.inputs) for tx in transactions) == [3, 3]
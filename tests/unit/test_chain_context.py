@@ -0,0 +1,99 @@
+from fixtures import api, FixedChainContext, OPEN_ORACLE_DATUM, wallet_utxos
+
+import pycardano as pyc
+
+
+ADDRESS = pyc.Address.from_primitive(
+    "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+)
+
+
+class CountingContext(FixedChainContext):
+    def __init__(self):
+        super().__init__()
+        self.current_epoch = 300
+        self.calls = {"protocol_param": 0, "epoch": 0, "utxos": 0}
+
+    @property
+    def protocol_param(self):
+        self.calls["protocol_param"] += 1
+        return super().protocol_param
+
+    @property
+    def epoch(self):
+        self.calls["epoch"] += 1
+        return self.current_epoch
+
+    def utxos(self, address):
+        self.calls["utxos"] += 1
+        return super().utxos(address)
+
+
+def test_local_indexed_chain_context(api):
+    from lib import cardano, chain_context, indexer, scripts
+
+    store = indexer.UTxOStore()
+    store.roll_forward(
+        indexer.Point(5000, "03" * 32),
+        [([], [indexer.IndexedUTxO(utxo, None, 5000) for utxo in wallet_utxos(ADDRESS, [50_000_000] * 3)])],
+    )
+
+    now = [0.0]
+    upstream = CountingContext()
+    context = chain_context.LocalIndexedChainContext(
+        store, upstream, epoch_check_interval=60, timer=lambda: now[0]
+    )
+
+    assert context.last_block_slot == 5000
+    assert len(context.utxos(str(ADDRESS))) == 3
+
+    for _ in range(5):
+        transaction = cardano.create_data_request(
+            context,
+            context.utxos(str(ADDRESS)),
+            ADDRESS,
+            scripts.oracle(),
+            10_000_000,
+            pyc.RawCBOR(OPEN_ORACLE_DATUM),
+        )
+
+    # Parameters are fetched once per epoch and UTxOs never go upstream
+    assert upstream.calls == {"protocol_param": 1, "epoch": 1, "utxos": 0}
+
+    now[0] = 61
+    upstream.current_epoch = 301
+    assert context.protocol_param is upstream.protocol_param
+    assert upstream.calls["protocol_param"] == 3
+
+    context.submit_tx(transaction.to_cbor())
+    assert upstream.submitted == [transaction.to_cbor()]
+
+    offline = chain_context.LocalIndexedChainContext(
+        store, network=pyc.Network.TESTNET, protocol_param=upstream.protocol_param
+    )
+    assert offline.utxos(str(ADDRESS)) == context.utxos(str(ADDRESS))
+
+
+def test_upstream_addresses(api):
+    from lib import chain_context, indexer
+
+    other = pyc.Address.from_primitive(
+        "addr_test1vrsmdl7kdktx5japkh0qwxylq7zvhnk6j46vslnzcguz7cc7cyz6j"
+    )
+
+    upstream = CountingContext()
+    upstream._utxos[str(ADDRESS)] = wallet_utxos(ADDRESS, [50_000_000] * 2)
+
+    store = indexer.UTxOStore()
+    store.roll_forward(
+        indexer.Point(5000, "03" * 32),
+        [([], [indexer.IndexedUTxO(utxo, None, 5000) for utxo in wallet_utxos(other, [1_000_000])])],
+    )
+
+    context = chain_context.LocalIndexedChainContext(
+        store, upstream, upstream_addresses=[ADDRESS]
+    )
+
+    assert len(context.utxos(str(ADDRESS))) == 2
+    assert len(context.utxos(str(other))) == 1
+    assert upstream.calls["utxos"] == 1
@@ -0,0 +1,33 @@
+from fixtures import api
+
+
+def test_blockfrost_registry(api):
+    from lib import clients
+
+    clients.init({"BLOCKFROST_PROJECT_ID": "<project_id>", "NETWORK_MODE": "testnet"})
+
+    testnet = clients.get_blockfrost()
+
+    assert testnet is clients.get_blockfrost("testnet")
+    assert testnet.base_url == clients.BLOCKFROST_URLS["testnet"]
+    assert testnet.session.headers["project_id"] == "<project_id>"
+
+    mainnet = clients.get_blockfrost("mainnet")
+
+    assert mainnet is not testnet
+    assert mainnet is clients.get_blockfrost("mainnet")
+    assert mainnet.base_url == clients.BLOCKFROST_URLS["mainnet"]
+
+    clients.shutdown()
+
+    assert clients.get_blockfrost() is not testnet
+
+    clients.shutdown()
+
+
+def test_unknown_network(api):
+    import pytest
+    from lib import clients
+
+    with pytest.raises(ValueError):
+        clients.init({"BLOCKFROST_PROJECT_ID": "<project_id>", "NETWORK_MODE": "preview"})
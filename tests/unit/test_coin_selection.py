@@ -0,0 +1,98 @@
+from fixtures import api, wallet_utxos
+
+import pycardano as pyc
+import random
+import pytest
+
+
+ADDRESS = pyc.Address.from_primitive(
+    "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+)
+
+
+def _total(utxos):
+    total = pyc.Value(0)
+    for utxo in utxos:
+        total += utxo.output.amount
+
+    return total
+
+
+def test_strategies_cover_target(api):
+    from lib import coin_selection
+
+    rng = random.Random(0)
+    index = coin_selection.UTxOIndex(
+        wallet_utxos(ADDRESS, [rng.randrange(1_000_000, 50_000_000) for _ in range(2000)])
+    )
+    assert len(index) == 2000
+
+    target = pyc.Value(120_000_000)
+    for strategy in coin_selection.STRATEGIES:
+        selected = coin_selection.select(index, target, strategy, random.Random(1))
+
+        assert _total(selected).coin >= target.coin
+        assert len({utxo.input for utxo in selected}) == len(selected)
+
+    largest = coin_selection.select(index, target, "largest_first")
+    assert len(largest) == 3
+
+    # Branch and bound lands within its tolerance of the target
+    exact = coin_selection.select(index, target, "branch_and_bound")
+    assert _total(exact).coin - target.coin <= coin_selection.BNB_TOLERANCE
+
+    with pytest.raises(coin_selection.InsufficientFunds):
+        coin_selection.select(index, 10**15)
+
+    with pytest.raises(ValueError):
+        coin_selection.select(index, target, "smallest_first")
+
+
+def test_selection_is_deterministic(api):
+    from lib import coin_selection
+
+    rng = random.Random(3)
+    index = coin_selection.UTxOIndex(
+        wallet_utxos(ADDRESS, [rng.randrange(1_000_000, 50_000_000) for _ in range(200)])
+    )
+
+    target = pyc.Value(80_000_000)
+    for strategy in coin_selection.STRATEGIES:
+        first = coin_selection.select(index, target, strategy)
+        assert coin_selection.select(index, target, strategy) == first
+
+    assert coin_selection.select(index, target) == coin_selection.select(
+        index, target, coin_selection.DEFAULT_STRATEGY
+    )
+
+
+def test_selects_native_assets(api):
+    from lib import coin_selection
+
+    policy = pyc.ScriptHash(bytes(28))
+    token = pyc.AssetName(b"token")
+
+    utxos = wallet_utxos(ADDRESS, [10_000_000] * 10)
+    utxos.append(
+        pyc.UTxO(
+            pyc.TransactionInput.from_primitive(["bb" * 32, 0]),
+            pyc.TransactionOutput(
+                ADDRESS,
+                pyc.Value(2_000_000, pyc.MultiAsset({policy: pyc.Asset({token: 5})})),
+            ),
+        )
+    )
+
+    index = coin_selection.UTxOIndex(utxos)
+    target = pyc.Value(15_000_000, pyc.MultiAsset({policy: pyc.Asset({token: 5})}))
+
+    for strategy in coin_selection.STRATEGIES:
+        selected = coin_selection.select(index, target, strategy, random.Random(2))
+        assert utxos[-1] in selected
+        assert _total(selected).coin >= target.coin
+
+    index.remove(utxos[-1].input)
+    assert utxos[-1].input not in index
+
+    with pytest.raises(coin_selection.InsufficientFunds):
+        coin_selection.select(index, target, "largest_first")
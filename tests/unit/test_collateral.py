@@ -0,0 +1,151 @@
+from fixtures import api, FixedChainContext, wallet_utxos
+
+import pycardano as pyc
+import pytest
+
+
+SKEY = pyc.PaymentSigningKey.from_cbor(
+    "5820ac29084c8ceca56b02c4118e76c1845c40b5eb810444a069e8edf2f5280ee875"
+)
+ADDRESS = pyc.Address(
+    pyc.VerificationKey.from_signing_key(SKEY).hash(), network=pyc.Network.TESTNET
+)
+
+
+def _spending(*inputs: pyc.TransactionInput) -> pyc.Transaction:
+    body = pyc.TransactionBody(inputs=list(inputs), outputs=[], fee=0)
+    return pyc.Transaction(body, pyc.TransactionWitnessSet())
+
+
+def test_leases_are_exclusive(api):
+    from lib.collateral import CollateralManager, NoCollateral
+
+    wallet = wallet_utxos(ADDRESS, [5_000_000, 5_000_000, 20_000_000])
+    context = FixedChainContext({str(ADDRESS): wallet})
+
+    # Nothing to split, the pool is the two UTxOs of exactly 5 ADA
+    manager = CollateralManager(context, SKEY, pool_size=2)
+
+    first = manager.lease()
+    second = manager.lease()
+    assert {first.input, second.input} == {wallet[0].input, wallet[1].input}
+
+    with pytest.raises(NoCollateral):
+        manager.lease()
+
+    manager.release(first)
+    assert manager.lease().input == first.input
+
+    # Held until the transaction using it lands
+    script_input = pyc.TransactionInput.from_primitive(["ee" * 32, 0])
+    manager.hold(first, _spending(script_input))
+    manager.release(second)
+
+    assert manager.lease().input == second.input
+    with pytest.raises(NoCollateral):
+        manager.lease()
+
+    manager.on_spent(script_input)
+    assert manager.lease().input == first.input
+
+    assert manager.stats() == {
+        "leased": 2,
+        "held": 0,
+        "leases": 5,
+        "splits": 0,
+        "waits": 0,
+    }
+
+
+def test_utxos_are_fetched_without_the_lock(api):
+    from lib.collateral import CollateralManager
+
+    wallet = wallet_utxos(ADDRESS, [5_000_000, 5_000_000])
+    context = FixedChainContext({str(ADDRESS): wallet})
+
+    manager = CollateralManager(context, SKEY, pool_size=2)
+
+    # Another thread releasing a collateral would block on the lock
+    # otherwise, for as long as the lookup takes
+    fetch = context.utxos
+    locked = []
+
+    def utxos(address):
+        locked.append(manager._cond._is_owned())
+        return fetch(address)
+
+    context.utxos = utxos
+
+    manager.lease()
+    manager.lease()
+
+    assert locked == [False, False]
+
+
+def test_splits_funds_when_needed(api):
+    from lib.collateral import CollateralManager, NoCollateral
+
+    wallet = wallet_utxos(ADDRESS, [100_000_000])
+    context = FixedChainContext({str(ADDRESS): wallet})
+
+    manager = CollateralManager(context, SKEY, pool_size=3)
+
+    leased = [manager.lease() for _ in range(3)]
+
+    # A single split created the whole pool, leased before it even lands
+    assert len(context.submitted) == 1
+    split = pyc.Transaction.from_cbor(context.submitted[0])
+    assert {utxo.input.transaction_id for utxo in leased} == {split.transaction_body.id}
+    assert all(utxo.output.amount == 5_000_000 for utxo in leased)
+    assert split.transaction_body.inputs == [wallet[0].input]
+
+    with pytest.raises(NoCollateral):
+        manager.lease()
+
+    assert manager.stats()["splits"] == 1
+
+
+def test_released_once_confirmed(api):
+    from lib.collateral import CollateralManager, NoCollateral
+
+    wallet = wallet_utxos(ADDRESS, [5_000_000])
+    context = FixedChainContext({str(ADDRESS): wallet})
+
+    landed = set()
+    now = [0.0]
+    manager = CollateralManager(
+        context,
+        SKEY,
+        pool_size=1,
+        confirmed=lambda transaction_id: transaction_id in landed,
+        confirm_interval=10,
+        timer=lambda: now[0],
+    )
+
+    transaction = _spending(pyc.TransactionInput.from_primitive(["ee" * 32, 0]))
+    manager.hold(manager.lease(), transaction)
+
+    with pytest.raises(NoCollateral):
+        manager.lease()
+
+    # Not looked up again before the interval is over
+    landed.add(transaction.transaction_body.id)
+    with pytest.raises(NoCollateral):
+        manager.lease()
+
+    now[0] = 10
+    assert manager.lease().input == wallet[0].input
+
+
+def test_find_never_splits(api):
+    from lib import collateral
+
+    wallet = wallet_utxos(ADDRESS, [100_000_000, 5_000_000])
+    context = FixedChainContext({str(ADDRESS): wallet})
+
+    assert collateral.find(context, ADDRESS).input == wallet[1].input
+
+    with pytest.raises(collateral.NoCollateral):
+        collateral.find(context, ADDRESS, amount=7_000_000)
+
+    assert context.submitted == []
@@ -0,0 +1,121 @@
+from fixtures import api, ORACLES, TX_HASH
+
+import threading
+import pytest
+import time
+
+
+def test_engine_options(api):
+    from model import engines
+
+    environ = {
+        "DB_POOL_SIZE": "20",
+        "DB_MAX_OVERFLOW": "5",
+        "DB_POOL_RECYCLE": "1800",
+        "DB_POOL_PRE_PING": "true",
+    }
+
+    options = engines.engine_options("postgresql://user@db/voteaire", "test", environ)
+
+    assert options.pop("poolclass").__name__ == "TimedQueuePool"
+    assert options == {
+        "pool_size": 20,
+        "max_overflow": 5,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    }
+
+    # SQLite keeps the pools Flask-SQLAlchemy picks
+    assert engines.engine_options("sqlite://", "test", environ) == {}
+
+    engines.pools.pop("test")
+
+
+def test_unsupported_database_is_rejected(api):
+    from model import signature
+
+    signature.check_dialect("postgresql://user@db/voteaire")
+    signature.check_dialect("sqlite://")
+
+    with pytest.raises(ValueError):
+        signature.check_dialect("mysql://user@db/voteaire")
+
+
+def test_checkout_wait_is_timed(api, tmp_path):
+    from model import engines
+    from sqlalchemy import create_engine
+
+    stats = engines.PoolStats()
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}",
+        poolclass=engines.timed_pool(stats),
+        pool_size=1,
+        max_overflow=0,
+    )
+
+    held = engine.connect()
+
+    def release():
+        time.sleep(0.05)
+        held.close()
+
+    thread = threading.Thread(target=release)
+    thread.start()
+
+    # Waits for the only connection to be returned
+    with engine.connect():
+        pass
+
+    thread.join()
+
+    result = stats.stats()
+
+    assert result["checkouts"] == 2
+    assert result["max_wait_seconds"] >= 0.04
+    assert result["size"] == 1
+    assert result["checked_out"] == 0
+
+
+def test_reads_go_to_the_replica(api, tmp_path, monkeypatch):
+    from api import oracles
+    from lib import quorum
+    from model import Signature, db, engines
+    from sqlalchemy import create_engine
+
+    _, app = api
+
+    quorum.tracker.clear()
+
+    replica_url = f"sqlite:///{tmp_path / 'replica.db'}"
+    Signature.__table__.create(create_engine(replica_url))
+
+    monkeypatch.setattr("model.engines._replica", None)
+    engines.init_replica(replica_url, {})
+
+    script_input = f"{TX_HASH}#0"
+    rows = [
+        {
+            "proposal_id": "test_proposal_id",
+            "pubkey": pubkey,
+            "signature": signature,
+            "results": "test",
+            "script_input": script_input,
+        }
+        for pubkey, signature in ORACLES[:2]
+    ]
+
+    with app.app_context():
+        Signature.upsert(rows)
+        db.session.commit()
+
+        # Not counted yet, the replica is trusted even if it lags
+        assert oracles.stored_signatures(script_input, "test") == {}
+
+        for row in rows:
+            quorum.tracker.add(script_input, row["proposal_id"], row["pubkey"], "test", 2)
+
+        # Counted signatures missing from the replica are read from the primary
+        assert oracles.stored_signatures(script_input, "test") == dict(ORACLES[:2])
+
+        Signature.query.delete()
+        db.session.commit()
@@ -0,0 +1,140 @@
+from fixtures import api, oracle_utxo, OPEN_ORACLE_DATUM, ORACLE_DATUM
+
+from pycardano.serialization import default_encoder
+
+import pycardano as pyc
+import pytest
+import cbor2
+
+
+ADDRESS = pyc.Address.from_primitive(
+    "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+)
+
+CREATOR = pyc.VerificationKeyHash(bytes([1]) * 28)
+OTHER_CREATOR = pyc.VerificationKeyHash(bytes([2]) * 28)
+
+
+def _escrow_utxo(
+    index: int, policy_id: bytes, creator: pyc.VerificationKeyHash, deadline: int
+) -> pyc.UTxO:
+    from lib import data_types
+
+    datum = data_types.escrow_datum(
+        pyc.ScriptHash(policy_id),
+        creator,
+        deadline,
+        0,
+        data_types.VoteUseCount(),
+        [ADDRESS],
+    )
+
+    return pyc.UTxO(
+        pyc.TransactionInput.from_primitive(["ee" * 32, index]),
+        pyc.TransactionOutput(
+            ADDRESS,
+            10_000_000,
+            datum=pyc.RawCBOR(cbor2.dumps(datum, default=default_encoder)),
+        ),
+    )
+
+
+def test_escrow_datum_decode(api):
+    from lib import escrow_datum
+
+    utxo = _escrow_utxo(0, bytes(28), CREATOR, 1_000)
+    datum = escrow_datum.decode(utxo.output.datum.cbor)
+
+    assert datum.policy_id == bytes(28)
+    assert datum.creator_hash == CREATOR.payload
+    assert datum.deadline == 1_000
+    assert datum.vote_use == escrow_datum.VOTE_COUNT
+    assert datum.payment_parts == (ADDRESS.payment_part.payload,)
+
+    for invalid in [ORACLE_DATUM, b"\x80", b"\xff"]:
+        with pytest.raises(ValueError):
+            escrow_datum.decode(invalid)
+
+
+def test_escrow_index(api):
+    from lib import indexer, oracle_datum
+
+    client, _ = api
+
+    policy_id = oracle_datum.decode(ORACLE_DATUM).policy_id
+    other_policy = bytes(28)
+
+    store = indexer.UTxOStore()
+    follower = indexer.Indexer(indexer.ReplaySource("unused"), store, [])
+
+    answered = oracle_utxo(index=0)
+    escrows = [
+        _escrow_utxo(0, policy_id, CREATOR, 3_000),
+        _escrow_utxo(1, policy_id, OTHER_CREATOR, 1_000),
+        _escrow_utxo(2, other_policy, CREATOR, 2_000),
+    ]
+
+    store.roll_forward(
+        indexer.Point(10, "01" * 32),
+        [([], [follower._entry(utxo, 10) for utxo in [answered, *escrows]])],
+    )
+
+    def inputs(entries):
+        return [entry.utxo.input.index for entry in entries]
+
+    assert inputs(store.escrows()) == [1, 2, 0]
+    assert inputs(store.escrows(policy_id=policy_id)) == [1, 0]
+    assert inputs(store.escrows(creator=CREATOR.payload)) == [2, 0]
+    assert inputs(store.escrows(deadline_from=1_500, deadline_to=3_000)) == [2, 0]
+    assert inputs(store.escrows(policy_id=policy_id, deadline_to=2_000)) == [1]
+
+    assert inputs(store.escrows_for_oracle(answered.input)) == [1, 0]
+    assert store.escrows_for_oracle(escrows[0].input) == []
+
+    [(oracle, settled)] = store.settleable()
+    assert oracle.utxo == answered
+    assert inputs(settled) == [1, 0]
+
+    # Still waiting for results, nothing to settle
+    store.roll_forward(
+        indexer.Point(20, "02" * 32),
+        [
+            (
+                [answered.input],
+                [follower._entry(oracle_utxo(index=1, datum=OPEN_ORACLE_DATUM), 20)],
+            )
+        ],
+    )
+
+    assert store.settleable() == []
+    assert store.stats()["escrows"] == 3
+
+    indexer.store, previous = store, indexer.store
+    try:
+        response = client.get(f"/escrows?policy_id={policy_id.hex()}&deadline_from=2000")
+        assert response.status_code == 200
+        assert response.json["escrows"] == [
+            {
+                "transaction_hash": "ee" * 32,
+                "index": 0,
+                "slot": 10,
+                "policy_id": policy_id.hex(),
+                "creator": CREATOR.payload.hex(),
+                "deadline": 3_000,
+                "question_index": 0,
+                "vote_use": "count",
+                "payment_parts": [ADDRESS.payment_part.payload.hex()],
+            }
+        ]
+
+        assert client.get("/escrows?creator=zz").status_code == 400
+    finally:
+        indexer.store = previous
+
+    # Rolling back restores the answered oracle, and its escrows
+    store.roll_backward(indexer.Point(10, "01" * 32))
+    assert inputs(store.settleable()[0][1]) == [1, 0]
+
+    store.roll_backward(None)
+    assert store.escrows() == []
+    assert store.stats()["escrows"] == 0
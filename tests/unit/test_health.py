@@ -7,4 +7,13 @@ def test_health(api):
     response = client.get("/health") 
     
     assert response.status_code == 200
-    assert response.json == {"status": True}
\ No newline at end of file
+    assert response.json == {"status": True}
+
+def test_metrics(api):
+    client, _ = api
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert set(response.json["utxo_cache"]) >= {"hits", "misses", "size"}
+    assert set(response.json["utxo_lookups"]) == {"calls", "coalesced", "in_flight"}
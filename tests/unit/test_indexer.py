@@ -0,0 +1,91 @@
+from fixtures import api, FixedChainContext, OPEN_ORACLE_DATUM, wallet_utxos
+
+import pycardano as pyc
+import json
+
+
+ADDRESS = pyc.Address.from_primitive(
+    "addr_test1vpacm899akkpck3u0zmjndfsppapqrxstqq38nwvm0xv7wcjxzzqy"
+)
+
+
+def _spend(tx_in: pyc.TransactionInput) -> pyc.Transaction:
+    return pyc.Transaction(
+        pyc.TransactionBody(
+            inputs=[tx_in], outputs=[pyc.TransactionOutput(ADDRESS, 9_000_000)], fee=200_000
+        ),
+        pyc.TransactionWitnessSet(),
+    )
+
+
+def test_indexer_replay(api, tmp_path):
+    client, _ = api
+
+    from lib import cardano, indexer, scripts, utxos
+
+    oracle = scripts.oracle()
+    request = cardano.create_data_request(
+        FixedChainContext(),
+        wallet_utxos(ADDRESS, [100_000_000]),
+        ADDRESS,
+        oracle,
+        10_000_000,
+        pyc.RawCBOR(OPEN_ORACLE_DATUM),
+    )
+    script_input = pyc.TransactionInput(request.transaction_body.id, 0)
+
+    blocks = [
+        {"slot": 10, "hash": "01" * 32, "transactions": [request.to_cbor()]},
+        {"slot": 20, "hash": "02" * 32, "transactions": [_spend(script_input).to_cbor()]},
+    ]
+    replay = tmp_path / "blocks.jsonl"
+    replay.write_text("\n".join(json.dumps(block) for block in blocks[:1]))
+
+    store = indexer.UTxOStore()
+    spent = []
+    store.on_spent(spent.append)
+
+    follower = indexer.Indexer(
+        indexer.ReplaySource(str(replay)), store, [oracle.address()]
+    )
+    follower.run()
+
+    # Only the script output is indexed, not the change
+    entry = store.get(script_input)
+    assert entry.proposal_id == "test_proposal_id"
+    assert entry.utxo.output.datum.cbor == OPEN_ORACLE_DATUM
+    assert store.at_address(oracle.address()) == [entry.utxo]
+    assert store.by_proposal("test_proposal_id") == [entry]
+    assert store.tip == indexer.Point(10, "01" * 32)
+
+    # Resolving it doesn't need Blockfrost anymore
+    indexer.store, previous = store, indexer.store
+    try:
+        resolved = utxos.resolve(None, str(script_input.transaction_id), 0)
+        assert resolved.datum["min_signatures"] == 2
+
+        response = client.get("/oracle/test_proposal_id/requests")
+        assert response.json["requests"] == [
+            {
+                "transaction_hash": str(script_input.transaction_id),
+                "index": 0,
+                "slot": 10,
+                "min_signatures": 2,
+                "answered": False,
+            }
+        ]
+    finally:
+        indexer.store = previous
+
+    # Resuming only applies the new block
+    replay.write_text(
+        "\n".join(json.dumps(block) for block in blocks)
+        + "\n"
+        + json.dumps({"rollback": {"slot": 10, "hash": "01" * 32}})
+    )
+    follower.run()
+
+    assert spent == [script_input]
+    # The rollback restored the spent output
+    assert store.get(script_input) == entry
+    assert store.tip == indexer.Point(10, "01" * 32)
@@ -0,0 +1,89 @@
+from fixtures import api, ORACLE_DATUM, OPEN_ORACLE_DATUM
+
+from pycardano.serialization import default_encoder
+
+import pytest
+import cbor2
+
+
+def test_decode_matches_data_types(api):
+    from lib import data_types, oracle_datum
+
+    for cbor in [ORACLE_DATUM, OPEN_ORACLE_DATUM]:
+        datum = oracle_datum.decode(cbor)
+
+        assert datum.to_cbor() == cbor
+        assert datum.to_dict() == data_types.cbor_datum_to_dict(cbor)
+
+    assert oracle_datum.decode(ORACLE_DATUM).results == b"test"
+    assert oracle_datum.decode(OPEN_ORACLE_DATUM)["results"] is None
+
+
+def test_encode_matches_data_types(api):
+    from lib import data_types, oracle_datum
+
+    decoded = oracle_datum.decode(ORACLE_DATUM)
+
+    for results in [None, b"578,214693|484,214787", b"x" * 100]:
+        expected = cbor2.dumps(
+            data_types.oracle_datum(
+                decoded.proposal_id,
+                decoded.minting_policy_identifier,
+                decoded.creator,
+                1_700_000_000_000,
+                decoded.oracles,
+                decoded.min_signatures,
+                decoded.payment_address,
+                results,
+            ),
+            default=default_encoder,
+        )
+
+        datum = oracle_datum.OracleDatum(
+            decoded.proposal_id,
+            decoded.policy_id,
+            decoded.creator_hash,
+            1_700_000_000_000,
+            decoded.oracles,
+            decoded.min_signatures,
+            decoded.payment_part,
+            results,
+        )
+
+        assert datum.to_cbor() == expected
+        assert oracle_datum.decode(expected) == datum
+
+
+def test_decode_rejects_other_datums(api):
+    from lib import oracle_datum
+
+    with pytest.raises(ValueError):
+        oracle_datum.decode(b"\x9f\x01\x02\xff")
+
+    with pytest.raises(ValueError):
+        # Unknown results constructor
+        oracle_datum.decode(ORACLE_DATUM[:-10] + b"\xd8\x7b\x80\xff")
+
+    with pytest.raises(ValueError):
+        oracle_datum.decode(b"\xff")
+
+
+def test_with_results_shares_fields(api):
+    from lib import data_types, oracle_datum
+
+    datum = data_types.datum_from_cbor(OPEN_ORACLE_DATUM)
+    updated = data_types.update_datum_with_results(datum, b"test")
+
+    assert cbor2.dumps(updated, default=default_encoder) == ORACLE_DATUM
+    # The original is left untouched, and unchanged fields are shared
+    assert cbor2.dumps(datum, default=default_encoder) == OPEN_ORACLE_DATUM
+    assert updated.items[4] is datum.items[4]
+
+    decoded = oracle_datum.decode(OPEN_ORACLE_DATUM)
+    answered = decoded.with_results(b"test")
+
+    assert answered.to_cbor() == ORACLE_DATUM
+    assert answered.oracles is decoded.oracles
+    assert decoded.results is None
+
+    assert data_types.update_datum_with_results(decoded, b"test").cbor == ORACLE_DATUM
@@ -1,13 +1,23 @@
-from fixtures import api
+from fixtures import api, oracle_utxo, ORACLES
+
+from blockfrost.utils import ApiError
+from types import SimpleNamespace
 
 import pycardano as pyc
+import requests
+
+
+TX_HASH = "5e0cba9e817823ce82c32ded0b22f6790f075cd39ae9e0ab9af7ad1cc81edf17"
 
 
 def test_oracle_submit(api, monkeypatch):
     from model import Signature
+    from lib import utxos
 
     client, _ = api
 
+    utxos.cache.clear()
+
     class MockBlockfrostApi:
         def __init__(self, **args):
             pass
@@ -32,9 +42,12 @@ def test_oracle_submit(api, monkeypatch):
 
     print(utxo)
 
-    monkeypatch.setattr("api.oracles.BlockFrostApi", MockBlockfrostApi)
     monkeypatch.setattr(
-        "api.oracles.cardano.utxo_from_input",
+        "api.oracles.clients.get_blockfrost",
+        lambda *_: MockBlockfrostApi(),
+    )
+    monkeypatch.setattr(
+        "lib.utxos.cardano.utxo_from_input",
         lambda *_: utxo,
     )
     monkeypatch.setattr(
@@ -45,7 +58,7 @@ def test_oracle_submit(api, monkeypatch):
     response = client.post(
         "/oracle/test_proposal_id/submit",
         json={
-            "transaction_hash": "hash",
+            "transaction_hash": TX_HASH,
             "index": 0,
             "pubkey": "14889cdb4b72ad10d4d4243c4f50141eea1d10a3482cd20a7da6245d05ea01f1",
             "signature": "01b54753c635dbbb59614b52679d413cd0e32332c9f50af83eaf8db23607e6dd74f4a8dc9ccae3842e248c380b5d5398f9f033edf0288100bc7f79c61861900b",
@@ -72,12 +85,12 @@ def test_oracle_submit(api, monkeypatch):
     )
     assert signature.results == "test"
 
-    assert signature.script_input == "hash#0"
+    assert signature.script_input == f"{TX_HASH}#0"
 
     response = client.post(
         "/oracle/test_proposal_id/submit",
         json={
-            "transaction_hash": "hash",
+            "transaction_hash": TX_HASH,
             "index": 0,
             "pubkey": "14889cdb4b72ad10d4d4243c4f50141eea1d10a3482cd20a7da6245d05ea01f1",
             "signature": "01b54753c635dbbb59614b52679d413cd0e32332c9f50af83eaf8db23607e6dd74f4a8dc9ccae3842e248c380b5d5398f9f033edf0288100bc7f79c61861900b",
@@ -91,7 +104,7 @@ def test_oracle_submit(api, monkeypatch):
     response = client.post(
         "/oracle/test_proposal_id/submit",
         json={
-            "transaction_hash": "hash",
+            "transaction_hash": TX_HASH,
             "index": 0,
             "pubkey": "14889cdb4b72ad10d4d4243c4f50141eea1d10a3482cd20a7da6245d05ea01f1",
             "signature": "102acc4091aa573b9cabf7bbcec53ca11e77d706a5681cbf25c57c11bb6029c31b6dd186c6d64438c99277dd8019a87d163a5b05b33bbe4f75627ce00943eb03",
@@ -105,7 +118,7 @@ def test_oracle_submit(api, monkeypatch):
     response = client.post(
         "/oracle/test_proposal_id/submit",
         json={
-            "transaction_hash": "hash",
+            "transaction_hash": TX_HASH,
             "index": 0,
             "pubkey": "74ca8a3406d265acc80e03ee9caf4bef5ccd3686cc29cf24f4a3a1418765f3ac",
             "signature": "b5575bb1e61b9734f1f954a0b2ee048c73d2210df1f37f6cc2bbce5e8e20a396f6d103745d4c3ca454bc50974431f8136e246616380588f7d4a7671ad63f800e",
@@ -114,4 +127,170 @@ def test_oracle_submit(api, monkeypatch):
     )
 
     assert response.status_code == 200
-    assert response.json == {"success": False, "message": "PubKey not within valid oracles"}
\ No newline at end of file
+    assert response.json == {"success": False, "message": "PubKey not within valid oracles"}
+
+def test_oracle_submit_batch(api, monkeypatch):
+    from model import Signature, db
+    from lib import utxos
+
+    client, app = api
+
+    utxos.cache.clear()
+
+    with app.app_context():
+        Signature.query.delete()
+        db.session.commit()
+
+    other_hash = "ab" * 32
+
+    lookups = []
+
+    missing_hash = "cd" * 32
+    offline_hash = "ef" * 32
+
+    def utxo_from_input(_, transaction_hash, index):
+        lookups.append((transaction_hash, index))
+
+        if transaction_hash == missing_hash:
+            raise ApiError(
+                SimpleNamespace(
+                    status_code=404,
+                    json=lambda: {"status_code": 404, "error": "Not Found", "message": ""},
+                )
+            )
+        if transaction_hash == offline_hash:
+            raise requests.ConnectionError("Connection reset")
+        if index > 0:
+            raise IndexError("list index out of range")
+
+        return oracle_utxo(transaction_hash, index)
+
+    monkeypatch.setattr("lib.utxos.cardano.utxo_from_input", utxo_from_input)
+    monkeypatch.setattr("api.oracles.clients.get_blockfrost", lambda *_: None)
+    # The sample signatures are over b"test", which isn't a standard result
+    monkeypatch.setattr(
+        "api.oracles.signature.enforce_standard",
+        lambda results: results == "test",
+    )
+
+    def entry(tx_hash, pubkey, sig, results="test", proposal_id="test_proposal_id", index=0):
+        return {
+            "proposal_id": proposal_id,
+            "transaction_hash": tx_hash,
+            "index": index,
+            "pubkey": pubkey,
+            "signature": sig,
+            "results": results,
+        }
+
+    response = client.post(
+        "/oracle/submit/batch",
+        json={
+            "signatures": [
+                entry(TX_HASH, *ORACLES[0]),
+                entry(TX_HASH, *ORACLES[1]),
+                entry(other_hash, *ORACLES[2]),
+                entry(TX_HASH, *ORACLES[2], proposal_id="other_proposal_id"),
+                entry(TX_HASH, ORACLES[0][0], ORACLES[1][1]),
+                entry(TX_HASH, *ORACLES[2], results="1,a"),
+                entry("hash", *ORACLES[2]),
+                entry(missing_hash, *ORACLES[2]),
+                entry(TX_HASH, *ORACLES[2], index=5),
+                entry(offline_hash, *ORACLES[2]),
+            ]
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json == {
+        "success": True,
+        "results": [
+            {"success": True},
+            {"success": True},
+            {"success": True},
+            {"success": False, "message": "Script input belongs to another proposal"},
+            {"success": False, "message": "Invalid signature"},
+            {"success": False, "message": "Results don't follow the standard"},
+            {"success": False, "message": "Invalid transaction input"},
+            {"success": False, "message": "Invalid transaction input"},
+            {"success": False, "message": "Invalid transaction input"},
+            {"success": False, "message": "Couldn't look up the transaction input, retry later"},
+        ],
+    }
+
+    assert sorted(lookups) == sorted(
+        [(TX_HASH, 0), (other_hash, 0), (missing_hash, 0), (TX_HASH, 5), (offline_hash, 0)]
+    )
+
+    signatures = Signature.query.order_by(Signature.id).all()
+
+    assert [(s.proposal_id, s.pubkey, s.script_input) for s in signatures] == [
+        ("test_proposal_id", ORACLES[0][0], f"{TX_HASH}#0"),
+        ("test_proposal_id", ORACLES[1][0], f"{TX_HASH}#0"),
+        ("test_proposal_id", ORACLES[2][0], f"{other_hash}#0"),
+    ]
+
+
+def test_oracle_resubmission_is_upserted(api, monkeypatch):
+    from model import Signature, db
+    from lib import utxos
+
+    client, app = api
+
+    utxos.cache.clear()
+
+    with app.app_context():
+        Signature.query.delete()
+        db.session.commit()
+
+    monkeypatch.setattr(
+        "lib.utxos.cardano.utxo_from_input", lambda *_: oracle_utxo()
+    )
+    monkeypatch.setattr("api.oracles.clients.get_blockfrost", lambda *_: None)
+    monkeypatch.setattr("api.oracles.signature.enforce_standard", lambda *_: True)
+    monkeypatch.setattr("api.oracles.signature.verify", lambda *_: True)
+    monkeypatch.setattr(
+        "api.oracles.signature.verify_many", lambda triples: [True for _ in triples]
+    )
+
+    def entry(results):
+        return {
+            "transaction_hash": TX_HASH,
+            "index": 0,
+            "pubkey": ORACLES[0][0],
+            "signature": ORACLES[0][1],
+            "results": results,
+        }
+
+    for results in ["1,2|3", "4,5|6"]:
+        response = client.post("/oracle/test_proposal_id/submit", json=entry(results))
+        assert response.json == {"success": True}
+
+    response = client.post(
+        "/oracle/submit/batch",
+        json={
+            "signatures": [
+                {**entry("7,8|9"), "proposal_id": "test_proposal_id"},
+                {**entry("10,11|12"), "proposal_id": "test_proposal_id"},
+            ]
+        },
+    )
+    assert response.json["results"] == [{"success": True}, {"success": True}]
+
+    # The same key and input spelled in uppercase are the same oracle
+    response = client.post(
+        "/oracle/test_proposal_id/submit",
+        json={
+            **entry("13,14|15"),
+            "pubkey": ORACLES[0][0].upper(),
+            "transaction_hash": TX_HASH.upper(),
+        },
+    )
+    assert response.json == {"success": True}
+
+    signatures = Signature.query.all()
+
+    assert len(signatures) == 1
+    assert signatures[0].results == "13,14|15"
+    assert signatures[0].pubkey == ORACLES[0][0]
+    assert signatures[0].script_input == f"{TX_HASH}#0"
@@ -0,0 +1,165 @@
+from fixtures import api, oracle_utxo, ORACLES, TX_HASH
+
+from datetime import datetime
+
+
+def test_quorum_tracker():
+    from lib.quorum import QuorumTracker
+
+    tracker = QuorumTracker()
+
+    reached = []
+    tracker.on_quorum(reached.append)
+
+    assert tracker.add("tx#0", "proposal", "a", "1,2", 2) is None
+    assert tracker.add("tx#0", "proposal", "b", "2,1", 2) is None
+    assert tracker.reached() == []
+
+    # Oracle "b" changes its mind and now agrees with "a"
+    tally = tracker.add("tx#0", "proposal", "b", "1,2", 2)
+
+    assert tally is not None
+    assert tally.results == "1,2"
+    assert tally.pubkeys == {"a", "b"}
+    assert reached == [tally]
+
+    # Quorum is only announced once per script input
+    assert tracker.add("tx#0", "proposal", "c", "1,2", 2) is None
+    assert tracker.get("tx#0") is tally
+    assert tracker.reached("proposal") == [tally]
+    assert tracker.reached("other") == []
+
+    tracker.discard("tx#0")
+
+    assert tracker.get("tx#0") is None
+    assert tracker.stats() == {"tallies": 0, "reached": 0}
+
+
+def test_quorum_threshold_unknown():
+    from lib.quorum import QuorumTracker
+
+    tracker = QuorumTracker()
+
+    assert tracker.add("tx#0", "proposal", "a", "1,2") is None
+    assert tracker.add("tx#0", "proposal", "b", "1,2") is None
+
+    # The threshold becomes known with the next submission
+    assert tracker.add("tx#0", "proposal", "c", "1,2", 3) is not None
+
+
+def test_quorum_endpoint(api, monkeypatch):
+    from model import Signature, db
+    from lib import quorum, utxos
+
+    client, app = api
+
+    utxos.cache.clear()
+    quorum.tracker.clear()
+
+    with app.app_context():
+        Signature.query.delete()
+        db.session.commit()
+
+    monkeypatch.setattr("lib.utxos.cardano.utxo_from_input", lambda *_: oracle_utxo())
+    monkeypatch.setattr("api.oracles.clients.get_blockfrost", lambda *_: None)
+    monkeypatch.setattr("api.oracles.signature.enforce_standard", lambda *_: True)
+
+    def submit(pubkey, sig):
+        return client.post(
+            "/oracle/test_proposal_id/submit",
+            json={
+                "transaction_hash": TX_HASH,
+                "index": 0,
+                "pubkey": pubkey,
+                "signature": sig,
+                "results": "test",
+            },
+        )
+
+    assert submit(*ORACLES[0]).json == {"success": True}
+
+    response = client.get("/oracle/test_proposal_id/quorum")
+
+    assert response.status_code == 200
+    assert response.json == {"reached": False, "quorums": []}
+
+    # The same oracle under another spelling of its key still counts once
+    pubkey, sig = ORACLES[0]
+    assert submit(pubkey.upper(), sig).json == {"success": True}
+    assert client.get("/oracle/test_proposal_id/quorum").json["reached"] is False
+
+    # Script inputs of another proposal are rejected
+    response = client.post(
+        "/oracle/other_proposal_id/submit",
+        json={
+            "transaction_hash": TX_HASH,
+            "index": 0,
+            "pubkey": ORACLES[1][0],
+            "signature": ORACLES[1][1],
+            "results": "test",
+        },
+    )
+    assert response.json == {
+        "success": False,
+        "message": "Script input belongs to another proposal",
+    }
+    assert client.get("/oracle/other_proposal_id/quorum").json["reached"] is False
+
+    assert submit(*ORACLES[1]).json == {"success": True}
+
+    expected = {
+        "proposal_id": "test_proposal_id",
+        "script_input": f"{TX_HASH}#0",
+        "results": "test",
+        "signatures": 2,
+        "min_signatures": 2,
+    }
+
+    response = client.get("/oracle/test_proposal_id/quorum")
+    assert response.json == {"reached": True, "quorums": [expected]}
+
+    response = client.get("/oracle/quorum")
+    assert response.json == {"quorums": [expected]}
+
+    # A restarted worker rebuilds the same state from the database
+    quorum.tracker.clear()
+
+    from api import oracles
+
+    with app.app_context():
+        oracles.warm_up_quorum()
+
+    response = client.get("/oracle/quorum")
+    assert response.json == {"quorums": [expected]}
+
+    # Signatures older than the window are left out
+    quorum.tracker.clear()
+
+    with app.app_context():
+        Signature.query.update({"creation_date": datetime(2020, 1, 1)})
+        db.session.commit()
+
+        oracles.warm_up_quorum(3600)
+
+    assert client.get("/oracle/quorum").json == {"quorums": []}
+
+    quorum.tracker.clear()
+
+
+def test_spent_inputs_are_discarded():
+    from lib.quorum import QuorumTracker
+
+    import pycardano as pyc
+
+    tracker = QuorumTracker()
+
+    tracker.add(f"{TX_HASH}#0", "proposal", "a", "1,2", 1)
+    tracker.add(f"{TX_HASH}#1", "proposal", "a", "1,2", 2)
+
+    tracker.on_spent(pyc.TransactionInput.from_primitive([TX_HASH, 0]))
+
+    assert tracker.get(f"{TX_HASH}#0") is None
+    assert tracker.stats() == {"tallies": 1, "reached": 0}
+
+    # Votes went with the input, the same oracle counts again
+    assert tracker.add(f"{TX_HASH}#0", "proposal", "a", "1,2", 1) is not None
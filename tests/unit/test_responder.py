@@ -0,0 +1,268 @@
+from fixtures import api, oracle_utxo, OPEN_ORACLE_DATUM, ORACLES, TX_HASH
+
+from types import SimpleNamespace
+
+import pycardano as pyc
+import pytest
+
+
+SKEY = pyc.PaymentSigningKey.from_cbor(
+    "5820ac29084c8ceca56b02c4118e76c1845c40b5eb810444a069e8edf2f5280ee875"
+)
+
+
+class FakeChainContext:
+    network = pyc.Network.TESTNET
+
+    def __init__(self, wallet_utxos):
+        self.wallet_utxos = wallet_utxos
+        self.submitted = []
+        self.failures = 0
+
+    def utxos(self, address):
+        return self.wallet_utxos
+
+    def submit_tx(self, cbor):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("Upstream unavailable")
+
+        self.submitted.append(cbor)
+
+
+class FakeBlockfrost:
+    def __init__(self):
+        self.spent = set()
+        self.lookups = []
+
+    def transaction_utxos(self, hash):
+        self.lookups.append(hash)
+
+        return SimpleNamespace(
+            outputs=[
+                SimpleNamespace(consumed_by_tx="ef" * 32 if index in self.spent else None)
+                for index in range(2)
+            ]
+        )
+
+
+class FakeTransaction:
+    def __init__(self, inputs):
+        self.transaction_body = pyc.TransactionBody(inputs=inputs, outputs=[], fee=0)
+
+    def to_cbor(self):
+        return self.transaction_body.to_cbor()
+
+
+@pytest.fixture
+def responder(api, monkeypatch):
+    from lib import responder, scripts, utxos
+
+    utxos.cache.clear()
+
+    script_utxo = oracle_utxo(datum=OPEN_ORACLE_DATUM)
+    wallet = pyc.Address(
+        pyc.VerificationKey.from_signing_key(SKEY).hash(), network=pyc.Network.TESTNET
+    )
+    collateral = pyc.UTxO(
+        pyc.TransactionInput.from_primitive(["cd" * 32, 1]),
+        pyc.TransactionOutput(wallet, 5_000_000),
+    )
+    not_collateral = pyc.UTxO(
+        pyc.TransactionInput.from_primitive(["cd" * 32, 0]),
+        pyc.TransactionOutput(wallet, 1_000_000),
+    )
+
+    chain_context = FakeChainContext([not_collateral, collateral])
+    builds = []
+
+    def submit_oracles_data(*args):
+        builds.append(args)
+        return FakeTransaction([args[2].input])
+
+    monkeypatch.setattr("lib.utxos.cardano.utxo_from_input", lambda *_: script_utxo)
+    monkeypatch.setattr(
+        "lib.responder.cardano.submit_oracles_data", submit_oracles_data
+    )
+    monkeypatch.setattr(
+        "lib.responder.cardano.assemble_transaction", lambda tx, _: tx
+    )
+
+    stored = {ORACLES[2][0]: ORACLES[2][1], ORACLES[0][0]: ORACLES[0][1]}
+
+    now = [0.0]
+
+    worker = responder.Responder(
+        chain_context,
+        FakeBlockfrost(),
+        SKEY,
+        scripts.oracle(),
+        lambda script_input, results: stored,
+        max_attempts=2,
+        backoff=0,
+        timer=lambda: now[0],
+    )
+    worker.now = now
+    worker.collateral.timer = worker.timer
+
+    yield worker, chain_context, builds, collateral
+
+    utxos.cache.clear()
+
+
+def test_responder_submits_once(responder):
+    worker, chain_context, builds, collateral = responder
+
+    script_input = f"{TX_HASH}#0"
+
+    done = []
+    worker.on_done(done.append)
+
+    assert worker.enqueue(script_input, "test")
+    assert not worker.enqueue(script_input, "test")
+
+    assert worker.run_pending() == 1
+    assert done == [script_input]
+
+    assert len(chain_context.submitted) == 1
+    assert worker.states[script_input] == worker.SUBMITTED
+    assert worker.stats()["submitted"] == 1
+
+    _, used_collateral, script_utxo, _, _, address, results, signatures = builds[0]
+
+    assert used_collateral == collateral
+    assert script_utxo.input.transaction_id.payload.hex() == TX_HASH
+    assert (
+        str(address)
+        == "addr_test1vrsmdl7kdktx5japkh0qwxylq7zvhnk6j46vslnzcguz7cc7cyz6j"
+    )
+    assert results == b"test"
+
+    # Signatures follow the oracle order of the datum
+    assert signatures == [
+        bytes.fromhex(ORACLES[0][1]),
+        bytes(64),
+        bytes.fromhex(ORACLES[2][1]),
+    ]
+
+    assert not worker.enqueue(script_input, "test")
+    assert worker.run_pending() == 0
+
+    # Once the response landed, the input is forgotten
+    worker.api.spent.add(0)
+    worker.now[0] += worker.confirm_timeout
+
+    assert worker.run_pending() == 1
+    assert script_input not in worker.states
+    assert worker.stats()["answered"] == 1
+    assert len(chain_context.submitted) == 1
+
+
+def test_responder_retries(responder):
+    worker, chain_context, _, _ = responder
+
+    script_input = f"{TX_HASH}#0"
+
+    done = []
+    worker.on_done(done.append)
+
+    chain_context.failures = 1
+    worker.enqueue(script_input, "test")
+
+    assert worker.run_pending() == 2
+    assert worker.states[script_input] == worker.SUBMITTED
+
+    # The response was dropped, answering again fails as well
+    chain_context.failures = 5
+    chain_context.submitted.clear()
+    worker.now[0] += worker.confirm_timeout
+
+    assert worker.run_pending() == 2
+
+    assert script_input not in worker.states
+    assert worker.stats()["failed"] == 1
+    assert chain_context.submitted == []
+    assert done == [script_input, script_input]
+
+    # A new quorum queues it again
+    assert worker.enqueue(script_input, "test")
+
+
+def test_responder_answers_dropped_responses_again(responder):
+    worker, chain_context, builds, _ = responder
+
+    script_input = f"{TX_HASH}#0"
+
+    worker.enqueue(script_input, "test")
+    worker.run_pending()
+
+    worker.now[0] += worker.confirm_timeout
+
+    assert worker.run_pending() == 1
+    assert worker.states[script_input] == worker.SUBMITTED
+    assert len(chain_context.submitted) == 2
+    assert len(builds) == 2
+
+
+def test_responder_skips_spent_inputs(responder):
+    worker, chain_context, builds, _ = responder
+
+    worker.api.spent.add(0)
+
+    worker.enqueue(f"{TX_HASH}#0", "test")
+    worker.run_pending()
+
+    assert f"{TX_HASH}#0" not in worker.states
+    assert worker.stats()["skipped"] == 1
+    assert builds == []
+
+    # Only the script input's own transaction is looked up
+    assert worker.api.lookups == [TX_HASH]
+
+
+def test_responder_needs_min_signatures(responder):
+    worker, chain_context, builds, _ = responder
+
+    # Keys outside the datum don't count towards its min_signatures
+    worker.load_signatures = lambda *_: {ORACLES[0][0]: ORACLES[0][1], "ab" * 32: "00" * 64}
+
+    worker.enqueue(f"{TX_HASH}#0", "test")
+    worker.run_pending()
+
+    assert f"{TX_HASH}#0" not in worker.states
+    assert worker.stats()["skipped"] == 1
+    assert builds == []
+
+
+def test_responder_waits_for_the_indexer(responder):
+    worker, chain_context, builds, _ = responder
+
+    synced = [False]
+    worker.ready = lambda: synced[0]
+
+    worker.enqueue(f"{TX_HASH}#0", "test")
+
+    assert worker.run_pending() == 0
+    assert worker.states[f"{TX_HASH}#0"] == worker.QUEUED
+
+    synced[0] = True
+
+    assert worker.run_pending() == 1
+    assert worker.states[f"{TX_HASH}#0"] == worker.SUBMITTED
+
+
+def test_responder_checks_older_inputs_upstream(responder):
+    from lib import chain_context, indexer
+
+    worker, upstream, builds, _ = responder
+
+    # The indexer started after the script input was created
+    worker.chain_context = chain_context.LocalIndexedChainContext(
+        indexer.UTxOStore(), upstream
+    )
+
+    worker.enqueue(f"{TX_HASH}#0", "test")
+    worker.run_pending()
+
+    assert worker.states[f"{TX_HASH}#0"] == worker.SUBMITTED
+    assert len(builds) == 1
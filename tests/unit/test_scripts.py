@@ -0,0 +1,24 @@
+from fixtures import api
+
+import pycardano as pyc
+import os
+
+
+def test_script_registry(api):
+    from lib import scripts
+
+    oracle = scripts.oracle()
+
+    assert oracle is scripts.load("oracle")
+    assert oracle is scripts.resolve(oracle)
+    assert oracle is scripts.resolve(oracle.hex)
+    assert oracle is scripts.from_hex(oracle.hex + "\n")
+
+    with open(os.path.join(scripts.SCRIPTS_DIR, "oracle.addr")) as f:
+        assert str(oracle.address()) == f.read().strip()
+
+    assert oracle.address() is oracle.address(pyc.Network.TESTNET)
+    assert oracle.address(pyc.Network.MAINNET).network == pyc.Network.MAINNET
+
+    assert oracle.hash == pyc.plutus_script_hash(oracle.plutus_script)
+    assert scripts.escrow().hash != oracle.hash
@@ -0,0 +1,344 @@
+from fixtures import api, FixedChainContext, wallet_utxos, ORACLE_DATUM
+
+import pycardano as pyc
+import threading
+import pytest
+import cbor2
+import time
+
+
+SKEY = pyc.PaymentSigningKey.from_cbor(
+    "5820ac29084c8ceca56b02c4118e76c1845c40b5eb810444a069e8edf2f5280ee875"
+)
+OWNER = pyc.VerificationKey.from_signing_key(SKEY).hash()
+
+FIRST = pyc.VerificationKeyHash(bytes([1]) * 28)
+SECOND = pyc.VerificationKeyHash(bytes([2]) * 28)
+
+
+def _escrow_utxo(index, policy_id, creator, deadline, vote_use) -> pyc.UTxO:
+    from lib import data_types, scripts
+    from pycardano.serialization import default_encoder
+
+    datum = data_types.escrow_datum(
+        pyc.ScriptHash(policy_id),
+        creator,
+        deadline,
+        0,
+        vote_use,
+        [
+            pyc.Address(FIRST, network=pyc.Network.TESTNET),
+            pyc.Address(SECOND, network=pyc.Network.TESTNET),
+        ],
+    )
+
+    return pyc.UTxO(
+        pyc.TransactionInput.from_primitive(["ee" * 32, index]),
+        pyc.TransactionOutput(
+            scripts.escrow().address(pyc.Network.TESTNET),
+            10_000_000,
+            datum=pyc.RawCBOR(cbor2.dumps(datum, default=default_encoder)),
+        ),
+    )
+
+
+def _oracle_utxo(index, datum, token=True) -> pyc.UTxO:
+    from lib import scripts
+
+    amount = pyc.Value(10_000_000)
+    if token:
+        amount.multi_asset = pyc.MultiAsset.from_primitive(
+            {datum.policy_id: {b"oracle": 1}}
+        )
+
+    return pyc.UTxO(
+        pyc.TransactionInput.from_primitive(["0a" * 32, index]),
+        pyc.TransactionOutput(
+            scripts.oracle().address(pyc.Network.TESTNET),
+            amount,
+            datum=pyc.RawCBOR(datum.to_cbor()),
+        ),
+    )
+
+
+def test_receiver(api):
+    from lib import escrow_datum, settlement
+    from lib.vote_results import VoteResults
+
+    def datum(vote_use, question_index=0):
+        return escrow_datum.EscrowDatum(
+            bytes(28), bytes(28), 0, question_index, vote_use, (FIRST.payload, SECOND.payload)
+        )
+
+    # Choice 1 has more votes, choice 0 more weight
+    results = VoteResults.parse("1:10,2:5|7:7")
+
+    count = settlement.receiver(datum(escrow_datum.VOTE_COUNT), results, pyc.Network.TESTNET)
+    weight = settlement.receiver(datum(escrow_datum.VOTE_WEIGHT), results, pyc.Network.TESTNET)
+
+    assert count.payment_part == SECOND
+    assert weight.payment_part == FIRST
+
+    # No such question, no address for the winning choice
+    for invalid in [datum(escrow_datum.VOTE_COUNT, 2), datum(escrow_datum.VOTE_COUNT, 1)]:
+        with pytest.raises(ValueError):
+            settlement.receiver(invalid, VoteResults.parse("1:1|1:1,2:2,3:3"), pyc.Network.TESTNET)
+
+
+def test_scheduler(api, monkeypatch):
+    from lib import cardano, data_types, indexer, oracle_datum, scripts, settlement
+
+    policy_id = oracle_datum.decode(ORACLE_DATUM).policy_id
+    answered = oracle_datum.decode(ORACLE_DATUM).with_results(b"1:10,2:5")
+
+    store = indexer.UTxOStore()
+    follower = indexer.Indexer(indexer.ReplaySource("unused"), store, [])
+
+    later = 10_000_000
+    escrows = [
+        _escrow_utxo(0, policy_id, FIRST, later, data_types.VoteUseCount()),
+        _escrow_utxo(1, policy_id, FIRST, later, data_types.VoteUseWeigth()),
+        # Expiring, only ours can be retrieved
+        _escrow_utxo(2, bytes(28), OWNER, 1_000, data_types.VoteUseCount()),
+        _escrow_utxo(3, bytes(28), FIRST, 1_000, data_types.VoteUseCount()),
+    ]
+    store.roll_forward(
+        indexer.Point(10, "01" * 32),
+        [([], [follower._entry(utxo, 10) for utxo in escrows])],
+    )
+
+    builds = []
+    running = []
+    lock = threading.Lock()
+
+    def build(kind):
+        def builder(context, collateral, script_utxos, script, *args):
+            with lock:
+                running.append(1)
+                concurrent = len(running)
+
+            time.sleep(0.02)
+
+            with lock:
+                running.pop()
+                builds.append((kind, [utxo.input.index for utxo in script_utxos], args, concurrent))
+
+            body = pyc.TransactionBody(
+                inputs=[utxo.input for utxo in script_utxos], outputs=[], fee=0
+            )
+            return [pyc.Transaction(body, pyc.TransactionWitnessSet())]
+
+        return builder
+
+    monkeypatch.setattr("lib.settlement.cardano.execute_escrows_batch", build("execute"))
+    monkeypatch.setattr("lib.settlement.cardano.retrieve_escrows_batch", build("retrieve"))
+    monkeypatch.setattr("lib.settlement.cardano.assemble_transaction", lambda tx, _: tx)
+
+    now = [0.0]
+    owner = pyc.Address(OWNER, network=pyc.Network.TESTNET)
+    context = FixedChainContext({str(owner): wallet_utxos(owner, [5_000_000] * 4)})
+    scheduler = settlement.Scheduler(
+        context, store, [SKEY], scripts.escrow(), max_workers=4, clock=lambda: now[0]
+    )
+    store.on_added(scheduler.on_added)
+    scheduler.load()
+
+    def settled(count):
+        deadline = time.monotonic() + 5
+        while scheduler.stats()["submitted"] < count:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    # Nothing due before results or deadlines
+    assert scheduler.run_pending() == 0
+    assert scheduler.stats()["scheduled"] == 4
+
+    # Results without the request's token don't settle anything
+    forged = _oracle_utxo(1, answered, token=False)
+    store.roll_forward(
+        indexer.Point(15, "03" * 32), [([], [follower._entry(forged, 15)])]
+    )
+
+    assert scheduler.run_pending() == 0
+
+    oracle = _oracle_utxo(0, answered)
+    store.roll_forward(
+        indexer.Point(20, "02" * 32), [([], [follower._entry(oracle, 20)])]
+    )
+
+    assert scheduler.run_pending() == 1
+    settled(2)
+
+    # One transaction per receiver, one at a time from our only wallet
+    executions = sorted(build[1:] for build in builds)
+    assert [indexes for indexes, _, _ in executions] == [[0], [1]]
+    assert {args[1].payment_part for _, args, _ in executions} == {FIRST, SECOND}
+    assert all(args[0] == oracle.input for _, args, _ in executions)
+    assert all(concurrent == 1 for _, _, concurrent in executions)
+
+    # Past the deadline (and its grace delay), ours is retrieved from the
+    # slot after it
+    now[0] = 1 + scheduler.retrieval_delay
+    assert scheduler.run_pending() == 2
+    settled(3)
+
+    assert builds[-1][:2] == ("retrieve", [2])
+    assert builds[-1][2] == (
+        scheduler.address(OWNER.payload),
+        cardano.posix_to_slot(1_000, pyc.Network.TESTNET) + 1,
+    )
+
+    stats = scheduler.stats()
+    assert stats["submitted"] == 3
+    assert stats["skipped"] == 1
+    assert len(context.submitted) == 3
+
+    # Every build had a collateral of its own
+    assert scheduler.collateral[OWNER.payload].stats()["held"] == 3
+
+    scheduler.stop()
+
+
+def test_unspent_escrows_are_queued_again(api, monkeypatch):
+    from lib import data_types, indexer, oracle_datum, scripts, settlement
+
+    policy_id = oracle_datum.decode(ORACLE_DATUM).policy_id
+    answered = oracle_datum.decode(ORACLE_DATUM).with_results(b"1:10,2:5")
+
+    store = indexer.UTxOStore()
+    follower = indexer.Indexer(indexer.ReplaySource("unused"), store, [])
+
+    escrow = _escrow_utxo(0, policy_id, FIRST, 10_000_000, data_types.VoteUseCount())
+    oracle = _oracle_utxo(0, answered)
+    store.roll_forward(
+        indexer.Point(10, "01" * 32),
+        [([], [follower._entry(escrow, 10), follower._entry(oracle, 10)])],
+    )
+
+    builds = []
+
+    def execute(context, collateral, script_utxos, *args):
+        builds.append([utxo.input for utxo in script_utxos])
+
+        body = pyc.TransactionBody(inputs=[escrow.input], outputs=[], fee=0)
+        return [pyc.Transaction(body, pyc.TransactionWitnessSet())]
+
+    monkeypatch.setattr("lib.settlement.cardano.execute_escrows_batch", execute)
+    monkeypatch.setattr("lib.settlement.cardano.assemble_transaction", lambda tx, _: tx)
+
+    now = [0.0]
+    owner = pyc.Address(OWNER, network=pyc.Network.TESTNET)
+    context = FixedChainContext({str(owner): wallet_utxos(owner, [5_000_000] * 4)})
+    scheduler = settlement.Scheduler(
+        context, store, [SKEY], scripts.escrow(), confirm_timeout=60, clock=lambda: now[0]
+    )
+    store.on_added(scheduler.on_added)
+    scheduler.load()
+
+    def submitted(count):
+        deadline = time.monotonic() + 5
+        while len(context.submitted) < count or scheduler.stats()["running"]:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    scheduler.run_pending()
+    submitted(1)
+
+    # The execution never landed, it is built again once the timeout is over
+    now[0] = 61
+    scheduler.run_pending()
+    scheduler.run_pending()
+    submitted(2)
+    assert builds == [[escrow.input]] * 2
+
+    # Spent, then unspent again by a rollback
+    store.roll_forward(indexer.Point(20, "02" * 32), [([escrow.input], [])])
+    assert scheduler.stats()["submitted"] == 1
+
+    store.roll_backward(indexer.Point(10, "01" * 32))
+    assert scheduler.stats()["queued"] == 1
+
+    scheduler.run_pending()
+    submitted(3)
+    assert len(builds) == 3
+
+    scheduler.stop()
+
+
+def test_failing_settlements_fall_back(api, monkeypatch):
+    from lib import data_types, indexer, oracle_datum, scripts, settlement
+
+    policy_id = oracle_datum.decode(ORACLE_DATUM).policy_id
+    answered = oracle_datum.decode(ORACLE_DATUM).with_results(b"1:10,2:5")
+
+    store = indexer.UTxOStore()
+    follower = indexer.Indexer(indexer.ReplaySource("unused"), store, [])
+
+    escrow = _escrow_utxo(0, policy_id, OWNER, 1_000, data_types.VoteUseCount())
+    first = _oracle_utxo(0, answered)
+    store.roll_forward(
+        indexer.Point(10, "01" * 32),
+        [([], [follower._entry(escrow, 10), follower._entry(first, 10)])],
+    )
+
+    builds = []
+
+    def execute(context, collateral, script_utxos, script, oracle, *args):
+        builds.append(("execute", oracle))
+        raise ValueError("Script evaluation failed")
+
+    def retrieve(context, collateral, script_utxos, *args):
+        builds.append(("retrieve", None))
+
+        body = pyc.TransactionBody(inputs=[escrow.input], outputs=[], fee=0)
+        return [pyc.Transaction(body, pyc.TransactionWitnessSet())]
+
+    monkeypatch.setattr("lib.settlement.cardano.execute_escrows_batch", execute)
+    monkeypatch.setattr("lib.settlement.cardano.retrieve_escrows_batch", retrieve)
+    monkeypatch.setattr("lib.settlement.cardano.assemble_transaction", lambda tx, _: tx)
+
+    now = [0.0]
+    owner = pyc.Address(OWNER, network=pyc.Network.TESTNET)
+    context = FixedChainContext({str(owner): wallet_utxos(owner, [5_000_000] * 4)})
+    scheduler = settlement.Scheduler(
+        context, store, [SKEY], scripts.escrow(), max_attempts=1, clock=lambda: now[0]
+    )
+    store.on_added(scheduler.on_added)
+    scheduler.load()
+
+    def idle():
+        deadline = time.monotonic() + 5
+        while scheduler.stats()["running"] or scheduler.stats()["in_flight"]:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+    scheduler.run_pending()
+    idle()
+
+    # Giving up on the first oracle UTxO, the escrow waits for its deadline
+    assert builds == [("execute", first.input)]
+    assert scheduler.states[escrow.input] == scheduler.QUEUED
+
+    scheduler.run_pending()
+    idle()
+    assert len(builds) == 1
+
+    # Another oracle UTxO of the policy is tried
+    second = _oracle_utxo(1, answered)
+    store.roll_forward(
+        indexer.Point(20, "02" * 32), [([], [follower._entry(second, 20)])]
+    )
+
+    scheduler.run_pending()
+    idle()
+    assert builds[1:] == [("execute", second.input)]
+
+    # Past the deadline the creator gets it back
+    now[0] = 1 + scheduler.retrieval_delay
+    scheduler.run_pending()
+    idle()
+
+    assert builds[2:] == [("retrieve", None)]
+    assert scheduler.states[escrow.input] == scheduler.SUBMITTED
+
+    scheduler.stop()
@@ -18,4 +18,27 @@ def test_enforce_standard():
 
     assert signature.enforce_standard("1,2,ab|4,5,6|7,8,9|10,11") == False
     assert signature.enforce_standard("1,2,3.5|4,5,6|7,8,9|10,11") == False
-    assert signature.enforce_standard("1,,2,3|4,5,6|7,8,9|10,11") == False
\ No newline at end of file
+    assert signature.enforce_standard("1,,2,3|4,5,6|7,8,9|10,11") == False
+
+def test_verify_many():
+    from fixtures import ORACLES
+    from lib import signature
+
+    message = b"test".hex()
+
+    triples = [
+        (ORACLES[0][0], message, ORACLES[0][1]),
+        (ORACLES[1][0], message, ORACLES[0][1]),
+        (ORACLES[2][0], message, ORACLES[2][1]),
+        (ORACLES[1][0], b"test-fake".hex(), ORACLES[1][1]),
+        (ORACLES[1][0], message, "aa"),
+        ("zz", message, ORACLES[1][1]),
+    ]
+
+    expected = [True, False, True, False, False, False]
+
+    assert signature.verify_many(triples) == expected
+    assert signature.verify_many(triples * 100, workers=4) == expected * 100
+    assert signature.verify_many([]) == []
+
+    assert signature.verify_key(ORACLES[0][0]) is signature.verify_key(ORACLES[0][0])
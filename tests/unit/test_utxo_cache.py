@@ -0,0 +1,162 @@
+from fixtures import api, oracle_utxo, TX_HASH
+
+from types import SimpleNamespace
+
+import pytest
+
+
+def test_ttl_lru_cache(api):
+    from lib.cache import TTLCache
+
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, timer=lambda: now[0])
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    assert cache.get("a") == 1
+
+    # "b" is now the least recently used entry
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+    now[0] = 11
+
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+    cache.set("d", 4)
+    assert cache.invalidate("d")
+    assert not cache.invalidate("d")
+
+    assert cache.stats() == {
+        "size": 1,
+        "maxsize": 2,
+        "hits": 3,
+        "misses": 2,
+        "evictions": 1,
+        "invalidations": 1,
+    }
+
+
+def test_resolve_is_cached(api, monkeypatch):
+    from lib import utxos
+
+    utxos.cache.clear()
+
+    utxo = oracle_utxo()
+
+    calls = []
+
+    def utxo_from_input(*args):
+        calls.append(args)
+        return utxo
+
+    monkeypatch.setattr("lib.utxos.cardano.utxo_from_input", utxo_from_input)
+
+    stats = utxos.cache.stats()
+
+    first = utxos.resolve(None, TX_HASH, 0)
+    second = utxos.resolve(None, TX_HASH, 0)
+
+    assert len(calls) == 1
+    assert first is second
+    assert first.utxo is utxo
+    assert first.datum["proposal_id"] == "test_proposal_id"
+    assert first.datum["min_signatures"] == 2
+    assert first.datum["results"] == b"test"
+
+    assert utxos.cache.stats()["hits"] == stats["hits"] + 1
+    assert utxos.cache.stats()["misses"] == stats["misses"] + 1
+
+    assert utxos.invalidate(utxo.input)
+
+    utxos.resolve(None, TX_HASH, 0)
+
+    assert len(calls) == 2
+
+
+def test_single_flight_threads(api):
+    from lib.cache import SingleFlight
+
+    import threading
+    import time
+
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def lookup():
+        calls.append(1)
+        release.wait(5)
+        return "utxo"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flight.do("key", lookup)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+
+    while flight.stats()["coalesced"] < 4:
+        time.sleep(0.001)
+
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["utxo"] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"calls": 1, "coalesced": 4, "in_flight": 0}
+
+    def failing():
+        raise ValueError("missing")
+
+    with pytest.raises(ValueError):
+        flight.do("key", failing)
+
+    # Errors aren't kept, the next call runs again
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def test_resolve_async_is_coalesced(api, monkeypatch):
+    from lib import utxos
+
+    import asyncio
+
+    utxos.cache.clear()
+
+    utxo = oracle_utxo()
+    calls = []
+
+    class MockAsyncBlockfrostApi:
+        async def transaction_utxos(self, hash: str):
+            calls.append(hash)
+            await asyncio.sleep(0.01)
+            return SimpleNamespace(outputs=[None])
+
+    monkeypatch.setattr("lib.utxos.cardano.utxo_from_output", lambda *_: utxo)
+
+    stats = utxos.lookups.stats()
+
+    async def submissions():
+        client = MockAsyncBlockfrostApi()
+        return await asyncio.gather(
+            *(utxos.resolve_async(client, TX_HASH, 0) for _ in range(10))
+        )
+
+    resolved = asyncio.run(submissions())
+
+    assert calls == [TX_HASH]
+    assert all(entry is resolved[0] for entry in resolved)
+    assert resolved[0].datum["proposal_id"] == "test_proposal_id"
+
+    assert utxos.lookups.stats() == {
+        "calls": stats["calls"] + 1,
+        "coalesced": stats["coalesced"] + 9,
+        "in_flight": 0,
+    }
@@ -0,0 +1,43 @@
+from fixtures import api
+
+from pycardano.serialization import default_encoder
+
+import pytest
+import cbor2
+
+
+def test_parse_matches_parse_vote_results(api):
+    from lib import data_types
+    from lib.vote_results import VoteResults
+
+    for text in ["1:10", "1:10,2:20|3:30", " 4:5 ,6:7|8:9,10:11,12:13"]:
+        results = VoteResults.parse(text)
+        expected = data_types.parse_vote_results(text)
+
+        assert results.to_lists() == expected
+        assert results == VoteResults.from_lists(expected)
+        assert len(results) == len(expected)
+
+        counts, weights = results.question(len(results) - 1)
+        assert list(zip(counts, weights)) == expected[-1]
+
+        assert results.redeemer_cbor(0) == cbor2.dumps(
+            data_types.escrow_redeemer(
+                data_types.EscrowRedeemer.EscrowExecution, 0, expected
+            ),
+            default=default_encoder,
+        )
+
+    for text in ["", "1:2:3,4", "1:2||3:4", "1,2", "a:b"]:
+        with pytest.raises(ValueError):
+            VoteResults.parse(text)
+
+
+def test_is_standard(api):
+    from lib import signature
+
+    for text in ["578,214693|484,214787|578,214693", "1", " 1 ,-2|+3", "1_000"]:
+        assert signature.enforce_standard(text)
+
+    for text in ["", "test", "1,,2", "1|", "1.5", "1:2"]:
+        assert not signature.enforce_standard(text)
@@ -0,0 +1,124 @@
+from fixtures import api, FixedChainContext, OPEN_ORACLE_DATUM, wallet_utxos
+
+import pycardano as pyc
+import pytest
+
+
+SKEY = pyc.PaymentSigningKey.from_cbor(
+    "5820ac29084c8ceca56b02c4118e76c1845c40b5eb810444a069e8edf2f5280ee875"
+)
+ADDRESS = pyc.Address(
+    pyc.VerificationKey.from_signing_key(SKEY).hash(), network=pyc.Network.TESTNET
+)
+
+
+def _request(context):
+    from lib import cardano, scripts
+
+    def build(utxos):
+        return cardano.create_data_request(
+            context, utxos, ADDRESS, scripts.oracle(), 3_000_000, pyc.RawCBOR(OPEN_ORACLE_DATUM)
+        )
+
+    return build
+
+
+def _change(transaction: pyc.Transaction) -> pyc.UTxO:
+    body = transaction.transaction_body
+    [index] = [i for i, output in enumerate(body.outputs) if output.address == ADDRESS]
+
+    return pyc.UTxO(pyc.TransactionInput(body.id, index), body.outputs[index])
+
+
+def test_chains_off_unconfirmed_change(api):
+    from lib.wallet import Conflict, Wallet
+
+    funds = wallet_utxos(ADDRESS, [100_000_000])
+    context = FixedChainContext({str(ADDRESS): funds})
+    wallet = Wallet(context, SKEY)
+
+    first = wallet.submit(_request(context))
+    second = wallet.submit(_request(context))
+
+    assert first.transaction_body.inputs == [funds[0].input]
+    assert second.transaction_body.inputs == [_change(first).input]
+    assert wallet.available() == [_change(second)]
+
+    # A build insisting on a locked UTxO gives up
+    with pytest.raises(Conflict):
+        wallet.submit(lambda _: _request(context)(funds))
+
+    # Both land, the pipeline follows the chain context again
+    context._utxos[str(ADDRESS)] = [_change(second)]
+
+    assert wallet.available() == [_change(second)]
+    assert wallet.stats() == {
+        "pending": 0,
+        "locked": 0,
+        "unconfirmed": 0,
+        "submitted": 2,
+        "confirmed": 2,
+        "rolled_back": 0,
+        "conflicts": wallet.max_conflicts + 1,
+    }
+    assert len(context.submitted) == 2
+
+
+def test_rolls_back_unconfirmed_chains(api):
+    from lib.wallet import Wallet
+
+    funds = wallet_utxos(ADDRESS, [100_000_000])
+    context = FixedChainContext({str(ADDRESS): funds})
+
+    now = [0.0]
+    wallet = Wallet(context, SKEY, confirm_timeout=60, timer=lambda: now[0])
+
+    wallet.submit(_request(context))
+    wallet.submit(_request(context))
+
+    # Never confirmed, the chained transaction goes with its parent
+    now[0] = 61
+    assert wallet.available() == funds
+    assert wallet.stats()["rolled_back"] == 2
+
+    # Failed submissions release their inputs right away
+    def fail(cbor):
+        raise ConnectionError("Upstream unavailable")
+
+    context.submit_tx = fail
+    with pytest.raises(ConnectionError):
+        wallet.submit(_request(context))
+
+    assert wallet.available() == funds
+    assert wallet.stats()["pending"] == 0
+
+
+def test_batches_go_through_the_pipeline(api):
+    from lib import scripts
+    from lib.wallet import Wallet
+
+    funds = wallet_utxos(ADDRESS, [100_000_000] * 20)
+    context = FixedChainContext({str(ADDRESS): funds})
+    wallet = Wallet(context, SKEY)
+
+    requests = [(pyc.RawCBOR(OPEN_ORACLE_DATUM), 3_000_000) for _ in range(200)]
+    transactions = wallet.create_data_requests_batch(scripts.oracle(), requests)
+
+    assert len(transactions) > 1
+    assert context.submitted == [tx.to_cbor() for tx in transactions]
+
+    # Chained off each other, what they spent is locked
+    spent = {tx_in for tx in transactions for tx_in in tx.transaction_body.inputs}
+    available = wallet.available()
+
+    assert wallet.stats()["pending"] == len(transactions)
+    assert _change(transactions[-1]) in available
+    assert not spent & {utxo.input for utxo in available}
+
+    escrow = wallet.create_escrow(scripts.escrow(), 3_000_000, pyc.RawCBOR(b"\x80"))
+    assert not spent & set(escrow.transaction_body.inputs)
+    assert wallet.stats()["submitted"] == len(transactions) + 1
+
+    # The first one never lands, the whole chain is rolled back
+    wallet.timer = lambda: float("inf")
+    assert sorted(wallet.available(), key=str) == sorted(funds, key=str)
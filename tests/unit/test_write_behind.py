@@ -0,0 +1,179 @@
+from fixtures import api, oracle_utxo, ORACLES, TX_HASH
+
+import threading
+import pytest
+import time
+
+
+def test_batches_by_size_and_drains_on_stop(api):
+    from lib.write_behind import WriteBehind
+
+    batches = []
+    written = threading.Event()
+
+    def write(items):
+        batches.append(items)
+        written.set()
+
+    # Only the size trigger fires within the test
+    writer = WriteBehind(write, batch_size=3, flush_interval=60)
+    writer.start()
+
+    writer.put([1, 2])
+    writer.put([3])
+    assert written.wait(5)
+
+    writer.put([4])
+    writer.stop()
+
+    assert batches == [[1, 2, 3], [4]]
+    assert writer.stats() == {
+        "pending": 0,
+        "written": 4,
+        "batches": 2,
+        "rejected": 0,
+        "failed": 0,
+    }
+
+
+def test_backpressure(api):
+    from lib.write_behind import QueueFull, WriteBehind
+
+    writer = WriteBehind(lambda items: None, max_pending=2, put_timeout=0.01)
+    # Started but never flushing on its own
+    writer._thread = object()
+
+    writer.put([1, 2])
+
+    with pytest.raises(QueueFull):
+        writer.put([3])
+
+    assert writer.stats()["rejected"] == 1
+
+    assert writer.flush() == 2
+    writer.put([3])
+
+
+def test_group_durability(api):
+    from lib.write_behind import GROUP, WriteBehind
+
+    def failing(items):
+        raise RuntimeError("database is down")
+
+    writer = WriteBehind(failing, durability=GROUP, max_attempts=2, retry_delay=0)
+    writer.start()
+
+    # The failure reaches the request waiting for its batch
+    with pytest.raises(RuntimeError):
+        writer.put([1])
+
+    stored = []
+    writer.write = stored.extend
+    writer.put([2])
+
+    # Acknowledged only once written
+    assert stored == [2]
+    assert writer.stats()["failed"] == 1
+
+    writer.stop()
+
+
+def test_failed_batch_is_written_apart(api):
+    from lib.write_behind import GROUP, WriteBehind
+
+    stored = []
+
+    def write(items):
+        # One poisoned entry fails any batch holding it
+        if "bad" in items:
+            raise ValueError("bad entry")
+
+        stored.extend(items)
+
+    writer = WriteBehind(write, durability=GROUP, max_attempts=2, retry_delay=0)
+    results = {}
+
+    def put(items):
+        try:
+            writer.put(items)
+            results[tuple(items)] = None
+        except ValueError as e:
+            results[tuple(items)] = e
+
+    # Queued together, written in a single flush
+    writer._thread = object()
+    threads = [
+        threading.Thread(target=put, args=(items,))
+        for items in ([1, 2], ["bad", 3], [4])
+    ]
+    for thread in threads:
+        thread.start()
+
+    while writer.stats()["pending"] < 5:
+        time.sleep(0.001)
+
+    assert writer.flush() == 5
+    for thread in threads:
+        thread.join()
+
+    assert sorted(stored, key=str) == [1, 2, 3, 4]
+    assert results[(1, 2)] is None and results[(4,)] is None
+    assert isinstance(results[("bad", 3)], ValueError)
+    assert writer.stats()["written"] == 4
+    assert writer.stats()["failed"] == 1
+
+
+def test_buffered_submit(api, monkeypatch):
+    from model import Signature
+    from lib import quorum, utxos, write_behind
+
+    client, app = api
+
+    utxos.cache.clear()
+    quorum.tracker.clear()
+
+    monkeypatch.setattr("api.oracles.clients.get_blockfrost", lambda *_: None)
+    monkeypatch.setattr("lib.utxos.cardano.utxo_from_input", lambda *_: oracle_utxo())
+    monkeypatch.setattr("api.oracles.signature.enforce_standard", lambda *_: True)
+
+    def write_signatures(entries):
+        from api import oracles
+
+        with app.app_context():
+            oracles.store_signatures(entries)
+
+    writer = write_behind.WriteBehind(write_signatures, max_pending=1, put_timeout=0)
+    writer._thread = object()
+    monkeypatch.setattr("lib.write_behind.signatures", writer)
+
+    def submit(pubkey, signature):
+        return client.post(
+            "/oracle/test_proposal_id/submit",
+            json={
+                "transaction_hash": TX_HASH,
+                "index": 0,
+                "pubkey": pubkey,
+                "signature": signature,
+                "results": "test",
+            },
+        )
+
+    response = submit(*ORACLES[0])
+
+    assert response.json == {"success": True}
+
+    # Acknowledged, but neither stored nor counted yet
+    with app.app_context():
+        assert Signature.query.filter_by(pubkey=ORACLES[0][0]).count() == 0
+    assert quorum.tracker.stats()["tallies"] == 0
+
+    response = submit(*ORACLES[1])
+
+    assert response.status_code == 503
+    assert response.json["success"] is False
+
+    writer.flush()
+
+    with app.app_context():
+        assert Signature.query.filter_by(pubkey=ORACLES[0][0]).count() == 1
+    assert quorum.tracker.stats()["tallies"] == 1